@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 默认每个模型商允许的最大并发请求数
+DEFAULT_CONCURRENCY = 4
+
+
+def load_concurrency_limits() -> Dict[str, int]:
+    """从环境变量读取每个模型商的并发上限
+
+    VENDOR_CONCURRENCY 为 JSON 对象，键为模型商（API基础URL），值为并发数，例如：
+    VENDOR_CONCURRENCY={"https://ai98.vip/v1": 8, "http://localhost:11434": 1}
+    """
+    raw = os.getenv("VENDOR_CONCURRENCY")
+    if not raw:
+        return {}
+    try:
+        return {str(k): int(v) for k, v in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        logger.error(f"VENDOR_CONCURRENCY 配置格式错误: {str(e)}")
+        return {}
+
+
+def default_vendor_of(model_name: str) -> str:
+    """CLI 运行器中所有模型都通过同一个 OPENAI_API_BASE 访问"""
+    return os.getenv("OPENAI_API_BASE") or "default"
+
+
+class AsyncTestExecutor:
+    """基于 asyncio 的多模型并发测试执行引擎
+
+    将 (模型, 测试用例) 组合展开为独立任务，按模型商分别限制并发数，
+    最终汇总为与 PromptTestRunner.run_model_tests 相同格式的结果。
+    """
+
+    def __init__(self, runner, concurrency_limits: Optional[Dict[str, int]] = None,
+                 default_limit: Optional[int] = None,
+                 vendor_of: Callable[[str], str] = default_vendor_of):
+        """
+        Args:
+            runner: PromptTestRunner 实例，提供 create_chat/arun_test/summarize_results
+            concurrency_limits: 模型商 -> 最大并发数，未配置的模型商使用 default_limit
+            default_limit: 默认并发数，默认读取环境变量 MAX_CONCURRENCY
+            vendor_of: 根据模型名称返回其所属模型商的函数
+        """
+        self.runner = runner
+        self.concurrency_limits = concurrency_limits if concurrency_limits is not None else load_concurrency_limits()
+        self.default_limit = default_limit or int(os.getenv("MAX_CONCURRENCY", DEFAULT_CONCURRENCY))
+        self.vendor_of = vendor_of
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_semaphore(self, vendor: str) -> asyncio.Semaphore:
+        """获取模型商对应的信号量（必须在事件循环内调用）"""
+        if vendor not in self._semaphores:
+            limit = max(1, self.concurrency_limits.get(vendor, self.default_limit))
+            self._semaphores[vendor] = asyncio.Semaphore(limit)
+        return self._semaphores[vendor]
+
+    def vendor_slot(self, model_name: str) -> asyncio.Semaphore:
+        """模型所属模型商的并发名额，使用 async with 占用（必须在事件循环内调用）"""
+        return self._get_semaphore(self.vendor_of(model_name))
+
+    def reset_slots(self):
+        """清空并发名额，每次在新的事件循环中运行前调用（信号量绑定创建时的事件循环）"""
+        self._semaphores = {}
+
+    async def _run_case(self, model_name: str, chat, test_case) -> tuple:
+        """在模型商的并发限制内运行单个测试用例"""
+        async with self.vendor_slot(model_name):
+            # 进入信号量后才开始计时，保证 execution_time 不包含排队时间
+            print(f"\n🔄 运行测试用例: [{model_name}] {test_case.name}")
+            return await self.runner.arun_test(test_case.input_data, test_case.expected_output, chat,
+                                               test_case.compare_rules)
+
+    async def arun_plan(self, plan: Dict[str, List[Any]]) -> Dict[str, List[tuple]]:
+        """并发运行执行计划
+
+        Args:
+            plan: 模型名称 -> 该模型需要运行的测试用例列表
+
+        Returns:
+            模型名称 -> [(是否通过, 执行时间, 延迟指标, 是否为API调用错误), ...]，顺序与计划中的测试用例一致
+        """
+        self.reset_slots()
+
+        tasks = {}
+        for model_name, test_cases in plan.items():
+            print(f"\n🔄 开始测试模型: {model_name}")
+            chat = self.runner.create_chat(model_name) if test_cases else None
+            tasks[model_name] = [
+                asyncio.ensure_future(self._run_case(model_name, chat, test_case))
+                for test_case in test_cases
+            ]
+
+        outcomes = {}
+        for model_name, model_tasks in tasks.items():
+            outcomes[model_name] = list(await asyncio.gather(*model_tasks))
+        return outcomes
+
+    async def arun(self, model_names: List[str], test_cases: List[Any]) -> List[Dict[str, Any]]:
+        """并发运行所有 (模型, 测试用例) 组合"""
+        outcomes = await self.arun_plan({model_name: test_cases for model_name in model_names})
+
+        model_results = []
+        for model_name in model_names:
+            results = [passed for passed, _, _, _ in outcomes[model_name]]
+            test_times = [execution_time for _, execution_time, _, _ in outcomes[model_name]]
+            latencies = [latency for _, _, latency, _ in outcomes[model_name]]
+            model_results.append(self.runner.summarize_results(model_name, results, test_times, latencies=latencies))
+
+        return model_results
+
+    def run_plan(self, plan: Dict[str, List[Any]]) -> Dict[str, List[tuple]]:
+        """同步入口，在新的事件循环中执行 arun_plan"""
+        return asyncio.run(self.arun_plan(plan))
+
+    def run(self, model_names: List[str], test_cases: List[Any]) -> List[Dict[str, Any]]:
+        """同步入口，在新的事件循环中执行 arun"""
+        return asyncio.run(self.arun(model_names, test_cases))
@@ -0,0 +1,246 @@
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from case_parser import TestResult
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+DEFAULT_BATCH_DIR = Path(__file__).parent / ".cache" / "batches"
+
+# 批处理任务的终止状态（与 OpenAI Batch API 一致）
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# 超时或取消的任务中已完成的请求仍写入输出文件
+OUTPUT_STATUSES = {"completed", "expired", "cancelled"}
+
+
+def build_batch_line(custom_id: str, model: str, messages: List[Any],
+                     temperature: Optional[float]) -> Dict[str, Any]:
+    """构建一行 OpenAI 兼容的批处理请求"""
+    roles = {"system": "system", "human": "user", "ai": "assistant"}
+    body = {
+        "model": model,
+        "messages": [{"role": roles.get(m.type, m.type), "content": m.content} for m in messages]
+    }
+    if temperature is not None:
+        body["temperature"] = temperature
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_batch_output(lines: List[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """解析批处理输出文件
+
+    Returns:
+        custom_id -> (响应文本, 错误信息)
+    """
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record.get("custom_id")
+        error = record.get("error")
+        response = record.get("response") or {}
+        if error:
+            results[custom_id] = (None, error.get("message") if isinstance(error, dict) else str(error))
+        elif response.get("status_code", 200) != 200:
+            results[custom_id] = (None, f"HTTP {response.get('status_code')}: {json.dumps(response.get('body'), ensure_ascii=False)}")
+        else:
+            choices = (response.get("body") or {}).get("choices") or [{}]
+            results[custom_id] = (choices[0].get("message", {}).get("content", ""), None)
+    return results
+
+
+class BatchBackend:
+    """批处理后端接口"""
+
+    def submit(self, input_path: Path) -> str:
+        """提交批处理输入文件，返回批处理任务ID"""
+        raise NotImplementedError
+
+    def status(self, batch_id: str) -> str:
+        """查询批处理任务状态"""
+        raise NotImplementedError
+
+    def fetch_output(self, batch_id: str) -> List[str]:
+        """获取批处理输出文件的所有行（包括失败请求的错误行）"""
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API 后端（也适用于兼容该接口的代理服务）"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 completion_window: str = "24h"):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.completion_window = completion_window
+
+    def submit(self, input_path: Path) -> str:
+        with open(input_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def fetch_output(self, batch_id: str) -> List[str]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(self.client.files.content(file_id).text.splitlines())
+        return lines
+
+
+class LocalFileBatchBackend(BatchBackend):
+    """基于本地文件的批处理后端，用于测试和离线回放
+
+    提交时复制输入文件，第一次查询状态时逐行调用 responder 生成输出文件。
+    responder 接收请求 body，返回响应文本；抛出异常时该请求记为失败。
+    """
+
+    def __init__(self, responder: Callable[[Dict[str, Any]], str],
+                 batch_dir: Optional[Path] = None):
+        self.responder = responder
+        self.batch_dir = Path(batch_dir or DEFAULT_BATCH_DIR)
+
+    def _dir(self, batch_id: str) -> Path:
+        return self.batch_dir / batch_id
+
+    def submit(self, input_path: Path) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        batch_dir = self._dir(batch_id)
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        (batch_dir / "input.jsonl").write_bytes(Path(input_path).read_bytes())
+        (batch_dir / "status").write_text("validating", encoding='utf-8')
+        return batch_id
+
+    def _process(self, batch_id: str):
+        batch_dir = self._dir(batch_id)
+        with open(batch_dir / "input.jsonl", 'r', encoding='utf-8') as fin, \
+                open(batch_dir / "output.jsonl", 'w', encoding='utf-8') as fout:
+            for line in fin:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                record = {"id": f"req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+                try:
+                    content = self.responder(request["body"])
+                    record["response"] = {
+                        "status_code": 200,
+                        "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+                    }
+                    record["error"] = None
+                except Exception as e:
+                    record["response"] = None
+                    record["error"] = {"code": "local_error", "message": str(e)}
+                fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        (batch_dir / "status").write_text("completed", encoding='utf-8')
+
+    def status(self, batch_id: str) -> str:
+        status = (self._dir(batch_id) / "status").read_text(encoding='utf-8')
+        if status == "validating":
+            self._process(batch_id)
+            status = "completed"
+        return status
+
+    def fetch_output(self, batch_id: str) -> List[str]:
+        output_path = self._dir(batch_id) / "output.jsonl"
+        if not output_path.exists():
+            return []
+        with open(output_path, 'r', encoding='utf-8') as f:
+            return f.readlines()
+
+
+class BatchTestRunner:
+    """将所有 (模型, 测试用例) 请求打包为一个批处理任务执行并评分"""
+
+    def __init__(self, runner, backend: BatchBackend, batch_dir: Optional[Path] = None):
+        """
+        Args:
+            runner: PromptTestRunner 实例，提供消息构建、解析和比较逻辑
+            backend: 批处理后端
+        """
+        self.runner = runner
+        self.backend = backend
+        self.batch_dir = Path(batch_dir or DEFAULT_BATCH_DIR)
+
+    def write_input(self, model_names: List[str], test_cases: List[Any],
+                    temperature: Optional[float]) -> Path:
+        """生成批处理输入 JSONL 文件，custom_id 为 "模型序号-用例序号" """
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+        input_path = self.batch_dir / f"input_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.jsonl"
+        with open(input_path, 'w', encoding='utf-8') as f:
+            for model_index, model_name in enumerate(model_names):
+                for case_index, test_case in enumerate(test_cases):
+                    messages = self.runner._build_messages(test_case.input_data, model_name)
+                    line = build_batch_line(f"{model_index}-{case_index}", model_name, messages, temperature)
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        return input_path
+
+    def wait(self, batch_id: str, poll_interval: float = 30.0, timeout: Optional[float] = None) -> str:
+        """轮询直到批处理任务结束，返回最终状态"""
+        start_time = time.time()
+        while True:
+            status = self.backend.status(batch_id)
+            if status in FINAL_STATUSES:
+                return status
+            if timeout is not None and time.time() - start_time > timeout:
+                raise TimeoutError(f"批处理任务 {batch_id} 超时，当前状态: {status}")
+            print(f"⏳ 批处理任务 {batch_id} 状态: {status}")
+            time.sleep(poll_interval)
+
+    def grade(self, content: Optional[str], error: Optional[str], test_case):
+        """将单个批处理结果转换为 TestResult"""
+        if error is not None:
+            return TestResult(test_case=test_case, actual_output={}, passed=False,
+                              error_message=f"API调用错误: {error}")
+        try:
+            output = self.runner._parse_response(content)
+            self.runner._validate_output_format(output)
+        except json.JSONDecodeError:
+            return TestResult(test_case=test_case, actual_output={}, passed=False,
+                              error_message="AI响应不是有效的JSON格式")
+        except ValueError as e:
+            return TestResult(test_case=test_case, actual_output=output, passed=False,
+                              error_message=str(e))
+
+        passed = self.runner._compare_outputs(output, test_case.expected_output, test_case.compare_rules)
+        return TestResult(test_case=test_case, actual_output=output, passed=passed,
+                          error_message="" if passed else "输出与预期不匹配")
+
+    def run(self, model_names: List[str], test_cases: List[Any], temperature: Optional[float] = None,
+            poll_interval: float = 30.0, timeout: Optional[float] = None) -> Dict[str, List[Any]]:
+        """提交批处理任务、等待完成并评分
+
+        Returns:
+            模型名称 -> TestResult 列表（顺序与 test_cases 一致）；批处理中 execution_time 均为 0。
+            任务超时或被取消时使用已完成请求的结果，其余请求记为失败。
+        """
+        input_path = self.write_input(model_names, test_cases, temperature)
+        batch_id = self.backend.submit(input_path)
+        print(f"📦 已提交批处理任务 {batch_id}，共 {len(model_names) * len(test_cases)} 个请求")
+
+        status = self.wait(batch_id, poll_interval, timeout)
+        outputs = parse_batch_output(self.backend.fetch_output(batch_id)) if status in OUTPUT_STATUSES else {}
+        if status != "completed":
+            logger.error(f"批处理任务 {batch_id} 未完成，状态: {status}，"
+                         f"已完成 {len(outputs)}/{len(model_names) * len(test_cases)} 个请求")
+
+        results = {}
+        for model_index, model_name in enumerate(model_names):
+            results[model_name] = []
+            for case_index, test_case in enumerate(test_cases):
+                content, error = outputs.get(f"{model_index}-{case_index}", (None, f"批处理任务状态: {status}，无结果"))
+                results[model_name].append(self.grade(content, error, test_case))
+        return results
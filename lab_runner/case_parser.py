@@ -0,0 +1,164 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 测试用例文件格式：
+#   #### 测试用例 <名称>
+#   ##### input.json
+#   ```json
+#   {...}
+#   ```
+#   ##### output.json
+#   ```json
+#   {...}
+#   ```
+#   ##### compare.json（可选，比较规则，见 output_diff.CompareRules）
+#   ```json
+#   {...}
+#   ```
+CASE_MARKER = "#### 测试用例"
+JSON_MARKERS = {"##### input.json": "input", "##### output.json": "output", "##### compare.json": "compare"}
+FENCE_OPEN = "```json"
+FENCE_CLOSE = "```"
+
+
+@dataclass
+class TestCase:
+    name: str
+    input_data: Dict[str, Any]
+    expected_output: Dict[str, Any]
+    compare_rules: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class TestResult:
+    test_case: TestCase
+    actual_output: Dict[str, Any]
+    passed: bool
+    error_message: str = ""
+    execution_time: float = 0.0
+
+
+@dataclass
+class ParseIssue:
+    case_name: str
+    line: int       # 出错位置的行号（从1开始）
+    message: str
+
+    def __str__(self):
+        return f"第 {self.line} 行 - 测试用例 {self.case_name}: {self.message}"
+
+
+class _CaseBuilder:
+    """单个测试用例的解析状态"""
+
+    def __init__(self, name: str, line: int):
+        self.name = name
+        self.line = line
+        # 块类型 -> (JSON文本, 代码块起始行号)
+        self.blocks: Dict[str, Tuple[str, int]] = {}
+
+    def build(self, issues: Optional[List[ParseIssue]]) -> Optional[TestCase]:
+        if "input" not in self.blocks or "output" not in self.blocks:
+            _report(issues, ParseIssue(self.name, self.line, "缺少输入或输出JSON"))
+            return None
+
+        parsed = {}
+        for kind, (text, fence_line) in self.blocks.items():
+            try:
+                parsed[kind] = json.loads(text)
+            except json.JSONDecodeError as je:
+                # je.lineno 相对于代码块内容，换算成文件中的绝对行号
+                _report(issues, ParseIssue(
+                    self.name, fence_line + je.lineno,
+                    f"{kind}.json 解析错误: {je.msg} (列 {je.colno})"
+                ))
+                return None
+
+        return TestCase(name=self.name, input_data=parsed["input"], expected_output=parsed["output"],
+                        compare_rules=parsed.get("compare"))
+
+
+def _report(issues: Optional[List[ParseIssue]], issue: ParseIssue):
+    if issues is not None:
+        issues.append(issue)
+
+
+def iter_test_cases(test_file_path: str, issues: Optional[List[ParseIssue]] = None) -> Iterator[TestCase]:
+    """逐行流式解析 Markdown 测试用例文件，每解析完一个用例立即产出
+
+    Args:
+        test_file_path: 测试用例文件路径
+        issues: 可选，用于收集解析错误（包含准确行号）
+    """
+    current: Optional[_CaseBuilder] = None
+    pending_block: Optional[str] = None   # 已遇到 input/output 标题，等待代码块
+    fence_kind: Optional[str] = None      # 当前所在代码块的类型
+    fence_line = 0
+    fence_lines: List[str] = []
+
+    with open(test_file_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            stripped = line.strip()
+
+            if fence_kind is not None:
+                if stripped == FENCE_CLOSE:
+                    if current is not None:
+                        current.blocks[fence_kind] = ("".join(fence_lines), fence_line)
+                    fence_kind = None
+                    fence_lines = []
+                else:
+                    fence_lines.append(line)
+                continue
+
+            if stripped.startswith(CASE_MARKER) and not stripped.startswith("#" + CASE_MARKER):
+                if current is not None:
+                    test_case = current.build(issues)
+                    if test_case:
+                        yield test_case
+                current = _CaseBuilder(stripped[len(CASE_MARKER):].strip(), line_no)
+                pending_block = None
+                continue
+
+            if stripped in JSON_MARKERS:
+                pending_block = JSON_MARKERS[stripped]
+                continue
+
+            if stripped.startswith(FENCE_OPEN) and pending_block is not None:
+                fence_kind = pending_block
+                fence_line = line_no
+                pending_block = None
+                continue
+
+            if stripped:
+                pending_block = None
+
+    if fence_kind is not None and current is not None:
+        _report(issues, ParseIssue(current.name, fence_line, f"{fence_kind}.json 代码块未闭合"))
+        current.blocks.pop(fence_kind, None)
+
+    if current is not None:
+        test_case = current.build(issues)
+        if test_case:
+            yield test_case
+
+
+# 解析结果缓存: 文件路径 -> ((mtime_ns, size), 测试用例列表, 解析错误列表)
+_parse_cache: Dict[str, Tuple[Tuple[int, int], List[TestCase], List[ParseIssue]]] = {}
+
+
+def load_test_cases_cached(test_file_path: str) -> Tuple[List[TestCase], List[ParseIssue]]:
+    """解析测试用例文件，文件修改时间和大小不变时直接返回缓存的结果"""
+    path = os.path.abspath(test_file_path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _parse_cache.get(path)
+    if cached and cached[0] == signature:
+        return list(cached[1]), list(cached[2])
+
+    issues: List[ParseIssue] = []
+    test_cases = list(iter_test_cases(path, issues))
+    _parse_cache[path] = (signature, test_cases, issues)
+    return list(test_cases), list(issues)
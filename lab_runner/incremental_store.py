@@ -0,0 +1,101 @@
+import datetime
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = Path(__file__).parent / "test_logs" / "incremental"
+
+
+def fingerprint_text(text: str) -> str:
+    """计算文本指纹"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fingerprint_case(test_case) -> str:
+    """计算测试用例指纹（输入、期望输出和比较规则）"""
+    parts = [test_case.input_data, test_case.expected_output, test_case.compare_rules]
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return fingerprint_text(payload)
+
+
+def fingerprint_config(base_url: Optional[str], temperature: Optional[float], layout: str = "inline") -> str:
+    """计算模型调用配置指纹（API基础URL、temperature 和消息布局），配置变化时所有用例都需要重新运行"""
+    config = [base_url or "", temperature, layout]
+    return fingerprint_text(json.dumps(config))
+
+
+class IncrementalResultStore:
+    """增量测试结果存储
+
+    按提示词文件保存上一次运行的结果，结构为：
+    {模型: {用例名称: {prompt_fp, case_fp, config_fp, passed, api_error, execution_time, latency, updated_at}}}
+    只有提示词指纹、用例输入/期望输出或调用配置发生变化的用例才需要重新运行；
+    上一次因API调用错误（限流、超时、网络错误）失败的用例没有得到模型输出，也会重新运行。
+    """
+
+    def __init__(self, prompt_filename: str, store_dir: Optional[Path] = None):
+        self.path = Path(store_dir or DEFAULT_STORE_DIR) / f"{Path(prompt_filename).stem}.json"
+        self.records: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.records = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"加载增量测试结果失败，将全部重新运行: {str(e)}")
+            self.records = {}
+
+    def save(self):
+        """保存结果到文件"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.records, f, ensure_ascii=False, indent=2)
+
+    def partition(self, model_name: str, test_cases: List[Any], prompt_fp: str,
+                  config_fp: str) -> Tuple[List[Any], Dict[str, Dict[str, Any]]]:
+        """将测试用例分为需要重新运行的和可以复用历史结果的
+
+        Returns:
+            (需要运行的用例列表, 用例名称 -> 历史结果)
+        """
+        model_records = self.records.get(model_name, {})
+        changed = []
+        reused = {}
+        for test_case in test_cases:
+            record = model_records.get(test_case.name)
+            if (record
+                    and not record.get("api_error")
+                    and record.get("prompt_fp") == prompt_fp
+                    and record.get("config_fp") == config_fp
+                    and record.get("case_fp") == fingerprint_case(test_case)):
+                reused[test_case.name] = record
+            else:
+                changed.append(test_case)
+        return changed, reused
+
+    def record(self, model_name: str, test_case, prompt_fp: str, config_fp: str,
+               passed: bool, execution_time: float, latency: Optional[Dict[str, Any]] = None,
+               api_error: bool = False):
+        """记录单个用例的运行结果
+
+        Args:
+            latency: 流式延迟指标（LatencyMetrics.to_dict()），没有测量到时为 None
+            api_error: 是否因API调用错误失败，下一次增量运行时不复用该结果
+        """
+        self.records.setdefault(model_name, {})[test_case.name] = {
+            "prompt_fp": prompt_fp,
+            "case_fp": fingerprint_case(test_case),
+            "config_fp": config_fp,
+            "passed": passed,
+            "api_error": api_error,
+            "execution_time": execution_time,
+            "latency": latency,
+            "updated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
@@ -0,0 +1,274 @@
+import datetime
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 默认后台工作线程数，与 async_test_executor 的默认并发数一致
+DEFAULT_MAX_WORKERS = 4
+
+# 任务状态
+#   running:   仍有用例在排队或执行
+#   completed: 所有用例执行完毕
+#   cancelled: 被取消（已在执行中的用例会执行完并记录结果）
+JOB_STATUSES = ("running", "completed", "cancelled")
+
+
+@dataclass
+class ModelLane:
+    """任务中单个模型的用例队列和进度"""
+    model: str
+    pending: Deque[Any]
+    total: int
+    done: int = 0
+    passed: int = 0
+    running: int = 0
+    priority: int = 0
+    dispatched: int = 0
+    cancelled: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.running == 0 and not self.pending
+
+
+@dataclass
+class TestJob:
+    """一次多模型测试运行"""
+    job_id: str
+    prompt_system: str
+    test_time: str
+    case_names: List[str]
+    lanes: Dict[str, ModelLane]
+    run_case: Callable[[str, Any], Dict[str, Any]]
+    on_result: Optional[Callable[[str, str, Dict[str, Any]], None]] = None
+    on_model_done: Optional[Callable[[str], None]] = None
+    results: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
+    status: str = "running"
+
+
+class JobExecutor:
+    """后台测试任务执行器
+
+    由固定数量的工作线程从任务队列中取用例执行，不依赖 Streamlit 脚本线程：
+    - 同一任务中的多个模型轮流调度，慢模型不会阻塞其他模型
+    - 可以取消整个任务或单个模型，也可以把某个模型提到队首优先执行
+    - 界面通过 snapshot() 轮询增量结果
+
+    run_case 在工作线程中执行，不能访问 st.session_state。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: 工作线程数，默认读取环境变量 MAX_CONCURRENCY
+        """
+        self.max_workers = max_workers or int(os.getenv("MAX_CONCURRENCY", DEFAULT_MAX_WORKERS))
+        self._cond = threading.Condition()
+        self._jobs: Dict[str, TestJob] = {}
+        self._workers: List[threading.Thread] = []
+        self._shutdown = False
+
+    def _ensure_workers(self):
+        """按需启动工作线程（调用方需持有锁）"""
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, name=f"test-worker-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, models: List[str], test_cases: List[Any],
+               run_case: Callable[[str, Any], Dict[str, Any]],
+               prompt_system: str = "", test_time: Optional[str] = None,
+               on_result: Optional[Callable[[str, str, Dict[str, Any]], None]] = None,
+               on_model_done: Optional[Callable[[str], None]] = None) -> str:
+        """提交一次测试运行，返回任务ID
+
+        Args:
+            run_case: (模型名称, 测试用例) -> 结果字典，在工作线程中调用
+            on_result: 每个用例完成后回调 (模型名称, 用例名称, 结果字典)
+            on_model_done: 某个模型的所有用例完成或被取消后回调
+        """
+        job = TestJob(
+            job_id=uuid.uuid4().hex[:12],
+            prompt_system=prompt_system,
+            test_time=test_time or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            case_names=[case.name for case in test_cases],
+            lanes={model: ModelLane(model=model, pending=deque(test_cases), total=len(test_cases)) for model in models},
+            run_case=run_case,
+            on_result=on_result,
+            on_model_done=on_model_done,
+            results={model: {} for model in models}
+        )
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("任务执行器已关闭")
+            self._jobs[job.job_id] = job
+            self._ensure_workers()
+            # 没有模型或没有用例时任务直接结束，不会等到某个用例完成后才更新状态
+            self._update_status(job)
+            finished_models = [lane.model for lane in job.lanes.values() if lane.finished]
+            self._cond.notify_all()
+        for model in finished_models:
+            self._notify_model_done(job, model)
+        return job.job_id
+
+    def _next_task(self):
+        """选出下一个要执行的用例（调用方需持有锁）
+
+        先提交的任务先执行；同一任务内优先级高的模型先执行，优先级相同的模型轮流执行。
+        """
+        for job in self._jobs.values():
+            if job.status != "running":
+                continue
+            lanes = [lane for lane in job.lanes.values() if lane.pending]
+            if not lanes:
+                continue
+            lane = min(lanes, key=lambda l: (-l.priority, l.dispatched))
+            lane.running += 1
+            lane.dispatched += 1
+            return job, lane, lane.pending.popleft()
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._cond.wait()
+                    task = self._next_task()
+            self._execute(*task)
+
+    def _execute(self, job: TestJob, lane: ModelLane, test_case):
+        try:
+            result = job.run_case(lane.model, test_case)
+        except Exception as e:
+            logger.error(f"[{lane.model}] 测试用例 {test_case.name} 执行出错: {str(e)}")
+            result = {
+                "passed": False,
+                "execution_time": 0.0,
+                "latency": None,
+                "error": f"测试执行出错: {str(e)}",
+                "actual_output": {},
+                "expected_output": test_case.expected_output,
+                "input_data": test_case.input_data
+            }
+
+        if job.on_result:
+            try:
+                job.on_result(lane.model, test_case.name, result)
+            except Exception as e:
+                logger.error(f"保存测试结果失败: {str(e)}")
+
+        with self._cond:
+            job.results[lane.model][test_case.name] = result
+            lane.running -= 1
+            lane.done += 1
+            lane.passed += 1 if result["passed"] else 0
+            lane_finished = lane.finished
+            self._update_status(job)
+        if lane_finished:
+            self._notify_model_done(job, lane.model)
+
+    def _update_status(self, job: TestJob):
+        """所有模型都结束后更新任务状态（调用方需持有锁）"""
+        if job.status == "running" and all(lane.finished for lane in job.lanes.values()):
+            job.status = "cancelled" if any(lane.cancelled for lane in job.lanes.values()) else "completed"
+            self._cond.notify_all()
+
+    @staticmethod
+    def _notify_model_done(job: TestJob, model: str):
+        if job.on_model_done:
+            try:
+                job.on_model_done(model)
+            except Exception as e:
+                logger.error(f"[{model}] 模型完成回调出错: {str(e)}")
+
+    def cancel(self, job_id: str, model: Optional[str] = None):
+        """取消任务中尚未开始的用例，model 为 None 时取消整个任务"""
+        finished_models = []
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for lane in job.lanes.values():
+                if model is not None and lane.model != model:
+                    continue
+                if lane.pending:
+                    lane.pending.clear()
+                    lane.cancelled = True
+                    if lane.running == 0:
+                        finished_models.append(lane.model)
+            self._update_status(job)
+        for finished_model in finished_models:
+            self._notify_model_done(job, finished_model)
+
+    def prioritize(self, job_id: str, model: str):
+        """将任务中某个模型的剩余用例提到其他模型之前执行"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or model not in job.lanes:
+                return
+            job.lanes[model].priority = max(lane.priority for lane in job.lanes.values()) + 1
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """返回任务进度和已完成结果的副本，供界面轮询"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                "job_id": job.job_id,
+                "status": job.status,
+                "prompt_system": job.prompt_system,
+                "test_time": job.test_time,
+                "models": {
+                    lane.model: {
+                        "total": lane.total,
+                        "done": lane.done,
+                        "passed": lane.passed,
+                        "running": lane.running,
+                        "pending": len(lane.pending),
+                        "priority": lane.priority,
+                        "cancelled": lane.cancelled
+                    }
+                    for lane in job.lanes.values()
+                },
+                # 按提交时的用例顺序返回已完成的结果
+                "results": {
+                    model: {name: results[name] for name in job.case_names if name in results}
+                    for model, results in job.results.items()
+                }
+            }
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> bool:
+        """阻塞直到任务结束，返回任务是否已结束"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return True
+            return self._cond.wait_for(lambda: job.status != "running", timeout)
+
+    def forget(self, job_id: str):
+        """移除已结束的任务，释放其结果占用的内存"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != "running":
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        """取消所有任务并停止工作线程"""
+        with self._cond:
+            job_ids = list(self._jobs)
+        for job_id in job_ids:
+            self.cancel(job_id)
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
@@ -0,0 +1,194 @@
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks.base import BaseCallbackHandler
+from usage_ledger import count_message_tokens, count_tokens
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """线性插值计算百分位数，values 为空时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+@dataclass
+class LatencyMetrics:
+    """单次模型调用的流式延迟指标（时间单位：秒）"""
+    ttft: Optional[float] = None              # 首个 token 到达时间
+    total_time: float = 0.0                   # 请求发出到响应结束的时间
+    output_tokens: int = 0                    # 输出 token 数（优先使用响应中的用量信息）
+    tokens_per_sec: Optional[float] = None    # 生成阶段吞吐量：首 token 之后的 token 数 / 生成耗时
+    itl_p50: Optional[float] = None           # token 间隔中位数
+    itl_p90: Optional[float] = None
+    itl_p99: Optional[float] = None
+    input_tokens: int = 0                     # 输入 token 数（响应中有用量信息时）
+    cached_tokens: int = 0                    # 输入中命中模型商提示词缓存的 token 数
+    usage_estimated: Optional[bool] = False   # 响应中没有用量信息，输入/输出 token 数由本地分词器估算；
+                                              # 调用失败时为 None，表示没有用量，不计入调用次数和费用
+    cost: Optional[float] = None              # 本次调用的费用（美元），没有单价时为 None
+    inter_token_latencies: List[float] = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """用于保存的字典，不包含逐 token 的原始间隔"""
+        data = asdict(self)
+        data.pop("inter_token_latencies")
+        return data
+
+
+class LatencyCallbackHandler(BaseCallbackHandler):
+    """记录流式调用中每个 token 到达时间的回调
+
+    需要模型以 streaming=True 创建，每次调用使用一个新实例：
+        handler = LatencyCallbackHandler()
+        chat.invoke(messages, config={"callbacks": [handler]})
+        metrics = handler.metrics()
+    限流重试时会重新触发开始事件，指标只统计最后一次尝试。
+
+    同时记录 token 用量：优先使用响应中的用量信息，没有时用本地分词器估算输入消息和输出文本；
+    传入 price（ModelVendorConfig.price_of 的返回值）时计算本次调用的费用。
+    """
+
+    def __init__(self, price=None, model_name: str = ""):
+        self.price = price
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._start: Optional[float] = None
+        self._end: Optional[float] = None
+        self._failed = False
+        self._token_times: List[float] = []
+        self._usage_tokens: Optional[int] = None
+        self._input_tokens = 0
+        self._cached_tokens = 0
+        self._prompt: List = []
+        self._output_text = ""
+
+    def _on_start(self, prompt: List):
+        with self._lock:
+            self._start = time.perf_counter()
+            self._end = None
+            self._failed = False
+            self._token_times = []
+            self._usage_tokens = None
+            self._input_tokens = 0
+            self._cached_tokens = 0
+            self._prompt = prompt
+            self._output_text = ""
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._on_start(messages[0] if messages else [])
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._on_start(prompts[:1])
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        # 首个分块通常只包含角色信息，空内容不计为 token
+        if token:
+            with self._lock:
+                self._token_times.append(time.perf_counter())
+
+    def on_llm_error(self, error, **kwargs):
+        with self._lock:
+            self._end = time.perf_counter()
+            self._failed = True
+
+    def on_llm_end(self, response, **kwargs):
+        with self._lock:
+            self._end = time.perf_counter()
+            self._failed = False
+            self._usage_tokens, self._input_tokens, self._cached_tokens = self._usage_from(response)
+            generations = getattr(response, "generations", None) or []
+            self._output_text = generations[0][0].text if generations and generations[0] else ""
+
+    @staticmethod
+    def _usage_from(response) -> tuple:
+        """从 LLMResult 中读取 (输出 token 数, 输入 token 数, 命中缓存的输入 token 数)"""
+        for generations in getattr(response, "generations", None) or []:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                if usage.get("output_tokens") is not None:
+                    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+                    return usage["output_tokens"], usage.get("input_tokens") or 0, cached
+        token_usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        # OpenAI 兼容接口为 prompt_tokens_details.cached_tokens，部分 Claude 代理为 cache_read_input_tokens
+        cached = ((token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+                  or token_usage.get("cache_read_input_tokens") or 0)
+        return token_usage.get("completion_tokens"), token_usage.get("prompt_tokens") or 0, cached
+
+    def metrics(self) -> Optional[LatencyMetrics]:
+        """计算本次调用的指标，未观察到调用（例如命中响应缓存）时返回 None
+
+        调用失败（没有收到 on_llm_end）时只记录耗时，usage_estimated 为 None，不估算用量和费用，也不统计流式指标。
+        """
+        with self._lock:
+            if self._start is None:
+                return None
+            start = self._start
+            end = self._end or time.perf_counter()
+            if self._failed or self._end is None:
+                return LatencyMetrics(total_time=end - start, usage_estimated=None)
+            token_times = list(self._token_times)
+            usage_tokens = self._usage_tokens
+            input_tokens = self._input_tokens
+            cached_tokens = self._cached_tokens
+            prompt = self._prompt
+            output_text = self._output_text
+
+        estimated = usage_tokens is None
+        if estimated:
+            input_tokens = count_message_tokens(prompt, self.model_name)
+            output_tokens = count_tokens(output_text, self.model_name) or len(token_times)
+        else:
+            output_tokens = usage_tokens
+        result = LatencyMetrics(total_time=end - start, output_tokens=output_tokens,
+                                input_tokens=input_tokens, cached_tokens=cached_tokens,
+                                usage_estimated=estimated)
+        if self.price is not None:
+            result.cost = self.price.cost(input_tokens, output_tokens, cached_tokens)
+        if not token_times:
+            return result
+
+        result.ttft = token_times[0] - start
+        gaps = [b - a for a, b in zip(token_times, token_times[1:])]
+        result.inter_token_latencies = gaps
+        result.itl_p50 = percentile(gaps, 50)
+        result.itl_p90 = percentile(gaps, 90)
+        result.itl_p99 = percentile(gaps, 99)
+
+        # 分块数与 token 数不一定相等，按实际 token 数折算生成阶段吞吐量
+        decode_time = end - token_times[0]
+        if decode_time > 0 and output_tokens > 1:
+            result.tokens_per_sec = (output_tokens - 1) / decode_time
+        elif result.total_time > 0:
+            result.tokens_per_sec = output_tokens / result.total_time
+        return result
+
+
+def summarize_latencies(metrics: List[Optional[LatencyMetrics]]) -> Dict[str, Any]:
+    """汇总多个调用的延迟指标，跳过没有指标的调用（缓存命中或失败）"""
+    measured = [m for m in metrics if m is not None and m.ttft is not None]
+    ttfts = [m.ttft for m in measured]
+    gaps = [gap for m in measured for gap in m.inter_token_latencies]
+    throughputs = [m.tokens_per_sec for m in measured if m.tokens_per_sec is not None]
+    # 输入 token 统计包括非流式调用
+    called = [m for m in metrics if m is not None]
+    input_tokens = sum(m.input_tokens for m in called)
+    cached_tokens = sum(m.cached_tokens for m in called)
+    return {
+        "measured": len(measured),
+        "avg_ttft": sum(ttfts) / len(ttfts) if ttfts else None,
+        "ttft_p90": percentile(ttfts, 90),
+        "itl_p50": percentile(gaps, 50),
+        "itl_p90": percentile(gaps, 90),
+        "itl_p99": percentile(gaps, 99),
+        "output_tokens": sum(m.output_tokens for m in measured),
+        "avg_tokens_per_sec": sum(throughputs) / len(throughputs) if throughputs else None,
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_hit_rate": cached_tokens / input_tokens if input_tokens else None
+    }
@@ -0,0 +1,323 @@
+import json
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# 列表比较模式
+#   any:       只检查字段存在（默认，与旧版命令行运行器一致）
+#   length:    检查类型和长度（旧版 Streamlit 运行器的比较方式）
+#   ordered:   逐个位置比较元素，元素按各自路径的规则比较
+#   unordered: 元素多重集合相同，与顺序无关
+#   subset:    期望的元素都出现在实际列表中
+LIST_MODES = ("any", "length", "ordered", "unordered", "subset")
+
+# 字符串比较规则
+#   any:        只检查字段存在（默认，与旧版命令行运行器一致）
+#   type:       检查类型（旧版 Streamlit 运行器的比较方式）
+#   exact:      完全相同
+#   normalized: 忽略首尾空白、连续空白、全半角和大小写差异
+#   regex:      期望值作为正则表达式，完整匹配实际值
+STRING_RULES = ("any", "type", "exact", "normalized", "regex")
+
+DEFAULT_TOLERANCE = 0.01
+
+
+class _DictMarker:
+    """扁平化表中表示"此路径是一个对象"的占位值"""
+
+    def __repr__(self):
+        return "{...}"
+
+
+DICT = _DictMarker()
+
+
+def _type_name(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, (dict, _DictMarker)):
+        return "dict"
+    if isinstance(value, list):
+        return "list"
+    if isinstance(value, str):
+        return "string"
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def _compile_pattern(pattern: str) -> re.Pattern:
+    """路径模式中 * 匹配任意字符，例如 updated_context.* 或 items[*].id"""
+    return re.compile("^" + re.escape(pattern).replace(r"\*", ".*") + "$")
+
+
+@dataclass
+class CompareRules:
+    """输出比较规则
+
+    tolerances/list_modes/string_rules 的键为字段路径或带 * 的路径模式，
+    例如 "updated_context.resources.gold"、"updated_context.*"、"items[*].name"。
+    精确路径优先，其次按定义顺序匹配第一个模式。
+
+    默认规则与旧版比较逻辑一致：只比较数值（布尔值按数值比较，True 与 1 相同），
+    字符串、列表和 null 只检查字段存在。strict_types 为 True 时布尔值必须与布尔值比较，
+    null 和其他值要求相等；字符串和列表的检查通过 string_rule/list_mode 开启。
+    """
+    tolerance: float = DEFAULT_TOLERANCE
+    list_mode: str = "any"
+    string_rule: str = "any"
+    strict_types: bool = False
+    tolerances: Dict[str, float] = field(default_factory=dict)
+    list_modes: Dict[str, str] = field(default_factory=dict)
+    string_rules: Dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for mode in [self.list_mode, *self.list_modes.values()]:
+            if mode not in LIST_MODES:
+                raise ValueError(f"未知的列表比较模式: {mode}，可选值: {', '.join(LIST_MODES)}")
+        for rule in [self.string_rule, *self.string_rules.values()]:
+            if rule not in STRING_RULES:
+                raise ValueError(f"未知的字符串比较规则: {rule}，可选值: {', '.join(STRING_RULES)}")
+        self._patterns = {
+            name: [(_compile_pattern(p), v) for p, v in table.items() if "*" in p]
+            for name, table in (("tolerances", self.tolerances),
+                                ("list_modes", self.list_modes),
+                                ("string_rules", self.string_rules))
+        }
+        self._lookup_cache: Dict[Tuple[str, str], Any] = {}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "CompareRules":
+        """从 JSON 配置创建，例如测试用例中的 compare.json 代码块"""
+        data = data or {}
+        return cls(
+            tolerance=float(data.get("tolerance", DEFAULT_TOLERANCE)),
+            list_mode=data.get("list_mode", "any"),
+            string_rule=data.get("string_rule", "any"),
+            strict_types=bool(data.get("strict_types", False)),
+            tolerances={k: float(v) for k, v in data.get("tolerances", {}).items()},
+            list_modes=dict(data.get("list_modes", {})),
+            string_rules=dict(data.get("string_rules", {}))
+        )
+
+    def _lookup(self, name: str, path: str, default: Any) -> Any:
+        key = (name, path)
+        if key in self._lookup_cache:
+            return self._lookup_cache[key]
+        value = getattr(self, name).get(path)
+        if value is None:
+            value = next((v for pattern, v in self._patterns[name] if pattern.match(path)), default)
+        self._lookup_cache[key] = value
+        return value
+
+    def tolerance_for(self, path: str) -> float:
+        return self._lookup("tolerances", path, self.tolerance)
+
+    def list_mode_for(self, path: str) -> str:
+        return self._lookup("list_modes", path, self.list_mode)
+
+    def string_rule_for(self, path: str) -> str:
+        return self._lookup("string_rules", path, self.string_rule)
+
+
+DEFAULT_RULES = CompareRules()
+
+
+@dataclass
+class Mismatch:
+    """单个字段的比较差异"""
+    path: str
+    kind: str           # missing / type / value / length / elements
+    expected: Any
+    actual: Any
+    message: str
+
+    def __str__(self):
+        return self.message
+
+
+@dataclass
+class CompareReport:
+    """一次比较的完整结果"""
+    mismatches: List[Mismatch]
+    field_results: Dict[str, bool]    # 期望输出中每个叶子字段路径 -> 是否匹配
+
+    @property
+    def passed(self) -> bool:
+        return not self.mismatches
+
+    @property
+    def errors(self) -> List[str]:
+        return [m.message for m in self.mismatches]
+
+    @property
+    def field_pass_rate(self) -> float:
+        if not self.field_results:
+            return 1.0
+        return sum(self.field_results.values()) / len(self.field_results)
+
+
+def flatten(value: Any, rules: CompareRules = DEFAULT_RULES) -> Dict[str, Tuple[Optional[str], Any]]:
+    """将 JSON 值展开为 路径 -> (父路径, 值) 表
+
+    对象本身记为 DICT 占位值，其字段展开为 "父路径.字段"；
+    ordered 模式的列表展开为 "路径[i]"，其他模式的列表整体作为一个值。
+    按深度优先顺序输出，父路径总是在子路径之前。
+    """
+    table: Dict[str, Tuple[Optional[str], Any]] = {}
+    stack: List[Tuple[str, Optional[str], Any]] = [("", None, value)]
+    while stack:
+        path, parent, current = stack.pop()
+        if isinstance(current, dict):
+            if path:
+                table[path] = (parent, DICT)
+            prefix = f"{path}." if path else ""
+            stack.extend((f"{prefix}{key}", path or None, child) for key, child in reversed(list(current.items())))
+        elif isinstance(current, list) and path and rules.list_mode_for(path) == "ordered":
+            table[path] = (parent, current)
+            stack.extend((f"{path}[{index}]", path, child) for index, child in reversed(list(enumerate(current))))
+        else:
+            table[path] = (parent, current)
+    return table
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+def _describe(values: Counter) -> str:
+    return ", ".join(key if count == 1 else f"{key} x{count}" for key, count in values.items())
+
+
+def _compare_value(path: str, expected: Any, actual: Any, rules: CompareRules) -> Optional[Mismatch]:
+    """比较单个叶子值（对象和 ordered 列表的元素由扁平化表逐项比较）"""
+    expected_type = _type_name(expected)
+    actual_type = _type_name(actual)
+
+    if expected_type == "dict":
+        if actual_type != "dict":
+            return Mismatch(path, "type", expected, actual, f"字段类型不匹配 {path}：期望 dict，实际 {actual_type}")
+        return None
+
+    if not rules.strict_types and expected_type in ("bool", "number"):
+        # 旧版比较逻辑：布尔值也是数值
+        if actual_type not in ("bool", "number"):
+            return Mismatch(path, "type", expected, actual, f"数值类型不匹配 {path}：期望 number，实际 {actual_type}")
+        if abs(actual - expected) > rules.tolerance_for(path):
+            return Mismatch(path, "value", expected, actual, f"数值不匹配 {path}：期望 {expected}，实际 {actual}")
+        return None
+
+    if expected_type == "bool":
+        if actual_type != "bool":
+            return Mismatch(path, "type", expected, actual, f"布尔类型不匹配 {path}：期望 bool，实际 {actual_type}")
+        if actual != expected:
+            return Mismatch(path, "value", expected, actual, f"布尔值不匹配 {path}：期望 {expected}，实际 {actual}")
+        return None
+
+    if expected_type == "number":
+        if actual_type != "number":
+            return Mismatch(path, "type", expected, actual, f"数值类型不匹配 {path}：期望 number，实际 {actual_type}")
+        if abs(actual - expected) > rules.tolerance_for(path):
+            return Mismatch(path, "value", expected, actual, f"数值不匹配 {path}：期望 {expected}，实际 {actual}")
+        return None
+
+    if expected_type == "string":
+        rule = rules.string_rule_for(path)
+        if rule == "any":
+            return None
+        if actual_type != "string":
+            return Mismatch(path, "type", expected, actual, f"字段类型不匹配 {path}：期望 string，实际 {actual_type}")
+        if rule == "exact":
+            matched = actual == expected
+        elif rule == "normalized":
+            matched = _normalize_text(actual) == _normalize_text(expected)
+        elif rule == "regex":
+            matched = re.fullmatch(expected, actual, re.DOTALL) is not None
+        else:
+            matched = True
+        if not matched:
+            return Mismatch(path, "value", expected, actual, f"字符串不匹配 {path}（{rule}）：期望 {expected}，实际 {actual}")
+        return None
+
+    if expected_type == "list":
+        mode = rules.list_mode_for(path)
+        if mode == "any":
+            return None
+        if actual_type != "list":
+            return Mismatch(path, "type", expected, actual, f"列表类型不匹配 {path}：期望 list，实际 {actual_type}")
+        if mode in ("length", "ordered"):
+            if len(actual) != len(expected):
+                return Mismatch(path, "length", expected, actual,
+                                f"列表长度不匹配 {path}：期望 {len(expected)}，实际 {len(actual)}")
+            return None
+        expected_items = Counter(_canonical(item) for item in expected)
+        actual_items = Counter(_canonical(item) for item in actual)
+        missing = expected_items - actual_items
+        extra = actual_items - expected_items if mode == "unordered" else Counter()
+        if missing or extra:
+            details = []
+            if missing:
+                details.append(f"缺少 {_describe(missing)}")
+            if extra:
+                details.append(f"多余 {_describe(extra)}")
+            return Mismatch(path, "elements", expected, actual, f"列表元素不匹配 {path}（{mode}）：{'；'.join(details)}")
+        return None
+
+    if rules.strict_types and actual != expected:
+        return Mismatch(path, "value", expected, actual, f"字段值不匹配 {path}：期望 {expected}，实际 {actual}")
+    return None
+
+
+def compare_outputs(actual: Any, expected: Any, rules: Optional[CompareRules] = None) -> CompareReport:
+    """比较实际输出和期望输出，只检查期望输出中存在的字段，返回全部差异
+
+    两侧先各自展开为路径表，再按期望路径逐项查表比较；
+    某个对象缺失或类型不符时只报告一次，其下的字段不再重复报告（但计为未通过）。
+    """
+    rules = rules or DEFAULT_RULES
+    expected_table = flatten(expected, rules)
+    actual_table = flatten(actual, rules)
+
+    mismatches: List[Mismatch] = []
+    field_results: Dict[str, bool] = {}
+    parents = {parent for parent, _ in expected_table.values()}
+    blocked = set()
+
+    for path, (parent, expected_value) in expected_table.items():
+        if not path:
+            # 期望输出本身不是对象，整体比较
+            mismatch = _compare_value("$", expected_value, actual, rules)
+            if mismatch:
+                mismatches.append(mismatch)
+            field_results["$"] = mismatch is None
+            continue
+
+        is_container = path in parents
+        if parent in blocked:
+            blocked.add(path)
+            if not is_container:
+                field_results[path] = False
+            continue
+
+        if path not in actual_table:
+            mismatch = Mismatch(path, "missing", expected_value, None, f"缺少字段 {path}")
+        else:
+            mismatch = _compare_value(path, expected_value, actual_table[path][1], rules)
+        if mismatch:
+            mismatches.append(mismatch)
+
+        # ordered 列表长度不同时仍逐个比较元素，其他差异不再检查下级字段
+        if mismatch and mismatch.kind != "length":
+            blocked.add(path)
+        if not is_container:
+            field_results[path] = not mismatch
+
+    return CompareReport(mismatches=mismatches, field_results=field_results)
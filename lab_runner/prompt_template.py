@@ -0,0 +1,166 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 提示词文件中使用 {{变量名}} 标记变量，其余花括号都按原样输出
+SLOT_PATTERN = re.compile(r"\{\{([^{}]*)\}\}")
+
+# 两个运行器共用的 JSON 输出约束，附加在每个系统提示词末尾
+JSON_OUTPUT_RULES = """
+
+注意：
+1. 你必须直接返回JSON格式数据，不要在JSON前后添加任何其他文本、对话或说明
+2. 返回的JSON必须是一个完整且有效的JSON对象
+3. 所有字段值必须符合其预期的数据类型（例如：数字、字符串、布尔值、对象等）
+4. 确保所有必需的字段都存在于输出中
+5. 不要在JSON中添加注释
+6. 输出JSON的键值统一使用小写字母
+"""
+
+# 消息布局
+#   inline: 变量直接填入系统提示词，用户消息为测试输入 JSON（默认，与旧版一致）
+#   prefix: 系统提示词只保留静态文本，所有用例完全相同，变量移到末尾的用户消息中，
+#           模型商的提示词前缀缓存可以在第一个用例之后命中
+#           没有 {{变量}} 的提示词在两种布局下系统提示词相同，prefix 只多了 cache_control 标记
+PROMPT_LAYOUTS = ("inline", "prefix")
+
+# prefix 布局中系统提示词里变量位置的引用说明
+SLOT_REFERENCE = "【见用户消息中的 {name}】"
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """预先拆分好的提示词模板
+
+    literals 比 slots 多一个元素，渲染时按 literal, slot, literal, ... 的顺序拼接。
+    """
+    literals: Tuple[str, ...]
+    slots: Tuple[str, ...]
+    fingerprint: str        # 模板全文的 SHA-256
+
+    @property
+    def variables(self) -> frozenset:
+        return frozenset(self.slots)
+
+    @property
+    def template_length(self) -> int:
+        """模板静态文本的长度"""
+        return sum(len(literal) for literal in self.literals)
+
+    def render(self, **values) -> str:
+        """用变量值填充模板，缺少变量时抛出 KeyError"""
+        if not self.slots:
+            return self.literals[0]
+        parts = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            parts.append(str(values[slot]))
+            parts.append(literal)
+        return "".join(parts)
+
+    @cached_property
+    def static_text(self) -> str:
+        """prefix 布局的系统提示词：变量位置替换为引用说明，与用例无关"""
+        return self.render(**{slot: SLOT_REFERENCE.format(name=slot) for slot in self.slots})
+
+    def render_variables(self, **values) -> str:
+        """prefix 布局的变量消息：按变量在模板中首次出现的顺序列出，缺少变量时抛出 KeyError"""
+        return "\n\n".join(f"### {slot}\n{values[slot]}" for slot in dict.fromkeys(self.slots))
+
+
+def compile_prompt(text: str) -> CompiledPrompt:
+    """将提示词文本编译为 CompiledPrompt"""
+    literals = []
+    slots = []
+    position = 0
+    for match in SLOT_PATTERN.finditer(text):
+        literals.append(text[position:match.start()])
+        slots.append(match.group(1).strip())
+        position = match.end()
+    literals.append(text[position:])
+
+    return CompiledPrompt(
+        literals=tuple(literals),
+        slots=tuple(slots),
+        fingerprint=hashlib.sha256(text.encode("utf-8")).hexdigest()
+    )
+
+
+# 编译结果缓存: 文件内容哈希 -> CompiledPrompt
+_compiled_cache: Dict[str, CompiledPrompt] = {}
+
+
+def load_compiled_prompt(prompt_file: Path, suffix: str = JSON_OUTPUT_RULES) -> CompiledPrompt:
+    """读取并编译提示词文件，相同内容的文件只编译一次
+
+    Args:
+        prompt_file: 提示词文件路径
+        suffix: 附加在提示词末尾的固定文本
+    """
+    with open(prompt_file, 'r', encoding='utf-8') as f:
+        text = f.read() + suffix
+
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        compiled = compile_prompt(text)
+        _compiled_cache[key] = compiled
+    return compiled
+
+
+def wants_cache_hint(model_name: str, model_class: Optional[str] = None) -> bool:
+    """模型商是否需要显式的 cache_control 标记
+
+    Anthropic 只缓存带标记的前缀；OpenAI/DeepSeek/Moonshot 等对相同前缀自动缓存，不需要标记。
+    """
+    return model_class == "ChatAnthropic" or "claude" in model_name.lower()
+
+
+def build_messages(prompt: CompiledPrompt, test_case: Dict[str, Any],
+                   layout: str = "inline", cache_hint: bool = False) -> List[Any]:
+    """根据测试用例构建发送给模型的 [SystemMessage, HumanMessage]
+
+    Args:
+        prompt: 编译后的系统提示词
+        test_case: 测试输入（包含 input/context）
+        layout: 消息布局，见 PROMPT_LAYOUTS
+        cache_hint: prefix 布局下为系统提示词附加 cache_control 标记
+    """
+    from langchain.schema import SystemMessage, HumanMessage
+
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"未知的消息布局: {layout}，可选值: {', '.join(PROMPT_LAYOUTS)}")
+
+    input_json = json.dumps(test_case, ensure_ascii=False, indent=2)
+    values = {
+        "input": test_case.get("input", ""),
+        "context": json.dumps(test_case.get("context", {}), ensure_ascii=False)
+    }
+    if layout == "inline":
+        return [
+            SystemMessage(content=prompt.render(**values)),
+            HumanMessage(content=input_json)
+        ]
+
+    if cache_hint:
+        system = SystemMessage(content=[
+            {"type": "text", "text": prompt.static_text, "cache_control": {"type": "ephemeral"}}
+        ])
+    else:
+        system = SystemMessage(content=prompt.static_text)
+    variables = prompt.render_variables(**values)
+    return [
+        system,
+        HumanMessage(content=f"{variables}\n\n### 测试输入\n{input_json}" if variables else input_json)
+    ]
+
+
+def message_text(message: Any) -> str:
+    """消息的纯文本内容（content 可以是字符串或内容块列表）"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(block if isinstance(block, str) else block.get("text", "") for block in content)
@@ -0,0 +1,371 @@
+"""提示词测试的非交互式命令行入口
+
+所有选项都可以通过命令行参数或 JSON 配置文件提供（命令行参数优先），运行过程中不会等待输入，
+结果写出为 JSON Lines 或 JUnit XML，便于脚本调用、CI 集成和多台机器分片运行。
+
+分片运行时每个进程（同一台或不同机器）只运行 (模型, 用例) 稳定哈希落在本分片的组合，
+各自把结果写到共享文件系统上，最后用 --merge 合并为与单机运行相同的结果表。
+分片的 JSON Lines 结果以清单行开头（分片序号和计划运行的组合数），没有分到任何组合的分片也会写出清单，
+合并时按清单检查分片是否缺失或不完整：
+    python prompt_test_cli.py --config sweep.json --shard 0/4 --output sweep/shard-{shard}.jsonl
+    python prompt_test_cli.py --config sweep.json --shard 1/4 --output sweep/shard-{shard}.jsonl
+    ...
+    python prompt_test_cli.py --merge "sweep/shard-*.jsonl" --output sweep/merged.xml
+
+示例：
+    python prompt_test_cli.py --prompt-system 建造系统 --models gpt-4-turbo,glm-4 --output results.jsonl
+    python prompt_test_cli.py --config sweep.json --cases "1：*" --format junit --output report.xml
+    python prompt_test_cli.py --prompt-system 资源管理 --list
+
+配置文件示例（键名与命令行参数相同，使用下划线）：
+    {"prompt_system": "建造系统", "models": ["gpt-4-turbo"], "cases": ["1：*"],
+     "concurrency": 8, "cache_mode": "replay", "output": "results.jsonl"}
+"""
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import glob
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 输出格式
+OUTPUT_FORMATS = ("jsonl", "junit")
+
+# 可写在配置文件中的选项及其默认值
+CONFIG_DEFAULTS = {
+    "prompt_system": None,
+    "models": None,
+    "cases": None,
+    "exclude": None,
+    "concurrency": None,
+    "cache_mode": None,
+    "layout": None,
+    "temperature": None,
+    "incremental": False,
+    "output": "-",
+    "format": None,
+    "shard": None,
+    "results_db": None
+}
+
+
+def _split_list(value: Any) -> Optional[List[str]]:
+    """命令行中的逗号分隔字符串或配置文件中的列表"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item.strip() for item in value if item and item.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="非交互式运行提示词测试，输出 JSON Lines 或 JUnit XML",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--config", help="JSON 配置文件路径，命令行参数覆盖其中的同名选项")
+    parser.add_argument("--prompt-system", help="提示词系统名称，例如 建造系统")
+    parser.add_argument("--models", help="逗号分隔的模型列表，baseline 表示完整测试模型列表（默认）")
+    parser.add_argument("--cases", help="逗号分隔的用例名称或通配符模式，默认运行全部用例")
+    parser.add_argument("--exclude", help="逗号分隔的排除用例名称或通配符模式")
+    parser.add_argument("--concurrency", type=int, help="每个模型商的最大并发请求数（MAX_CONCURRENCY）")
+    parser.add_argument("--cache-mode", help="响应缓存模式: auto/readwrite/record/replay/off，"
+                                             "默认 auto（只缓存 temperature 为 0 的调用；默认 TEMPERATURE=0.7，"
+                                             "此时不使用缓存，需要回放时加 --temperature 0 或指定 readwrite/replay）")
+    parser.add_argument("--layout", help="消息布局: inline/prefix")
+    parser.add_argument("--temperature", type=float, help="模型 temperature")
+    parser.add_argument("--incremental", action="store_true", default=None,
+                        help="增量模式，只运行提示词或用例变更过的用例")
+    parser.add_argument("--output", help="结果输出路径，- 表示标准输出（默认）")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS,
+                        help="输出格式，默认根据输出文件扩展名判断（.xml 为 junit，其他为 jsonl）")
+    parser.add_argument("--shard", help="只运行第 i 个分片（共 N 个，i 从 0 开始），格式 i/N；"
+                                        "输出路径中的 {shard} 会替换为 i")
+    parser.add_argument("--results-db", metavar="PATH",
+                        help="同时把逐用例结果（含 token 用量和费用）批量写入 SQLite 结果库，"
+                             "例如 test_logs/results.db，可在 Streamlit 界面中查看用量汇总")
+    parser.add_argument("--merge", nargs="+", metavar="FILE",
+                        help="合并多个分片的 JSON Lines 结果文件（支持通配符）并输出结果表，"
+                             "指定 --output 时同时写出合并后的结果")
+    parser.add_argument("--list", action="store_true", help="只列出提示词系统和测试用例，不调用模型")
+    return parser
+
+
+def load_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """合并配置文件和命令行参数"""
+    options = dict(CONFIG_DEFAULTS)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        unknown = set(config) - set(CONFIG_DEFAULTS)
+        if unknown:
+            raise ValueError(f"配置文件中有未知的选项: {', '.join(sorted(unknown))}")
+        options.update(config)
+    for key in CONFIG_DEFAULTS:
+        value = getattr(args, key, None)
+        if value is not None:
+            options[key] = value
+
+    options["models"] = _split_list(options["models"])
+    options["cases"] = _split_list(options["cases"])
+    options["exclude"] = _split_list(options["exclude"])
+    if options["shard"] is not None:
+        from sharding import parse_shard_spec
+        options["shard"] = parse_shard_spec(options["shard"])
+        options["output"] = str(options["output"]).replace("{shard}", str(options["shard"][0]))
+    if options["format"] is None:
+        output = str(options["output"])
+        options["format"] = "junit" if output.lower().endswith(".xml") else "jsonl"
+    if options["format"] not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的输出格式: {options['format']}，可选值: {', '.join(OUTPUT_FORMATS)}")
+    return options
+
+
+def resolve_models(models: Optional[List[str]]) -> List[str]:
+    """展开模型列表中的 baseline"""
+    from prompt_test_runner import ALL_TEST_MODELS
+
+    resolved = []
+    for model in models or ["baseline"]:
+        for name in (ALL_TEST_MODELS if model == "baseline" else [model]):
+            if name not in resolved:
+                resolved.append(name)
+    return resolved
+
+
+def filter_cases(test_cases: List[Any], include: Optional[List[str]],
+                 exclude: Optional[List[str]] = None) -> List[Any]:
+    """按用例名称或通配符模式筛选测试用例，保持文件中的顺序"""
+    def matches(name: str, patterns: List[str]) -> bool:
+        return any(name == pattern or fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+    selected = [case for case in test_cases if not include or matches(case.name, include)]
+    return [case for case in selected if not exclude or not matches(case.name, exclude)]
+
+
+def case_records(prompt_system: str, test_time: str, model_results: List[Dict[str, Any]],
+                 test_cases: List[Any], shard: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    """把每个模型的汇总结果展开为逐用例记录（JSON Lines 的每一行）
+
+    分片运行的结果带有 case_names（本分片运行的用例），记录中附加 "i/N" 形式的 shard 字段。
+    """
+    records = []
+    for result in model_results:
+        case_names = result["case_names"] if "case_names" in result else [test_case.name for test_case in test_cases]
+        for i, case_name in enumerate(case_names):
+            latency = result["latencies"][i] if result["latencies"] else None
+            record = {
+                "test_time": test_time,
+                "prompt_system": prompt_system,
+                "model": result["model"],
+                "case": case_name,
+                "passed": bool(result["results"][i]),
+                "execution_time": result["test_times"][i],
+                "latency": latency.to_dict() if latency else None
+            }
+            if shard is not None:
+                record["shard"] = f"{shard[0]}/{shard[1]}"
+            records.append(record)
+    return records
+
+
+def write_jsonl(records: List[Dict[str, Any]], stream):
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def write_junit(records: List[Dict[str, Any]], stream):
+    """每个 (提示词系统, 模型) 为一个 testsuite，每个用例为一个 testcase"""
+    suites: Dict[tuple, List[Dict[str, Any]]] = {}
+    for record in records:
+        suites.setdefault((record["prompt_system"], record["model"]), []).append(record)
+
+    root = ET.Element("testsuites", {
+        "name": "prompt_lab",
+        "tests": str(len(records)),
+        "failures": str(sum(1 for r in records if not r["passed"])),
+        "time": f"{sum(r['execution_time'] for r in records):.3f}"
+    })
+    for (prompt_system, model), suite_records in suites.items():
+        suite = ET.SubElement(root, "testsuite", {
+            "name": f"{prompt_system}/{model}",
+            "tests": str(len(suite_records)),
+            "failures": str(sum(1 for r in suite_records if not r["passed"])),
+            "time": f"{sum(r['execution_time'] for r in suite_records):.3f}",
+            "timestamp": suite_records[0]["test_time"].replace(" ", "T")
+        })
+        for record in suite_records:
+            case = ET.SubElement(suite, "testcase", {
+                "classname": f"{prompt_system}.{model}",
+                "name": record["case"],
+                "time": f"{record['execution_time']:.3f}"
+            })
+            if not record["passed"]:
+                ET.SubElement(case, "failure", {"message": "输出与期望不匹配或调用失败"})
+            if record["latency"]:
+                ET.SubElement(case, "system-out").text = json.dumps(record["latency"], ensure_ascii=False)
+    ET.indent(root)
+    stream.write(ET.tostring(root, encoding="unicode", xml_declaration=True) + "\n")
+
+
+def write_results(records: List[Dict[str, Any]], output: str, output_format: str):
+    writer = write_junit if output_format == "junit" else write_jsonl
+    if output == "-":
+        writer(records, sys.stdout)
+        sys.stdout.flush()
+        return
+    # 先写临时文件再改名，合并分片时不会读到写了一半的文件
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        writer(records, f)
+    os.replace(temp_path, path)
+
+
+def store_records(records: List[Dict[str, Any]], db_path: str):
+    """把逐用例记录写入结果库，所有记录在一个事务中批量写入"""
+    from results_store import ResultsStore
+
+    store = ResultsStore(Path(db_path), batch_size=len(records) + 1)
+    try:
+        for record in records:
+            store.add(record["test_time"], record["prompt_system"], record["model"], record["case"], record)
+    finally:
+        store.close()
+    print(f"🗄️ 已写入 {len(records)} 条结果到 {db_path}", file=sys.stderr)
+
+
+def case_names_of(prompt_system: str) -> List[str]:
+    """提示词系统测试用例文件中的用例名称（只解析用例文件，不创建模型客户端）"""
+    from case_parser import iter_test_cases
+    from prompt_test_runner import PROMPT_CONFIGS, PROMPT_DIR
+
+    config = PROMPT_CONFIGS.get(prompt_system)
+    if config is None:
+        return []
+    test_file = Path(__file__).parent.parent / PROMPT_DIR / config["test_cases"]
+    return [test_case.name for test_case in iter_test_cases(str(test_file))]
+
+
+def list_cases(prompt_system: Optional[str]):
+    """列出提示词系统及其测试用例"""
+    from prompt_test_runner import PROMPT_CONFIGS
+
+    for name, config in PROMPT_CONFIGS.items():
+        if prompt_system and name != prompt_system:
+            continue
+        print(f"📋 {name} ({config['test_cases']})")
+        for case_name in case_names_of(name):
+            print(f"  {case_name}")
+
+
+def merge(patterns: List[str], options: Dict[str, Any]) -> int:
+    """合并分片结果并输出与单机运行相同的结果表，全部通过且没有缺失分片时返回 0"""
+    from prompt_test_runner import print_model_results
+    from sharding import merge_records, missing_shards, read_records, split_manifests, summarize_records
+
+    paths = sorted({path for pattern in patterns for path in (glob.glob(pattern) or [pattern])})
+    manifests, records = split_manifests(read_records(Path(path) for path in paths))
+    records = merge_records(records)
+    if not records and not manifests:
+        raise ValueError("分片结果文件中没有任何记录")
+    print(f"📥 从 {len(paths)} 个文件合并了 {len(records)} 条用例结果")
+
+    missing = missing_shards(records, manifests)
+    if missing:
+        print(f"⚠️ 以下分片还没有结果: {', '.join(missing)}")
+
+    for prompt_system in dict.fromkeys(record["prompt_system"] for record in records):
+        system_records = [record for record in records if record["prompt_system"] == prompt_system]
+        # 按测试用例文件中的顺序排列，文件中已不存在的用例排在后面
+        case_order = list(dict.fromkeys(case_names_of(prompt_system) + [r["case"] for r in system_records]))
+        print(f"\n📋 提示词系统: {prompt_system}")
+        print_model_results(summarize_records(system_records, case_order)[prompt_system], case_order)
+
+    if options["output"] != "-":
+        write_results(records, str(options["output"]), options["format"])
+    if options["results_db"]:
+        store_records(records, str(options["results_db"]))
+    return 0 if not missing and all(record["passed"] for record in records) else 1
+
+
+def run(options: Dict[str, Any]) -> int:
+    """按选项运行测试并写出结果，返回进程退出码（全部通过为 0，有失败为 1）"""
+    if not options["prompt_system"]:
+        raise ValueError("必须通过 --prompt-system 或配置文件指定提示词系统")
+
+    # 运行器从环境变量读取这些配置，需要在创建运行器之前设置
+    if options["concurrency"]:
+        os.environ["MAX_CONCURRENCY"] = str(options["concurrency"])
+    if options["cache_mode"]:
+        os.environ["RESPONSE_CACHE_MODE"] = options["cache_mode"]
+    if options["layout"]:
+        os.environ["PROMPT_LAYOUT"] = options["layout"]
+    if options["temperature"] is not None:
+        os.environ["TEMPERATURE"] = str(options["temperature"])
+
+    from prompt_test_runner import PromptTestRunner
+
+    # 结果写到标准输出时，运行过程的日志改为输出到标准错误
+    log_stream = sys.stderr if options["output"] == "-" else sys.stdout
+    with contextlib.redirect_stdout(log_stream):
+        runner = PromptTestRunner(prompt_system=options["prompt_system"])
+        temperature = float(os.getenv("TEMPERATURE", "0.7"))
+        if runner.response_cache.mode == "auto" and runner.response_cache.mode_for(temperature) == "off":
+            print(f"ℹ️ 缓存模式 auto 只缓存 temperature 为 0 的调用，当前 temperature={temperature}，本次不使用响应缓存")
+        test_file = Path(__file__).parent.parent / runner.prompt_dir / runner.test_cases_filename
+        test_cases = filter_cases(runner.load_test_cases(str(test_file)), options["cases"], options["exclude"])
+        if not test_cases:
+            raise ValueError("筛选后没有可执行的测试用例")
+
+        models = resolve_models(options["models"])
+        test_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        shard = options["shard"]
+        if shard is not None:
+            if options["incremental"]:
+                raise ValueError("分片运行不支持增量模式")
+            model_results = runner.run_models_sharded(models, test_cases, *shard)
+        else:
+            model_results = runner.run_models_concurrently(models, test_cases, incremental=bool(options["incremental"]))
+
+        from prompt_test_runner import print_model_results
+        print_model_results(model_results, [test_case.name for test_case in test_cases],
+                            runner.response_cache, runner.prompt_layout, bool(options["incremental"]))
+
+    records = case_records(options["prompt_system"], test_time, model_results, test_cases, shard)
+    output_records = records
+    if shard is not None and options["format"] != "junit":
+        # 分片结果以清单开头，合并时即使本分片没有分到任何组合也能确认它已经运行完
+        from sharding import shard_manifest
+        planned = sum(len(result["case_names"]) for result in model_results)
+        output_records = [shard_manifest(options["prompt_system"], test_time, *shard, planned)] + records
+    write_results(output_records, str(options["output"]), options["format"])
+    if options["results_db"]:
+        store_records(records, str(options["results_db"]))
+    return 0 if all(record["passed"] for record in records) else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        options = load_options(args)
+        if args.list:
+            list_cases(options["prompt_system"])
+            return 0
+        if args.merge:
+            return merge(args.merge, options)
+        return run(options)
+    except (ValueError, OSError) as e:
+        print(f"❌ {str(e)}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,23 @@
 import json
 import os
-from typing import Dict, Any, List
-from dataclasses import dataclass
+import sys
+from typing import Dict, Any, List, Optional
 from pathlib import Path
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
 from dotenv import load_dotenv
 import logging
 import time  # 添加在文件开头的import部分
+from response_cache import ResponseCache
+from case_parser import TestCase, iter_test_cases
+from prompt_template import build_messages, load_compiled_prompt, wants_cache_hint, PROMPT_LAYOUTS
+from latency_metrics import LatencyCallbackHandler, LatencyMetrics, summarize_latencies
+from usage_ledger import format_cost, summarize_usage
+from output_diff import CompareRules, compare_outputs
+
+# 共用的模型调用基础设施位于仓库根目录的 llm_common 包
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+# 模型实例创建（连接池、限流）与其他工具共用模型商注册表
+from llm_common.model_registry import LIST_PRICES, ModelVendorConfig, create_chat
+from llm_common.rate_limiter import RateLimitedChat, track_wait
 
 #import ssl
 #ssl._create_default_https_context = ssl._create_unverified_context
@@ -17,47 +26,71 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class TestCase:
-    name: str
-    input_data: Dict[str, Any]
-    expected_output: Dict[str, Any]
+# 提示词目录（相对仓库根目录）
+PROMPT_DIR = "prompt_engineering/bot194/01"
+
+# 提示词系统 -> 提示词文件和测试用例文件
+PROMPT_CONFIGS = {
+    "建造系统": {
+        "prompt": "bot_skill_build_prompt_02.md",
+        "test_cases": "bot_skill_build_test_cases.md"
+    },
+    "资源管理": {
+        "prompt": "resource_manager_prompt_02.md",
+        "test_cases": "resource_manager_test_cases.md"
+    },
+    "数组定义": {
+        "prompt": "array_definition_prompt.md",
+        "test_cases": "array_definition_test_cases.md"
+    },
+}
+
+# 单选模型列表
+SELECTABLE_MODELS = [
+    "moonshot-v1-32k",
+    "Doubao-pro-128k",
+    "gpt-3.5-turbo",
+    "claude-3-sonnet-20240229",
+    "claude-3-5-sonnet-20240620",
+    "claude-3-5-sonnet-20241022",
+    "c-3-5-sonnet-20241022",
+    "gpt-4-turbo",
+    "qwen-max",
+    "glm-4"
+]
 
-@dataclass
-class TestResult:
-    test_case: TestCase
-    actual_output: Dict[str, Any]
-    passed: bool
-    error_message: str = ""
-    execution_time: float = 0.0  # 添加执行时间字段
+# 完整测试模型列表（当选择"测试所有模型"时使用）
+ALL_TEST_MODELS = [
+    "moonshot-v1-32k",
+    "Doubao-pro-128k",
+    "claude-3-5-sonnet-20241022",
+    "gpt-4-turbo",
+    "glm-4"
+]
 
 class PromptTestRunner:
-    def __init__(self):
+    def __init__(self, prompt_system: Optional[str] = None):
+        """
+        Args:
+            prompt_system: 提示词系统名称（PROMPT_CONFIGS 的键），为 None 时在命令行中交互选择
+        """
         load_dotenv()
 #        model_name = os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo")
         
         # 定义提示词目录
-        self.prompt_dir = "prompt_engineering/bot194/01"  # 改为正确的目录路径
+        self.prompt_dir = PROMPT_DIR
         
         # 定义提示词配置映射
-        self.prompt_configs = {
-            "建造系统": {
-                "prompt": "bot_skill_build_prompt_02.md",
-                "test_cases": "bot_skill_build_test_cases.md"
-            },
-            "资源管理": {
-                "prompt": "resource_manager_prompt_02.md",
-                "test_cases": "resource_manager_test_cases.md"
-            },
-            "数组定义": {
-                "prompt": "array_definition_prompt.md",
-                "test_cases": "array_definition_test_cases.md"
-            },
-
-        }
+        self.prompt_configs = PROMPT_CONFIGS
         
         # 选择提示词配置
-        self.select_prompt_config()
+        if prompt_system is None:
+            self.select_prompt_config()
+        else:
+            self.use_prompt_config(prompt_system)
+
+        # LLM 响应缓存（模式由环境变量 RESPONSE_CACHE_MODE 控制）
+        self.response_cache = ResponseCache()
         
         # 根据不同模型配置合适的参数
 #        temperature = float(os.getenv("TEMPERATURE", "0.7"))
@@ -71,40 +104,19 @@ class PromptTestRunner:
 #        )
         
 
-        # 从文件加载系统提示词
+        # 从文件加载并编译系统提示词（{{变量}} 为模板变量，末尾附加 JSON 输出约束）
         prompt_file = Path(__file__).parent.parent / self.prompt_dir / self.prompt_filename
         print(f"Loading prompt from: {prompt_file}")
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # 处理提示词中的变量标记
-        content = content.replace("{", "{{").replace("}", "}}")  # 转义所有的花括号
-        content = content.replace("{{{{", "{").replace("}}}}", "}")  # 恢复原有的双花括号
-
-#当前输入: {{input}}
-#当前上下文: {{context}}
-
-        # 系统提示词模板(注入模板标记)
-        self.system_prompt = content + f"""
-
-注意：
-1. 你必须直接返回JSON格式数据，不要在JSON前后添加任何其他文本、对话或说明
-2. 返回的JSON必须是一个完整且有效的JSON对象
-3. 所有字段值必须符合其预期的数据类型（例如：数字、字符串、布尔值、对象等）
-4. 确保所有必需的字段都存在于输出中
-5. 不要在JSON中添加注释
-6. 输出JSON的键值统一使用小写字母
-"""
-
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt)
-        ])
-#        self.prompt = ChatPromptTemplate.from_messages([
-#            SystemMessage(content=self.system_prompt)
-#        ])
+        self.system_prompt = load_compiled_prompt(prompt_file)
+
+        # 消息布局：inline 把变量填入系统提示词；prefix 让所有用例共用相同的系统提示词，
+        # 以便命中模型商的提示词前缀缓存（环境变量 PROMPT_LAYOUT）
+        self.prompt_layout = os.getenv("PROMPT_LAYOUT", "inline")
+        if self.prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"未知的消息布局: {self.prompt_layout}，可选值: {', '.join(PROMPT_LAYOUTS)}")
 
 #        print(f"使用模型: {model_name}")
-        print("提示词加载完成，长度：", len(self.system_prompt))
+        print("提示词加载完成，长度：", self.system_prompt.template_length)
 
     def select_prompt_config(self):
         """选择要测试的提示词配置"""
@@ -117,77 +129,35 @@ class PromptTestRunner:
                 choice = input("\n请选择要测试的提示词系统 (1-{}): ".format(len(self.prompt_configs)))
                 choice = int(choice)
                 if 1 <= choice <= len(self.prompt_configs):
-                    selected_name = list(self.prompt_configs.keys())[choice - 1]
-                    config = self.prompt_configs[selected_name]
-                    self.prompt_filename = config["prompt"]
-                    self.test_cases_filename = config["test_cases"]
-                    print(f"\n✅ 已选择: {selected_name}")
-                    print(f"提示词文件: {self.prompt_filename}")
-                    print(f"测试用例文件: {self.test_cases_filename}")
+                    self.use_prompt_config(list(self.prompt_configs.keys())[choice - 1])
                     break
                 print(f"❌ 无效的选择，请输入1-{len(self.prompt_configs)}之间的数字")
             except ValueError:
                 print("❌ 请输入有效的数字")
 
+    def use_prompt_config(self, prompt_system: str):
+        """按名称选择提示词配置，名称不存在时抛出 ValueError"""
+        if prompt_system not in self.prompt_configs:
+            raise ValueError(f"未知的提示词系统: {prompt_system}，可选值: {', '.join(self.prompt_configs)}")
+        config = self.prompt_configs[prompt_system]
+        self.prompt_system = prompt_system
+        self.prompt_filename = config["prompt"]
+        self.test_cases_filename = config["test_cases"]
+        print(f"\n✅ 已选择: {prompt_system}")
+        print(f"提示词文件: {self.prompt_filename}")
+        print(f"测试用例文件: {self.test_cases_filename}")
+
     def load_test_cases(self, test_file_path: str) -> List[TestCase]:
         """从Markdown文件加载测试用例"""
         test_cases = []
+        issues = []
         
-        with open(test_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        def extract_json_content(text: str, marker: str) -> str:
-            """从文本中提取JSON内容"""
-            start_marker = f"##### {marker}\n```json"
-            end_marker = "```"
-            start = text.find(start_marker)
-            if start == -1:
-                return ""
-            start = start + len(start_marker)
-            end = text.find(end_marker, start)
-            if end == -1:
-                return ""
-            json_text = text[start:end].strip()
-            return json_text
-        
-        # 分割测试用例部分
-        test_sections = content.split('#### 测试用例')
+        for test_case in iter_test_cases(test_file_path, issues):
+            test_cases.append(test_case)
+            print(f"✅ 成功加载测试用例: {test_case.name}")
         
-        for section in test_sections[1:]:  # 跳过第一个分割（文件头部）
-            try:
-                # 提取测试用例名称
-                name = section.split('\n')[0].strip()
-                
-                # 提取input.json和output.json内容
-                input_text = extract_json_content(section, "input.json")
-                output_text = extract_json_content(section, "output.json")
-                
-                if not input_text or not output_text:
-                    print(f"⚠️ 警告: 测试用例 {name} 缺少输入或输出JSON")
-                    continue
-                
-                # 解析JSON
-                try:
-                    input_json = json.loads(input_text)
-                    output_json = json.loads(output_text)
-                    
-                    test_cases.append(TestCase(
-                        name=name,
-                        input_data=input_json,
-                        expected_output=output_json
-                    ))
-                    print(f"✅ 成功加载测试用例: {name}")
-                except json.JSONDecodeError as je:
-                    print(f"❌ JSON解析错误 - 测试用例 {name}:")
-                    print(f"  Input JSON:\n{input_text[:200]}")
-                    print(f"  Output JSON:\n{output_text[:200]}")
-                    print(f"  错误信息: {str(je)}")
-                    continue
-                    
-            except Exception as e:
-                print(f"❌ 解析错误 - 测试用例 {name if 'name' in locals() else 'unknown'}:")
-                print(f"  错误信息: {str(e)}")
-                continue
+        for issue in issues:
+            print(f"❌ 解析错误 - {issue}")
         
         if not test_cases:
             print("⚠️ 警告: 没有成功加载任何测试用例")
@@ -196,125 +166,165 @@ class PromptTestRunner:
             
         return test_cases
 
-    def run_test(self, test_case: Dict[str, Any], expected_output: Dict[str, Any]) -> tuple[bool, float]:
-        """运行单个测试用例并返回结果和执行时间"""
-        start_time = time.time()  # 记录开始时间
+    def _build_messages(self, test_case: Dict[str, Any], model_name: str = "") -> list:
+        """根据测试用例构建发送给模型的消息列表（按 self.prompt_layout 布局）"""
+        return build_messages(self.system_prompt, test_case, self.prompt_layout,
+                              cache_hint=wants_cache_hint(model_name))
+
+    @staticmethod
+    def _parse_response(content: str) -> Dict[str, Any]:
+        """从模型响应中提取 JSON 对象，解析失败时抛出 json.JSONDecodeError"""
+        # 清理响应内容，删除 JSON 前后的所有内容
+        json_start = content.find('{')
+        json_end = content.rfind('}')
+        if json_start != -1 and json_end != -1:
+            content = content[json_start:json_end + 1]
+        return json.loads(content)
+
+    def _evaluate_response(self, content: str, test_case: Dict[str, Any],
+                           expected_output: Dict[str, Any], start_time: float,
+                           compare_rules: Optional[Dict[str, Any]] = None) -> bool:
+        """解析模型响应并与期望输出比较，返回是否通过"""
         try:
-            # 准备输入
-            input_json = json.dumps(test_case, ensure_ascii=False, indent=2)
-            
-            # 构建消息格式
-            system_content = self.system_prompt.format(
-                input=test_case.get("input", ""),
-                context=json.dumps(test_case.get("context", {}), ensure_ascii=False)
-            )
-            
-            # 调用API
-            try:
-                #result = self.chat.invoke(
-                #    [{"role": "system", "content": system_content}]
-                #)
-                # 使用将context和input 直接变成 HumanMessage
-                messages = []
-                messages.append(SystemMessage(content=system_content))
-                messages.append(HumanMessage(content=input_json))
-
-                #messages.append(SystemMessage(content="you are a helpful assistant."))
-                #messages.append(HumanMessage(content="my name is bob."))
-                #print(messages)
-
-                result = self.chat.invoke(messages)
-
-
-                # 解析输出
-                try:
-                    # 清理响应内容，删除 JSON 前后的所有内容
-                    content = result.content
-                    json_start = content.find('{')
-                    json_end = content.rfind('}')
-                    if json_start != -1 and json_end != -1:
-                        content = content[json_start:json_end + 1]
-                    
-                    output = json.loads(content)
-                    # 验证输出格式
-                    self._validate_output_format(output)
-                    # 比较输出
-                    if self._compare_outputs(output, expected_output):
-                        print(f"✅ 测试通过 (耗时: {time.time() - start_time:.2f}秒)")
-                        return True, time.time() - start_time
-                    else:
-                        print(f"\n❌ 测试失败 (耗时: {time.time() - start_time:.2f}秒)")
-                        print("\n测试用例:")
-                        print("输入:")
-                        print(json.dumps(test_case, ensure_ascii=False, indent=2))
-                        print("\n期望输出:")
-                        print(json.dumps(expected_output, ensure_ascii=False, indent=2))
-                        print("\n实际输出:")
-                        print(json.dumps(output, ensure_ascii=False, indent=2))
-                        return False, time.time() - start_time
-                except json.JSONDecodeError:
-                    print(f"\n❌ AI响应不是有效的JSON格式:")
-                    print(result.content)
-                    print("\n测试用例:")
-                    print("输入:")
-                    print(json.dumps(test_case, ensure_ascii=False, indent=2))
-                    print("\n期望输出:")
-                    print(json.dumps(expected_output, ensure_ascii=False, indent=2))
-                    return False, time.time() - start_time
-                    
-            except Exception as e:
-                print(f"\n❌ API调用错误: {str(e)}")
-                logger.error(f"API调用错误: {str(e)}")
-                return False, time.time() - start_time
-                
-        except Exception as e:
-            print(f"\n❌ 测试执行出错: {str(e)} (耗时: {time.time() - start_time:.2f}秒)")
+            output = self._parse_response(content)
+            # 验证输出格式
+            self._validate_output_format(output)
+            # 比较输出
+            if self._compare_outputs(output, expected_output, compare_rules):
+                print(f"✅ 测试通过 (耗时: {time.time() - start_time:.2f}秒)")
+                return True
+            else:
+                print(f"\n❌ 测试失败 (耗时: {time.time() - start_time:.2f}秒)")
+                print("\n测试用例:")
+                print("输入:")
+                print(json.dumps(test_case, ensure_ascii=False, indent=2))
+                print("\n期望输出:")
+                print(json.dumps(expected_output, ensure_ascii=False, indent=2))
+                print("\n实际输出:")
+                print(json.dumps(output, ensure_ascii=False, indent=2))
+                return False
+        except json.JSONDecodeError:
+            print(f"\n❌ AI响应不是有效的JSON格式:")
+            print(content)
             print("\n测试用例:")
             print("输入:")
             print(json.dumps(test_case, ensure_ascii=False, indent=2))
             print("\n期望输出:")
             print(json.dumps(expected_output, ensure_ascii=False, indent=2))
-            return False, time.time() - start_time
-
-    def _compare_outputs(self, actual: Dict[str, Any], expected: Dict[str, Any]) -> bool:
-        """比较实际输出和预期输出只检查测试用例中存在的键值"""
-        def compare_dicts(actual_dict: Dict[str, Any], expected_dict: Dict[str, Any], path: str = "") -> bool:
-            for key, expected_value in expected_dict.items():
-                if key not in actual_dict:
-                    print(f"❌ 缺少字段 {path}{key}")
-                    return False
-                    
-                actual_value = actual_dict[key]
-                
-                if isinstance(expected_value, dict):
-                    if not isinstance(actual_value, dict):
-                        print(f"字段类型不匹配 {path}{key}")
-                        return False
-                    if not compare_dicts(actual_value, expected_value, f"{path}{key}."):
-                        return False
-                elif isinstance(expected_value, (int, float)):
-                    if not isinstance(actual_value, (int, float)):
-                        print(f"❌ 数值类型不匹配 {path}{key}")
-                        return False
-                    if abs(actual_value - expected_value) > 0.01:  # 允许小数点误差
-                        print(f"❌ 数值不匹配 {path}{key}:")
-                        print(f"   期望: {expected_value}")
-                        print(f"   实际: {actual_value}")
-                        return False
-                elif isinstance(expected_value, bool):
-                    if not isinstance(actual_value, bool):
-                        print(f"❌ 布尔类型不匹配 {path}{key}")
-                        return False
-                    if actual_value != expected_value:
-                        print(f"❌ 布尔值不匹配 {path}{key}:")
-                        print(f"   期望: {expected_value}")
-                        print(f"   实际: {actual_value}")
-                        return False
-                    
-            return True
-            
-        # 检查测试用例中存在的字段
-        return compare_dicts(actual, expected)
+            return False
+
+    def _report_test_error(self, error: Exception, test_case: Dict[str, Any],
+                           expected_output: Dict[str, Any], start_time: float):
+        """输出测试执行阶段（非API调用）的错误信息"""
+        print(f"\n❌ 测试执行出错: {str(error)} (耗时: {time.time() - start_time:.2f}秒)")
+        print("\n测试用例:")
+        print("输入:")
+        print(json.dumps(test_case, ensure_ascii=False, indent=2))
+        print("\n期望输出:")
+        print(json.dumps(expected_output, ensure_ascii=False, indent=2))
+
+    @staticmethod
+    def _chat_identity(chat) -> tuple:
+        """返回用于缓存键的 (模型, API基础URL, temperature)"""
+        return (
+            getattr(chat, "model_name", None) or getattr(chat, "model", ""),
+            getattr(chat, "openai_api_base", None) or os.getenv("OPENAI_API_BASE"),
+            getattr(chat, "temperature", None)
+        )
+
+    def _grade_test(self, test_case: Dict[str, Any], expected_output: Dict[str, Any],
+                    compare_rules: Optional[Dict[str, Any]], start_time: float,
+                    latency: LatencyCallbackHandler, content: Optional[str] = None,
+                    error: Optional[Exception] = None,
+                    api_error: bool = False) -> tuple[bool, float, Optional[LatencyMetrics], bool]:
+        """run_test 和 arun_test 共用的评分逻辑：解析、验证、比较模型响应并汇总指标
+
+        Args:
+            content: 模型响应文本
+            error: 构建消息或调用模型时抛出的异常，不为 None 时不再评分
+            api_error: error 是否来自模型调用（限流、超时、网络错误等）
+        Returns:
+            (是否通过, 执行时间, 流式延迟指标, 是否为API调用错误)
+        """
+        if error is None:
+            try:
+                passed = self._evaluate_response(content, test_case, expected_output, start_time, compare_rules)
+                return passed, time.time() - start_time, latency.metrics(), False
+            except Exception as e:
+                # 输出格式错误等评分阶段的异常不是API调用错误
+                error = e
+        if api_error:
+            print(f"\n❌ API调用错误: {str(error)}")
+            logger.error(f"API调用错误: {str(error)}")
+        else:
+            self._report_test_error(error, test_case, expected_output, start_time)
+        return False, time.time() - start_time, latency.metrics(), api_error
+
+    def run_test(self, test_case: Dict[str, Any], expected_output: Dict[str, Any],
+                 chat=None, compare_rules: Optional[Dict[str, Any]] = None) -> tuple[bool, float, Optional[LatencyMetrics], bool]:
+        """运行单个测试用例并返回结果、执行时间、流式延迟指标（命中响应缓存时为 None）和是否为API调用错误
+
+        Args:
+            test_case: 测试输入
+            expected_output: 期望输出
+            chat: 使用的聊天模型实例，默认为 self.chat
+            compare_rules: 测试用例的比较规则
+        """
+        start_time = time.time()  # 记录开始时间
+        chat = chat or self.chat
+        latency = self._usage_handler(chat)
+        try:
+            messages = self._build_messages(test_case, self._chat_identity(chat)[0])
+        except Exception as e:
+            return self._grade_test(test_case, expected_output, compare_rules, start_time, latency, error=e)
+
+        content, error = None, None
+        with track_wait() as waited:
+            try:
+                content = self.response_cache.invoke(chat, messages, *self._chat_identity(chat), callbacks=[latency])
+            except Exception as e:
+                error = e
+        # 限流排队和退避等待不计入执行时间
+        return self._grade_test(test_case, expected_output, compare_rules, start_time + waited.seconds, latency,
+                                content, error, api_error=error is not None)
+
+    async def arun_test(self, test_case: Dict[str, Any], expected_output: Dict[str, Any],
+                        chat, compare_rules: Optional[Dict[str, Any]] = None) -> tuple[bool, float, Optional[LatencyMetrics], bool]:
+        """run_test 的异步版本，使用 ainvoke 调用模型
+
+        执行时间只统计本用例实际调用和解析的耗时，不包含并发排队和限流等待的时间。
+        """
+        start_time = time.time()
+        latency = self._usage_handler(chat)
+        try:
+            messages = self._build_messages(test_case, self._chat_identity(chat)[0])
+        except Exception as e:
+            return self._grade_test(test_case, expected_output, compare_rules, start_time, latency, error=e)
+
+        content, error = None, None
+        with track_wait() as waited:
+            try:
+                content = await self.response_cache.ainvoke(chat, messages, *self._chat_identity(chat),
+                                                            callbacks=[latency])
+            except Exception as e:
+                error = e
+        return self._grade_test(test_case, expected_output, compare_rules, start_time + waited.seconds, latency,
+                                content, error, api_error=error is not None)
+
+    def _compare_outputs(self, actual: Dict[str, Any], expected: Dict[str, Any],
+                         compare_rules: Optional[Dict[str, Any]] = None) -> bool:
+        """比较实际输出和预期输出只检查测试用例中存在的键值，输出全部不匹配的字段
+
+        Args:
+            compare_rules: 测试用例的比较规则（compare.json），为空时使用默认规则
+        """
+        rules = CompareRules.from_dict(compare_rules) if compare_rules else None
+        report = compare_outputs(actual, expected, rules)
+        for mismatch in report.mismatches:
+            print(f"❌ {mismatch.message}")
+        if report.mismatches:
+            print(f"   字段通过率: {report.field_pass_rate * 100:.1f}% ({sum(report.field_results.values())}/{len(report.field_results)})")
+        return report.passed
 
     def _validate_output_format(self, output: Dict[str, Any]):
         """验证输出格式是否符合规范"""
@@ -328,50 +338,51 @@ class PromptTestRunner:
             if field not in output:
                 raise ValueError(f"Missing required field: {field}")
 
-    def run_model_tests(self, model_name: str, test_cases: List[TestCase]) -> Dict[str, Any]:
-        """运行单个模型的所有测试用例并返回结果"""
-        # 设置模型
-        os.environ["OPENAI_MODEL_NAME"] = model_name
-        print(f"\n🔄 开始测试模型: {model_name}")
-        
-        # 重新初始化 chat 实例
-        if "claude" in model_name.lower():
-            headers = {
-                "Content-Type": "application/json",
-                "anthropic-version": "2023-06-01"
-            }
-            max_tokens = 4096
-        else:
-            headers = None
-            max_tokens = None
-        
+    def create_chat(self, model_name: str, streaming: bool = True) -> RateLimitedChat:
+        """根据模型名称获取聊天模型实例（相同配置复用同一实例和连接池，并附加限流与重试）"""
+        temperature = float(os.getenv("TEMPERATURE", "0.7"))
         try:
-            self.chat = ChatOpenAI(
-                model=model_name,
-                temperature=float(os.getenv("TEMPERATURE", "0.7")),
-                base_url=os.getenv("OPENAI_API_BASE"),
-                api_key=os.getenv("OPENAI_API_KEY"),
-                streaming=True
-            )
-            #使用claude模型，必须强制开启 streaming=True    
-            #    default_headers=headers,
-            #    max_tokens=max_tokens
-            #)
+            # 同一 API 基础URL 下的所有模型共用限流配额（RATE_LIMIT_RPM / RATE_LIMIT_TPM）
+            return create_chat(self.vendor_config(), model_name, temperature, streaming, rate_limited=True)
         except Exception as e:
             logger.error(f"初始化模型失败: {str(e)}")
             raise
-        
-        results = []
-        total_time = 0
-        test_times = []
-        
-        for test_case in test_cases:
-            print(f"\n🔄 运行测试用例: {test_case.name}")
-            result, execution_time = self.run_test(test_case.input_data, test_case.expected_output)
-            results.append(result)
-            test_times.append(execution_time)
-            total_time += execution_time
-            
+
+    @staticmethod
+    def vendor_config() -> ModelVendorConfig:
+        """从环境变量读取 OpenAI 兼容接口的模型商配置和限流配置"""
+        rpm = os.getenv("RATE_LIMIT_RPM")
+        tpm = os.getenv("RATE_LIMIT_TPM")
+        return ModelVendorConfig(
+            name="OPENAI",
+            models=ALL_TEST_MODELS,
+            baseline_models=SELECTABLE_MODELS,
+            api_key_env="OPENAI_API_KEY",
+            base_url=os.getenv("OPENAI_API_BASE"),
+            model_class="ChatOpenAI",
+            requests_per_minute=float(rpm) if rpm else None,
+            tokens_per_minute=float(tpm) if tpm else None,
+            max_retries=int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5")),
+            prices=LIST_PRICES
+        )
+
+    def _usage_handler(self, chat) -> LatencyCallbackHandler:
+        """本次调用的延迟与用量回调，按模型商价格表计算费用"""
+        model_name = self._chat_identity(chat)[0]
+        return LatencyCallbackHandler(self.vendor_config().price_of(model_name), model_name)
+
+    @staticmethod
+    def summarize_results(model_name: str, results: List[bool], test_times: List[float],
+                          reused: int = 0,
+                          latencies: Optional[List[Optional[LatencyMetrics]]] = None) -> Dict[str, Any]:
+        """汇总单个模型的测试结果
+
+        Args:
+            reused: 增量模式下直接复用历史结果的用例数量
+            latencies: 每个用例的流式延迟指标（含 token 用量和费用），没有调用模型的用例为 None
+        """
+        total_time = sum(test_times)
+
         # 计算统计数据
         total = len(results)
         passed = sum(1 for r in results if r)
@@ -386,9 +397,311 @@ class PromptTestRunner:
             "pass_rate": pass_rate,
             "total_time": total_time,
             "avg_time": avg_time,
-            "test_times": test_times  # 保存每个测试用例的执行时间
+            "results": results,  # 每个测试用例是否通过
+            "test_times": test_times,  # 保存每个测试用例的执行时间
+            "reused": reused,
+            "latencies": latencies or [],
+            "latency": summarize_latencies(latencies or []),
+            "usage": summarize_usage(latencies or [])
         }
 
+    def run_model_tests(self, model_name: str, test_cases: List[TestCase]) -> Dict[str, Any]:
+        """运行单个模型的所有测试用例并返回结果"""
+        # 设置模型
+        os.environ["OPENAI_MODEL_NAME"] = model_name
+        print(f"\n🔄 开始测试模型: {model_name}")
+        
+        self.chat = self.create_chat(model_name)
+        
+        results = []
+        test_times = []
+        latencies = []
+        
+        for test_case in test_cases:
+            print(f"\n🔄 运行测试用例: {test_case.name}")
+            result, execution_time, latency, _ = self.run_test(
+                test_case.input_data, test_case.expected_output, compare_rules=test_case.compare_rules
+            )
+            results.append(result)
+            test_times.append(execution_time)
+            latencies.append(latency)
+            
+        return self.summarize_results(model_name, results, test_times, latencies=latencies)
+
+    def run_models_batch(self, model_names: List[str], test_cases: List[TestCase],
+                         backend=None, poll_interval: float = 30.0) -> List[Dict[str, Any]]:
+        """通过批处理接口运行所有 (模型, 测试用例)，适合不关心延迟的大规模回归
+
+        Args:
+            backend: 批处理后端，默认根据环境变量 BATCH_MODE 选择：
+                openai - 使用 OPENAI_API_BASE 的 Batch API；
+                local  - 本地文件后端，从响应缓存中回放已记录的响应
+        """
+        from batch_runner import BatchTestRunner, LocalFileBatchBackend, OpenAIBatchBackend
+
+        base_url = os.getenv("OPENAI_API_BASE")
+        temperature = float(os.getenv("TEMPERATURE", "0.7"))
+        if backend is None:
+            if os.getenv("BATCH_MODE", "openai") == "local":
+                backend = LocalFileBatchBackend(self._cached_response_for_batch)
+            else:
+                backend = OpenAIBatchBackend(api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url)
+
+        batch_results = BatchTestRunner(self, backend).run(
+            model_names, test_cases, temperature=temperature, poll_interval=poll_interval
+        )
+        self.batch_results = batch_results
+
+        return [
+            self.summarize_results(
+                model_name,
+                [r.passed for r in batch_results[model_name]],
+                [r.execution_time for r in batch_results[model_name]]
+            )
+            for model_name in model_names
+        ]
+
+    def _cached_response_for_batch(self, body: Dict[str, Any]) -> str:
+        """本地批处理后端的响应函数：从响应缓存中查找相同请求的历史响应"""
+        from types import SimpleNamespace
+        from response_cache import CacheMissError
+
+        # 与非批处理路径使用相同的缓存键（content 可能是带 cache_control 标记的内容块列表）
+        messages = [SimpleNamespace(type="system" if m["role"] == "system" else "human", content=m["content"])
+                    for m in body["messages"]]
+        key = self.response_cache.key_for_messages(
+            messages, body["model"], os.getenv("OPENAI_API_BASE"), body.get("temperature")
+        )
+        entry = self.response_cache.get(key)
+        if entry is None:
+            raise CacheMissError(f"响应缓存中没有该请求的记录: {key[:12]}")
+        return entry["content"]
+
+    def run_models_concurrently(self, model_names: List[str], test_cases: List[TestCase],
+                                concurrency_limits: Dict[str, int] = None,
+                                incremental: bool = False) -> List[Dict[str, Any]]:
+        """并发运行多个模型的所有测试用例，返回与 run_model_tests 相同格式的结果列表
+
+        Args:
+            incremental: 增量模式，只重新运行提示词、用例或调用配置发生变化的用例，
+                其余用例直接使用上一次运行保存的结果
+        """
+        from async_test_executor import AsyncTestExecutor
+
+        executor = AsyncTestExecutor(self, concurrency_limits=concurrency_limits)
+        if not incremental:
+            return executor.run(model_names, test_cases)
+
+        from incremental_store import IncrementalResultStore, fingerprint_config
+
+        store = IncrementalResultStore(self.prompt_filename)
+        prompt_fp = self.system_prompt.fingerprint
+        config_fp = fingerprint_config(os.getenv("OPENAI_API_BASE"), float(os.getenv("TEMPERATURE", "0.7")),
+                                       self.prompt_layout)
+
+        plan = {}
+        reused = {}
+        for model_name in model_names:
+            plan[model_name], reused[model_name] = store.partition(model_name, test_cases, prompt_fp, config_fp)
+            print(f"♻️ {model_name}: 需要运行 {len(plan[model_name])} 个用例，复用 {len(reused[model_name])} 个历史结果")
+
+        outcomes = executor.run_plan(plan)
+
+        model_results = []
+        for model_name in model_names:
+            fresh = {
+                test_case.name: outcome
+                for test_case, outcome in zip(plan[model_name], outcomes[model_name])
+            }
+            results = []
+            test_times = []
+            latencies = []
+            for test_case in test_cases:
+                if test_case.name in fresh:
+                    passed, execution_time, latency, api_error = fresh[test_case.name]
+                    store.record(model_name, test_case, prompt_fp, config_fp, passed, execution_time,
+                                 latency.to_dict() if latency else None, api_error)
+                else:
+                    record = reused[model_name][test_case.name]
+                    passed, execution_time = record["passed"], record["execution_time"]
+                    latency = LatencyMetrics(**record["latency"]) if record.get("latency") else None
+                results.append(passed)
+                test_times.append(execution_time)
+                latencies.append(latency)
+            result = self.summarize_results(model_name, results, test_times, reused=len(reused[model_name]),
+                                            latencies=latencies)
+            # 复用的历史结果本次没有调用模型，不计入用量和费用
+            result["usage"] = summarize_usage([latency for _, _, latency, _ in fresh.values()])
+            model_results.append(result)
+
+        store.save()
+        return model_results
+
+    def run_models_sharded(self, model_names: List[str], test_cases: List[TestCase],
+                           shard_index: int, shard_count: int,
+                           concurrency_limits: Dict[str, int] = None) -> List[Dict[str, Any]]:
+        """分片运行：只运行 (模型, 用例) 稳定哈希落在第 shard_index 个分片的组合
+
+        返回格式与 run_models_concurrently 相同，另外每个结果带有 case_names（本分片运行的用例名称）。
+        """
+        from async_test_executor import AsyncTestExecutor
+        from sharding import plan_shard
+
+        plan = plan_shard(model_names, test_cases, shard_index, shard_count)
+        for model_name in model_names:
+            print(f"🧩 {model_name}: 分片 {shard_index}/{shard_count} 运行 {len(plan[model_name])}/{len(test_cases)} 个用例")
+
+        executor = AsyncTestExecutor(self, concurrency_limits=concurrency_limits)
+        outcomes = executor.run_plan(plan)
+
+        model_results = []
+        for model_name in model_names:
+            result = self.summarize_results(
+                model_name,
+                [passed for passed, _, _, _ in outcomes[model_name]],
+                [execution_time for _, execution_time, _, _ in outcomes[model_name]],
+                latencies=[latency for _, _, latency, _ in outcomes[model_name]]
+            )
+            result["case_names"] = [test_case.name for test_case in plan[model_name]]
+            model_results.append(result)
+        return model_results
+
+    def run_models_sampled(self, model_names: List[str], test_cases: List[TestCase],
+                           samples: Optional[int] = None,
+                           concurrency_limits: Dict[str, int] = None) -> List[Dict[str, Any]]:
+        """多样本模式：每个用例采样 N 次，返回每个模型的 pass@k、不稳定用例和延迟分布"""
+        from sampling import MultiSampleEvaluator, summarize_samples
+
+        evaluator = MultiSampleEvaluator(self, samples=samples, concurrency_limits=concurrency_limits)
+        sampled = evaluator.run(model_names, test_cases)
+        return [summarize_samples(model_name, sampled[model_name]) for model_name in model_names]
+
+def print_model_results(model_results: List[Dict[str, Any]], case_names: List[str],
+                        cache: Optional[ResponseCache] = None, prompt_layout: str = "inline",
+                        incremental: bool = False):
+    """输出各模型的测试结果比较表和各测试用例的执行时间
+
+    Args:
+        case_names: 用例名称顺序；结果中带 case_names 时（分片运行或合并的结果）按各自的用例列表对应
+    """
+    # 输出比较结果
+    print("\n📊 模型测试结果比较:")
+    
+    # 定义表格格式
+    FORMAT = "{:<35} {:>8} {:>8} {:>8} {:>10} {:>12} {:>12} {:>10} {:>12} {:>12} {:>10} {:>10}"
+    
+    # 打印表头和分隔线
+    header_line = "=" * 157
+    print(header_line)
+    print(FORMAT.format(
+        "模型名称", "总数", "通过", "失败", "通过率", "总耗时", "平均耗时", "首字延迟", "吞吐(tok/s)",
+        "输入tokens", "输出tokens", "费用"
+    ))
+    print("-" * 157)
+    
+    # 打印数据行（缓存命中或批处理的用例没有流式延迟指标和用量，显示为 -）
+    for result in model_results:
+        latency = result['latency']
+        usage = result['usage']
+        print(FORMAT.format(
+            result['model'],
+            str(result['total']),
+            str(result['passed']),
+            str(result['failed']),
+            f"{result['pass_rate']:.1f}%",
+            f"{result['total_time']:.2f}s",
+            f"{result['avg_time']:.2f}s",
+            f"{latency['avg_ttft']:.2f}s" if latency['avg_ttft'] is not None else "-",
+            f"{latency['avg_tokens_per_sec']:.1f}" if latency['avg_tokens_per_sec'] is not None else "-",
+            str(usage['input_tokens']) if usage['calls'] else "-",
+            str(usage['output_tokens']) if usage['calls'] else "-",
+            format_cost(usage['cost'])
+        ))
+    
+    print(header_line)
+
+    # 本次运行的用量合计（估算的调用没有响应中的用量信息，按本地分词器计算）
+    usages = [result['usage'] for result in model_results]
+    calls = sum(usage['calls'] for usage in usages)
+    if calls:
+        costs = [usage['cost'] for usage in usages if usage['cost'] is not None]
+        estimated = sum(usage['estimated'] for usage in usages)
+        unpriced = sum(usage['unpriced'] for usage in usages)
+        print(f"💰 合计: {calls} 次调用，输入 {sum(u['input_tokens'] for u in usages)} tokens，"
+              f"输出 {sum(u['output_tokens'] for u in usages)} tokens，费用 {format_cost(sum(costs) if costs else None)}"
+              + (f"，{estimated} 次按本地分词器估算" if estimated else "")
+              + (f"，{unpriced} 次没有单价" if unpriced else ""))
+
+    for result in model_results:
+        latency = result['latency']
+        if latency['itl_p50'] is not None:
+            print(f"⏱️ {result['model']}: token间隔 p50 {latency['itl_p50'] * 1000:.0f}ms / "
+                  f"p90 {latency['itl_p90'] * 1000:.0f}ms / p99 {latency['itl_p99'] * 1000:.0f}ms，"
+                  f"输出 {latency['output_tokens']} tokens（{latency['measured']} 个用例有流式指标）")
+        if latency['input_tokens']:
+            print(f"🧩 {result['model']}: 输入 {latency['input_tokens']} tokens，命中提示词缓存 "
+                  f"{latency['cached_tokens']} tokens ({latency['cache_hit_rate'] * 100:.1f}%)，"
+                  f"消息布局 {prompt_layout}")
+
+    if incremental:
+        for result in model_results:
+            print(f"♻️ {result['model']}: 复用 {result['reused']} 个未变更用例的历史结果")
+
+    if cache is not None and cache.enabled:
+        print(f"💾 响应缓存 ({cache.mode}): 命中 {cache.hits} 次，未命中 {cache.misses} 次")
+    
+    # 如果只运行了一个测试用例，显示详细的时间信息
+    if len(case_names) > 1:
+        print("\n📊 各测试用例执行时间:")
+        for case_name in case_names:
+            for result in model_results:
+                names = result.get('case_names', case_names)
+                if case_name not in names:
+                    continue
+                i = names.index(case_name)
+                latency = result['latencies'][i] if result['latencies'] else None
+                detail = f" (首字 {latency.ttft:.2f}秒, {latency.output_tokens} tokens)" if latency and latency.ttft is not None else ""
+                print(f"{result['model']} - {case_name}: {result['test_times'][i]:.2f}秒{detail}")
+
+
+def print_sampling_report(sample_results: List[Dict[str, Any]]):
+    """输出多样本模式的结果表"""
+    ks = sorted({k for result in sample_results for k in result['pass_at_k']})
+    FORMAT = "{:<35} {:>6} {:>6} {:>6}" + " {:>9}" * len(ks) + " {:>8} {:>8} {:>6} {:>8} {:>10} {:>10}"
+    width = 35 + 7 * 3 + 10 * len(ks) + 9 * 2 + 7 + 9 + 11 * 2
+
+    print("\n🎲 多样本测试结果:")
+    print("=" * width)
+    print(FORMAT.format(
+        "模型名称", "用例", "样本", "请求", *[f"pass@{k}" for k in ks],
+        "稳定通过", "稳定失败", "不稳定", "不稳定度", "延迟p50", "延迟p90"
+    ))
+    print("-" * width)
+    for result in sample_results:
+        print(FORMAT.format(
+            result['model'],
+            str(result['cases']),
+            str(result['samples']),
+            str(result['requests']),
+            *[f"{result['pass_at_k'][k] * 100:.1f}%" if k in result['pass_at_k'] else "-" for k in ks],
+            str(result['stable_pass']),
+            str(result['stable_fail']),
+            str(len(result['flaky'])),
+            f"{result['avg_flakiness']:.2f}",
+            f"{result['latency_p50']:.2f}s" if result['latency_p50'] is not None else "-",
+            f"{result['latency_p90']:.2f}s" if result['latency_p90'] is not None else "-"
+        ))
+    print("=" * width)
+
+    for result in sample_results:
+        for case in sorted(result['flaky'], key=lambda c: -c.flakiness):
+            print(f"⚠️ {result['model']} - {case.case_name}: {case.passed}/{case.n} 通过（不稳定度 {case.flakiness:.2f}）")
+    for result in sample_results:
+        if result['latency_max'] is not None:
+            print(f"⏱️ {result['model']}: 采样延迟 p50 {result['latency_p50']:.2f}s / "
+                  f"p90 {result['latency_p90']:.2f}s / 最大 {result['latency_max']:.2f}s")
+
+
 def main():
     # 初始化测试运行器
     runner = PromptTestRunner()
@@ -402,28 +715,8 @@ def main():
         print("\n❌ 没有可执行的测试用例，程序退出")
         return
     
-    # 单选模型列表
-    selectable_models = [
-        "moonshot-v1-32k",
-        "Doubao-pro-128k",
-        "gpt-3.5-turbo",
-        "claude-3-sonnet-20240229",
-        "claude-3-5-sonnet-20240620",
-        "claude-3-5-sonnet-20241022",
-        "c-3-5-sonnet-20241022",
-        "gpt-4-turbo",
-        "qwen-max",
-        "glm-4"
-    ]
-    
-    # 完整测试模型列表（当选择"测试所有模型"时使用）
-    all_test_models = [
-        "moonshot-v1-32k",
-        "Doubao-pro-128k",
-        "claude-3-5-sonnet-20241022",
-        "gpt-4-turbo",
-        "glm-4"
-    ]
+    selectable_models = SELECTABLE_MODELS
+    all_test_models = ALL_TEST_MODELS
     
     # 显示模型列表
     print("\n📋 可用的模型：")
@@ -465,46 +758,22 @@ def main():
     # 准备要测试的模型
     selected_models = all_test_models if model_choice == 0 else [selectable_models[model_choice - 1]]
     
-    # 运行测试并集结果
-    model_results = []
-    for model in selected_models:
-        result = runner.run_model_tests(model, selected_test_cases)
-        model_results.append(result)
-    
-    # 输出比较结果
-    print("\n📊 模型测试结果比较:")
-    
-    # 定义表格格式
-    FORMAT = "{:<35} {:>8} {:>8} {:>8} {:>10} {:>12} {:>12}"
-    
-    # 打印表头和分隔线
-    header_line = "=" * 95
-    print(header_line)
-    print(FORMAT.format(
-        "模型名称", "总数", "通过", "失败", "通过率", "总耗时", "平均耗时"
-    ))
-    print("-" * 95)
-    
-    # 打印数据行
-    for result in model_results:
-        print(FORMAT.format(
-            result['model'],
-            str(result['total']),
-            str(result['passed']),
-            str(result['failed']),
-            f"{result['pass_rate']:.1f}%",
-            f"{result['total_time']:.2f}s",
-            f"{result['avg_time']:.2f}s"
-        ))
-    
-    print(header_line)
+    # 设置 SAMPLE_COUNT 大于 1 时每个用例采样多次，输出 pass@k 和不稳定用例
+    sample_count = int(os.getenv("SAMPLE_COUNT", "0"))
+    if sample_count > 1:
+        print_sampling_report(runner.run_models_sampled(selected_models, selected_test_cases, samples=sample_count))
+        return
+
+    # 运行测试并集结果（按模型商并发执行，INCREMENTAL_RUN=1 时只运行变更的用例，
+    # 设置 BATCH_MODE 时通过批处理接口提交）
+    incremental = os.getenv("INCREMENTAL_RUN", "").lower() in ("1", "true", "yes")
+    if os.getenv("BATCH_MODE"):
+        model_results = runner.run_models_batch(selected_models, selected_test_cases)
+    else:
+        model_results = runner.run_models_concurrently(selected_models, selected_test_cases, incremental=incremental)
     
-    # 如果只运行了一个测试用例，显示详细的时间信息
-    if len(selected_test_cases) > 1:
-        print("\n📊 各测试用例执行时间:")
-        for i, test_case in enumerate(selected_test_cases):
-            for result in model_results:
-                print(f"{result['model']} - {test_case.name}: {result['test_times'][i]:.2f}秒")
+    print_model_results(model_results, [test_case.name for test_case in selected_test_cases],
+                        runner.response_cache, runner.prompt_layout, incremental)
 
 if __name__ == "__main__":
     main()
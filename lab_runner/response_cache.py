@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from prompt_template import message_text
+
+logger = logging.getLogger(__name__)
+
+# 缓存模式
+#   auto:      temperature 为 0 的调用按 readwrite 处理，temperature > 0（或未知）的调用不使用缓存（默认）
+#   readwrite: 命中则直接返回缓存，未命中调用模型并写入缓存
+#   record:    总是调用模型，并用最新响应覆盖缓存
+#   replay:    只从缓存读取，未命中时报错，不调用模型
+#   off:       旁路缓存，既不读也不写
+# temperature > 0 的回复本身是随机的，默认回放旧回复会让多次运行（以及多样本模式的每个样本）
+# 都得到同一个结果，测不出输出的不稳定性；需要回放时显式指定 readwrite 或 replay。
+CACHE_MODES = ("auto", "readwrite", "record", "replay", "off")
+DEFAULT_CACHE_MODE = "auto"
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".cache" / "responses"
+DEFAULT_MAX_SIZE_MB = 200
+DEFAULT_MAX_AGE_DAYS = 30
+
+# 每写入多少条缓存执行一次淘汰检查
+EVICT_EVERY_N_WRITES = 50
+
+
+class CacheMissError(RuntimeError):
+    """回放模式下缓存未命中"""
+
+
+class ResponseCache:
+    """基于内容寻址的 LLM 响应磁盘缓存
+
+    缓存键为 (渲染后的系统提示词, 用户消息, 模型, API基础URL, temperature) 的 SHA-256，
+    每条缓存保存为一个 JSON 文件，按总大小和存活时间淘汰，命中时刷新修改时间（LRU）。
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, mode: Optional[str] = None,
+                 max_size_mb: Optional[float] = None, max_age_days: Optional[float] = None):
+        """
+        Args:
+            cache_dir: 缓存目录，默认读取环境变量 RESPONSE_CACHE_DIR
+            mode: 缓存模式，默认读取环境变量 RESPONSE_CACHE_MODE
+            max_size_mb: 缓存总大小上限（MB），默认读取 RESPONSE_CACHE_MAX_MB
+            max_age_days: 缓存最长保留天数，默认读取 RESPONSE_CACHE_MAX_AGE_DAYS
+        """
+        self.cache_dir = Path(cache_dir or os.getenv("RESPONSE_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        if max_size_mb is None:
+            max_size_mb = os.getenv("RESPONSE_CACHE_MAX_MB", DEFAULT_MAX_SIZE_MB)
+        if max_age_days is None:
+            max_age_days = os.getenv("RESPONSE_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS)
+        self.max_size_bytes = float(max_size_mb) * 1024 * 1024
+        self.max_age_seconds = float(max_age_days) * 86400
+        self.mode = DEFAULT_CACHE_MODE
+        self.set_mode(mode or os.getenv("RESPONSE_CACHE_MODE", DEFAULT_CACHE_MODE))
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+
+    def set_mode(self, mode: str):
+        """切换缓存模式"""
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的缓存模式: {mode}，可选值: {', '.join(CACHE_MODES)}")
+        self.mode = mode
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def mode_for(self, temperature: Optional[float]) -> str:
+        """按 temperature 解析 auto 模式，返回该调用实际使用的缓存模式"""
+        if self.mode != "auto":
+            return self.mode
+        return "readwrite" if temperature == 0 else "off"
+
+    @staticmethod
+    def make_key(system_prompt: str, human_message: str, model: str,
+                 base_url: Optional[str], temperature: Optional[float]) -> str:
+        """计算缓存键"""
+        payload = json.dumps(
+            [system_prompt, human_message, model, base_url or "", temperature],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def key_for_messages(cls, messages: List[Any], model: str,
+                         base_url: Optional[str], temperature: Optional[float]) -> str:
+        """根据 [SystemMessage, HumanMessage] 消息列表计算缓存键"""
+        system_prompt = "\n".join(message_text(m) for m in messages if m.type == "system")
+        human_message = "\n".join(message_text(m) for m in messages if m.type != "system")
+        return cls.make_key(system_prompt, human_message, model, base_url, temperature)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目，过期或不存在时返回 None"""
+        path = self._entry_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # 刷新修改时间，淘汰时按最近使用排序
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"读取响应缓存失败: {str(e)}")
+            return None
+
+    def put(self, key: str, content: str, meta: Optional[Dict[str, Any]] = None):
+        """写入缓存条目"""
+        path = self._entry_path(key)
+        entry = {
+            "content": content,
+            "meta": meta or {},
+            "created_at": time.time()
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"写入响应缓存失败: {str(e)}")
+            return
+
+        self._writes_since_evict += 1
+        if self._writes_since_evict >= EVICT_EVERY_N_WRITES:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，并按最近使用时间淘汰直到总大小低于上限"""
+        self._writes_since_evict = 0
+        if not self.cache_dir.exists():
+            return
+
+        now = time.time()
+        entries = []
+        total_size = 0
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age_seconds:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        if total_size <= self.max_size_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            path.unlink(missing_ok=True)
+            total_size -= size
+            if total_size <= self.max_size_bytes:
+                break
+
+    def clear(self):
+        """清空所有缓存"""
+        for path in self.cache_dir.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+
+    def lookup(self, key: str, temperature: Optional[float] = None) -> Optional[str]:
+        """按当前模式查询缓存，返回命中的响应内容
+
+        Args:
+            temperature: 调用使用的 temperature，auto 模式下据此决定是否使用缓存
+        """
+        mode = self.mode_for(temperature)
+        if mode in ("readwrite", "replay"):
+            entry = self.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry["content"]
+            self.misses += 1
+            if mode == "replay":
+                raise CacheMissError(f"回放模式下缓存未命中: {key[:12]}")
+        return None
+
+    def store(self, key: str, content: str, meta: Dict[str, Any]):
+        if self.mode_for(meta.get("temperature")) in ("readwrite", "record"):
+            self.put(key, content, meta)
+
+    @staticmethod
+    def _call_kwargs(callbacks: Optional[List[Any]]) -> Dict[str, Any]:
+        return {"config": {"callbacks": callbacks}} if callbacks else {}
+
+    def invoke(self, chat, messages: List[Any], model: str,
+               base_url: Optional[str], temperature: Optional[float],
+               callbacks: Optional[List[Any]] = None) -> str:
+        """带缓存地调用聊天模型，返回响应文本
+
+        Args:
+            callbacks: 调用模型时附加的 LangChain 回调（例如延迟统计），命中缓存时不会触发
+        """
+        if self.mode_for(temperature) == "off":
+            return chat.invoke(messages, **self._call_kwargs(callbacks)).content
+
+        key = self.key_for_messages(messages, model, base_url, temperature)
+        content = self.lookup(key, temperature)
+        if content is not None:
+            return content
+
+        content = chat.invoke(messages, **self._call_kwargs(callbacks)).content
+        self.store(key, content, {"model": model, "base_url": base_url, "temperature": temperature})
+        return content
+
+    async def ainvoke(self, chat, messages: List[Any], model: str,
+                      base_url: Optional[str], temperature: Optional[float],
+                      callbacks: Optional[List[Any]] = None) -> str:
+        """invoke 的异步版本"""
+        if self.mode_for(temperature) == "off":
+            return (await chat.ainvoke(messages, **self._call_kwargs(callbacks))).content
+
+        key = self.key_for_messages(messages, model, base_url, temperature)
+        content = self.lookup(key, temperature)
+        if content is not None:
+            return content
+
+        content = (await chat.ainvoke(messages, **self._call_kwargs(callbacks))).content
+        self.store(key, content, {"model": model, "base_url": base_url, "temperature": temperature})
+        return content
@@ -0,0 +1,434 @@
+import csv
+import io
+import json
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from output_diff import CompareRules, compare_outputs
+
+logger = logging.getLogger(__name__)
+
+# 批量写入阈值：缓冲区达到该数量时自动写入数据库
+DEFAULT_BATCH_SIZE = 50
+
+# 列表查询默认返回的轻量列（不含输入/输出 JSON）
+SUMMARY_COLUMNS = ["id", "test_time", "prompt_system", "model", "case_name",
+                   "execution_time", "ttft", "tokens_per_sec", "output_tokens", "passed", "error"]
+DETAIL_COLUMNS = ["input_data", "expected_output", "actual_output"]
+
+# 流式延迟与 token 用量列（LatencyMetrics.to_dict() 的字段），旧数据库打开时自动补充
+LATENCY_COLUMNS = {
+    "ttft": "REAL",
+    "tokens_per_sec": "REAL",
+    "output_tokens": "INTEGER",
+    "itl_p50": "REAL",
+    "itl_p90": "REAL",
+    "itl_p99": "REAL",
+    "input_tokens": "INTEGER",
+    "cached_tokens": "INTEGER",
+    "usage_estimated": "INTEGER",
+    "cost": "REAL"
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_time TEXT NOT NULL,
+    prompt_system TEXT NOT NULL,
+    model TEXT NOT NULL,
+    case_name TEXT NOT NULL,
+    execution_time REAL NOT NULL,
+    passed INTEGER NOT NULL,
+    error TEXT,
+    input_data TEXT,
+    expected_output TEXT,
+    actual_output TEXT,
+    ttft REAL,
+    tokens_per_sec REAL,
+    output_tokens INTEGER,
+    itl_p50 REAL,
+    itl_p90 REAL,
+    itl_p99 REAL,
+    input_tokens INTEGER,
+    cached_tokens INTEGER,
+    usage_estimated INTEGER,
+    cost REAL,
+    field_stats_folded INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_results_prompt_system ON test_results(prompt_system);
+CREATE INDEX IF NOT EXISTS idx_results_model ON test_results(model);
+CREATE INDEX IF NOT EXISTS idx_results_case_name ON test_results(case_name);
+CREATE INDEX IF NOT EXISTS idx_results_test_time ON test_results(test_time);
+CREATE INDEX IF NOT EXISTS idx_results_passed ON test_results(passed);
+
+-- 字段级通过计数：每次运行（测试时间）按 (提示词系统, 模型, 字段路径) 累加
+CREATE TABLE IF NOT EXISTS field_stats (
+    prompt_system TEXT NOT NULL,
+    model TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    field_path TEXT NOT NULL,
+    passed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (prompt_system, model, bucket, field_path)
+);
+CREATE INDEX IF NOT EXISTS idx_field_stats_bucket ON field_stats(prompt_system, bucket);
+"""
+
+# 旧版数据库打开时补充的列：列名 -> 类型定义
+MIGRATED_COLUMNS = {
+    **LATENCY_COLUMNS,
+    "field_stats_folded": "INTEGER NOT NULL DEFAULT 0"
+}
+
+# 每次补算字段统计时读取的结果行数
+FOLD_CHUNK_SIZE = 1000
+
+
+class ResultsStore:
+    """基于 SQLite 的测试结果存储
+
+    替代追加写入的 CSV 和每个用例一个 JSON 的详细日志：
+    - 提示词系统、模型、用例、时间、是否通过都有索引
+    - add() 先写入内存缓冲区，flush() 时在一个事务中批量写入
+    - 写入结果的同时把字段级比较结果累加到 field_stats 计数表，
+      已累加的结果行标记 field_stats_folded，打开旧数据库时只补算未标记的行
+    """
+
+    def __init__(self, db_path: Path, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buffer: List[tuple] = []
+        self._fold_buffer: List[tuple] = []
+        # 导出的 CSV 按 (筛选条件) 缓存，结果行数和最大ID不变时直接复用
+        self._csv_cache: Dict[tuple, tuple] = {}
+        # Streamlit 会在不同线程中重新执行脚本，连接需要跨线程使用
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+        self._fold_pending()
+
+    def _migrate(self):
+        """为旧版数据库补充新增的列"""
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(test_results)")}
+        for column, column_type in MIGRATED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE test_results ADD COLUMN {column} {column_type}")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_unfolded ON test_results(id) WHERE field_stats_folded = 0"
+        )
+
+    def add(self, test_time: str, prompt_system: str, model: str, case_name: str,
+            result: Dict[str, Any]):
+        """添加一条测试结果到写入缓冲区
+
+        Args:
+            result: 包含 passed/execution_time/error/input_data/expected_output/actual_output 的字典，
+                可选 latency（流式延迟指标字典）、field_results（字段路径 -> 是否匹配）
+                和 compare_rules（未提供 field_results 时按该规则比较实际输出和期望输出）
+        """
+        latency = result.get("latency") or {}
+        field_results = result.get("field_results")
+        if field_results is None:
+            field_results = self._field_results(result.get("actual_output"), result.get("expected_output"),
+                                                result.get("compare_rules"))
+        row = (
+            test_time, prompt_system, model, case_name,
+            float(result["execution_time"]),
+            1 if result["passed"] else 0,
+            result.get("error") or "",
+            json.dumps(result.get("input_data"), ensure_ascii=False),
+            json.dumps(result.get("expected_output"), ensure_ascii=False),
+            json.dumps(result.get("actual_output"), ensure_ascii=False),
+            *(latency.get(column) for column in LATENCY_COLUMNS)
+        )
+        with self._lock:
+            self._buffer.append(row)
+            self._fold_buffer.append((prompt_system, model, test_time, field_results))
+            should_flush = len(self._buffer) >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """将缓冲区中的结果批量写入数据库"""
+        with self._lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            folds, self._fold_buffer = self._fold_buffer, []
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO test_results (test_time, prompt_system, model, case_name, execution_time, "
+                        "passed, error, input_data, expected_output, actual_output, "
+                        f"{', '.join(LATENCY_COLUMNS)}, field_stats_folded) "
+                        f"VALUES ({', '.join('?' * (10 + len(LATENCY_COLUMNS)))}, 1)",
+                        rows
+                    )
+                    self._fold(folds)
+            except Exception:
+                # 事务已回滚，结果放回缓冲区，下次 flush 时重试
+                self._buffer = rows + self._buffer
+                self._fold_buffer = folds + self._fold_buffer
+                raise
+
+    @staticmethod
+    def _field_results(actual: Any, expected: Any,
+                       compare_rules: Optional[Dict[str, Any]] = None) -> Dict[str, bool]:
+        """计算字段级比较结果；没有有效输出（调用失败、非 JSON）时不计入字段统计"""
+        if not isinstance(actual, dict) or not actual or not isinstance(expected, dict):
+            return {}
+        rules = CompareRules.from_dict(compare_rules) if compare_rules else None
+        return compare_outputs(actual, expected, rules).field_results
+
+    def _fold(self, folds: List[tuple]):
+        """将 (提示词系统, 模型, 测试时间, 字段结果) 累加到 field_stats（调用方需持有锁并处于事务中）"""
+        counters: Counter = Counter()
+        for prompt_system, model, bucket, field_results in folds:
+            for path, matched in field_results.items():
+                key = (prompt_system, model, bucket, path)
+                counters[key + ("passed",)] += 1 if matched else 0
+                counters[key + ("total",)] += 1
+        if not counters:
+            return
+        self._conn.executemany(
+            "INSERT INTO field_stats (prompt_system, model, bucket, field_path, passed, total) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(prompt_system, model, bucket, field_path) "
+            "DO UPDATE SET passed = passed + excluded.passed, total = total + excluded.total",
+            [
+                (*key[:4], counters[key], counters[key[:4] + ("total",)])
+                for key in counters if key[4] == "passed"
+            ]
+        )
+
+    def _fold_pending(self):
+        """补算尚未计入字段统计的历史结果（旧版数据库首次打开时）"""
+        with self._lock:
+            while True:
+                rows = self._conn.execute(
+                    "SELECT id, test_time, prompt_system, model, expected_output, actual_output "
+                    "FROM test_results WHERE field_stats_folded = 0 ORDER BY id LIMIT ?",
+                    (FOLD_CHUNK_SIZE,)
+                ).fetchall()
+                if not rows:
+                    return
+                folds = []
+                for row in rows:
+                    try:
+                        field_results = self._field_results(json.loads(row["actual_output"] or "null"),
+                                                            json.loads(row["expected_output"] or "null"))
+                    except ValueError:
+                        field_results = {}
+                    folds.append((row["prompt_system"], row["model"], row["test_time"], field_results))
+                with self._conn:
+                    self._fold(folds)
+                    self._conn.executemany(
+                        "UPDATE test_results SET field_stats_folded = 1 WHERE id = ?",
+                        [(row["id"],) for row in rows]
+                    )
+
+    def count(self) -> int:
+        """已保存的结果数量"""
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM test_results").fetchone()[0]
+
+    def query(self, prompt_system: Optional[str] = None, model: Optional[str] = None,
+              case_name: Optional[str] = None, passed: Optional[bool] = None,
+              since: Optional[str] = None, until: Optional[str] = None,
+              limit: Optional[int] = None, with_details: bool = False) -> List[Dict[str, Any]]:
+        """按条件查询测试结果，按时间倒序返回
+
+        Args:
+            since/until: 测试时间范围，格式 "%Y-%m-%d %H:%M:%S"
+            with_details: 是否返回输入/期望输出/实际输出
+        """
+        self.flush()
+        conditions = []
+        params: List[Any] = []
+        for column, value in (("prompt_system", prompt_system), ("model", model), ("case_name", case_name)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if passed is not None:
+            conditions.append("passed = ?")
+            params.append(1 if passed else 0)
+        if since is not None:
+            conditions.append("test_time >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("test_time <= ?")
+            params.append(until)
+
+        columns = SUMMARY_COLUMNS + (DETAIL_COLUMNS if with_details else [])
+        sql = f"SELECT {', '.join(columns)} FROM test_results"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY test_time DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def get(self, result_id: int) -> Optional[Dict[str, Any]]:
+        """读取单条结果的完整信息"""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS + DETAIL_COLUMNS + [c for c in LATENCY_COLUMNS if c not in SUMMARY_COLUMNS])} "
+                "FROM test_results WHERE id = ?",
+                (result_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["passed"] = bool(record["passed"])
+        for column in DETAIL_COLUMNS:
+            if column in record and record[column] is not None:
+                record[column] = json.loads(record[column])
+        return record
+
+    def field_stats(self, prompt_system: str, model: Optional[str] = None,
+                    since: Optional[str] = None, last_buckets: Optional[int] = None) -> List[Dict[str, Any]]:
+        """查询字段级通过计数，按运行时间升序返回
+
+        Args:
+            model: 只统计该模型，为 None 时合并所有模型
+            since: 只返回该时间之后的运行
+            last_buckets: 只返回最近 N 次运行
+        Returns:
+            [{bucket, field_path, passed, total}, ...]
+        """
+        self.flush()
+        conditions = ["prompt_system = ?"]
+        params: List[Any] = [prompt_system]
+        if model is not None:
+            conditions.append("model = ?")
+            params.append(model)
+        if since is not None:
+            conditions.append("bucket >= ?")
+            params.append(since)
+        where = " AND ".join(conditions)
+        if last_buckets is not None:
+            where += (f" AND bucket IN (SELECT DISTINCT bucket FROM field_stats WHERE {where} "
+                      "ORDER BY bucket DESC LIMIT ?)")
+            params = params + params + [int(last_buckets)]
+
+        sql = (f"SELECT bucket, field_path, SUM(passed) AS passed, SUM(total) AS total "
+               f"FROM field_stats WHERE {where} GROUP BY bucket, field_path ORDER BY bucket, field_path")
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def field_stat_models(self, prompt_system: str) -> List[str]:
+        """有字段统计的模型列表"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT model FROM field_stats WHERE prompt_system = ? ORDER BY model", (prompt_system,)
+            ).fetchall()
+        return [row["model"] for row in rows]
+
+    def usage_summary(self, prompt_system: Optional[str] = None, model: Optional[str] = None,
+                      last_runs: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按 (运行时间, 提示词系统, 模型) 汇总 token 用量和费用，最近的运行在前
+
+        命中响应缓存的用例没有调用模型，调用失败的用例没有用量（usage_estimated 为 NULL），都不计入调用次数和费用。
+
+        Args:
+            last_runs: 只返回最近 N 次运行
+        Returns:
+            [{test_time, prompt_system, model, calls, passed, input_tokens, output_tokens, cached_tokens,
+              estimated, cost, unpriced}, ...]，cost 为已知单价的调用费用之和，全部未知时为 None
+        """
+        self.flush()
+        conditions = ["usage_estimated IS NOT NULL"]
+        params: List[Any] = []
+        for column, value in (("prompt_system", prompt_system), ("model", model)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = " AND ".join(conditions)
+        if last_runs is not None:
+            where += (f" AND test_time IN (SELECT DISTINCT test_time FROM test_results WHERE {where} "
+                      "ORDER BY test_time DESC LIMIT ?)")
+            params = params + params + [int(last_runs)]
+
+        sql = ("SELECT test_time, prompt_system, model, COUNT(*) AS calls, SUM(passed) AS passed, "
+               "SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens, "
+               "SUM(cached_tokens) AS cached_tokens, SUM(usage_estimated) AS estimated, "
+               "SUM(cost) AS cost, SUM(cost IS NULL) AS unpriced "
+               f"FROM test_results WHERE {where} "
+               "GROUP BY test_time, prompt_system, model ORDER BY test_time DESC, prompt_system, model")
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def to_dataframe(self, **filters):
+        """以 pandas DataFrame 形式返回查询结果"""
+        import pandas as pd
+
+        return pd.DataFrame(self.query(**filters), columns=SUMMARY_COLUMNS)
+
+    def export_csv(self, **filters) -> str:
+        """导出为与旧版 test_results.csv 相同表头的 CSV 文本
+
+        界面每次刷新都会生成下载按钮的数据，结果没有变化（行数和最大ID相同）时返回缓存的文本。
+        """
+        self.flush()
+        key = tuple(sorted(filters.items()))
+        with self._lock:
+            version = tuple(self._conn.execute("SELECT COUNT(*), MAX(id) FROM test_results").fetchone())
+            cached = self._csv_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['测试时间', '提示词系统', '模型', '测试用例', '执行时间(秒)', '测试结果', '错误信息'])
+        for record in reversed(self.query(**filters)):
+            writer.writerow([
+                record["test_time"],
+                record["prompt_system"],
+                record["model"],
+                record["case_name"],
+                f"{record['execution_time']:.2f}",
+                "通过" if record["passed"] else "失败",
+                record["error"]
+            ])
+        text = output.getvalue()
+        with self._lock:
+            self._csv_cache[key] = (version, text)
+        return text
+
+    def import_legacy_details(self, detail_dir: Path) -> int:
+        """导入旧版 details 目录中的 JSON 日志，返回导入数量"""
+        detail_dir = Path(detail_dir)
+        if not detail_dir.exists():
+            return 0
+        imported = 0
+        for detail_file in sorted(detail_dir.glob("*.json")):
+            try:
+                with open(detail_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.add(data["test_time"], data["prompt_system"], data["model"], data["case_name"], data)
+                imported += 1
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"导入旧版日志失败 {detail_file.name}: {str(e)}")
+        self.flush()
+        return imported
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from math import comb
+from typing import Any, Dict, List, Optional, Tuple
+from latency_metrics import percentile
+from output_diff import CompareRules, compare_outputs
+from response_cache import CacheMissError
+
+logger = logging.getLogger(__name__)
+
+# 默认每个用例的采样数
+DEFAULT_SAMPLE_COUNT = 10
+
+# 报告中计算的 pass@k（超过采样数的 k 会被忽略）
+DEFAULT_PASS_AT_K = (1, 3, 5, 10)
+
+
+def pass_at_k(n: int, c: int, k: int) -> float:
+    """pass@k 的无偏估计：n 个样本中 c 个通过时，随机取 k 个至少一个通过的概率"""
+    if k > n:
+        raise ValueError(f"k={k} 不能大于采样数 n={n}")
+    if n - c < k:
+        return 1.0
+    return 1.0 - comb(n - c, k) / comb(n, k)
+
+
+def flakiness_score(n: int, c: int) -> float:
+    """不稳定度：全部通过或全部失败为 0，一半通过一半失败为 1"""
+    if n == 0:
+        return 0.0
+    return 1.0 - abs(2.0 * c / n - 1.0)
+
+
+@dataclass
+class SampleResult:
+    """单个样本的评分结果"""
+    passed: bool
+    latency: float          # 该样本所在请求的往返时间（秒），缓存命中为 0
+    error: str = ""
+    cached: bool = False
+
+
+@dataclass
+class CaseSamples:
+    """单个用例的全部样本"""
+    case_name: str
+    samples: List[SampleResult] = field(default_factory=list)
+    requests: int = 0       # 实际发出的请求数
+
+    @property
+    def n(self) -> int:
+        return len(self.samples)
+
+    @property
+    def passed(self) -> int:
+        return sum(1 for s in self.samples if s.passed)
+
+    @property
+    def pass_rate(self) -> float:
+        return self.passed / self.n if self.n else 0.0
+
+    @property
+    def flakiness(self) -> float:
+        return flakiness_score(self.n, self.passed)
+
+    def pass_at(self, k: int) -> float:
+        return pass_at_k(self.n, self.passed, k)
+
+
+class MultiSampleEvaluator:
+    """多样本评估：每个用例向每个模型请求 N 个回复并全部评分
+
+    优先使用 OpenAI 兼容接口的 n 参数在一次请求中取回全部样本；
+    模型商忽略 n（返回的回复数不足）时，剩余样本改为并发请求，并记住该模型不支持 n。
+    每个样本单独写入响应缓存（键中包含样本序号），回放模式下可以重现整次采样。
+    """
+
+    def __init__(self, runner, samples: Optional[int] = None,
+                 concurrency_limits: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            runner: PromptTestRunner 实例，提供 create_chat/_build_messages/_parse_response/
+                _validate_output_format/_chat_identity/response_cache
+            samples: 每个用例的采样数，默认读取环境变量 SAMPLE_COUNT
+        """
+        from async_test_executor import AsyncTestExecutor
+
+        self.runner = runner
+        self.samples = samples or int(os.getenv("SAMPLE_COUNT", DEFAULT_SAMPLE_COUNT))
+        # 复用按模型商划分的并发限制，一次 n 请求只占用一个并发名额
+        self._executor = AsyncTestExecutor(runner, concurrency_limits=concurrency_limits)
+        self._supports_n: Dict[Tuple[str, Optional[str]], bool] = {}
+
+    def _sample_key(self, messages: List[Any], identity: tuple, index: int) -> str:
+        base_key = self.runner.response_cache.key_for_messages(messages, *identity)
+        return hashlib.sha256(f"{base_key}:sample:{index}".encode("utf-8")).hexdigest()
+
+    def grade(self, content: str, test_case) -> SampleResult:
+        """评分单个样本（不打印差异，样本数多时只汇总结果）"""
+        try:
+            output = self.runner._parse_response(content)
+            self.runner._validate_output_format(output)
+        except json.JSONDecodeError:
+            return SampleResult(passed=False, latency=0.0, error="AI响应不是有效的JSON格式")
+        except ValueError as e:
+            return SampleResult(passed=False, latency=0.0, error=str(e))
+
+        rules = CompareRules.from_dict(test_case.compare_rules) if test_case.compare_rules else None
+        report = compare_outputs(output, test_case.expected_output, rules)
+        return SampleResult(passed=report.passed, latency=0.0, error="; ".join(report.errors))
+
+    async def _request(self, chat, messages: List[Any], n: int) -> Tuple[List[str], float]:
+        """发出一次请求，返回 (回复文本列表, 往返时间)，往返时间不包含限流等待"""
+        # llm_common 由 prompt_test_runner 加入 sys.path
+        from llm_common.rate_limiter import track_wait
+
+        start_time = time.time()
+        with track_wait() as waited:
+            result = await chat.agenerate([messages], n=n) if n > 1 else None
+            if result is not None:
+                contents = [generation.text for generation in result.generations[0]]
+            else:
+                contents = [(await chat.ainvoke(messages)).content]
+        return contents, time.time() - start_time - waited.seconds
+
+    async def _sample_case(self, model_name: str, chat, test_case) -> CaseSamples:
+        messages = self.runner._build_messages(test_case.input_data, model_name)
+        identity = self.runner._chat_identity(chat)
+        cache = self.runner.response_cache
+        keys = [self._sample_key(messages, identity, i) for i in range(self.samples)]
+        case = CaseSamples(case_name=test_case.name)
+
+        # 先从缓存中取已有的样本
+        slots: List[Optional[SampleResult]] = [None] * self.samples
+        missing = []
+        for index, key in enumerate(keys):
+            try:
+                content = cache.lookup(key, identity[2])
+            except CacheMissError as e:
+                slots[index] = SampleResult(passed=False, latency=0.0, error=str(e))
+                continue
+            if content is not None:
+                slots[index] = self.grade(content, test_case)
+                slots[index].cached = True
+            else:
+                missing.append(index)
+
+        semaphore = self._executor.vendor_slot(model_name)
+        support_key = (model_name, identity[1])
+
+        async def fetch(indexes: List[int]):
+            async with semaphore:
+                try:
+                    contents, elapsed = await self._request(chat, messages, len(indexes))
+                except Exception as e:
+                    if len(indexes) > 1:
+                        # 部分厂商不接受 n 参数（返回 400），改为逐个请求，不把这些样本记为失败
+                        logger.info(f"[{model_name}] n={len(indexes)} 的采样请求失败，改为并发单次请求: {str(e)}")
+                        self._supports_n[support_key] = False
+                        return indexes
+                    logger.error(f"[{model_name}] {test_case.name} 采样请求失败: {str(e)}")
+                    for index in indexes:
+                        slots[index] = SampleResult(passed=False, latency=0.0, error=f"API调用错误: {str(e)}")
+                    return []
+            case.requests += 1
+            for index, content in zip(indexes, contents):
+                cache.store(keys[index], content, {"model": identity[0], "base_url": identity[1],
+                                                    "temperature": identity[2], "sample": index})
+                slots[index] = self.grade(content, test_case)
+                slots[index].latency = elapsed
+            return indexes[len(contents):]
+
+        if missing and self._supports_n.get(support_key, True) and len(missing) > 1:
+            remaining = await fetch(missing)
+            if remaining and len(remaining) < len(missing):
+                logger.info(f"[{model_name}] 不支持 n 参数，改为并发请求剩余 {len(remaining)} 个样本")
+                self._supports_n[support_key] = False
+            missing = remaining
+        if missing:
+            await asyncio.gather(*(fetch([index]) for index in missing))
+
+        case.samples = slots
+        return case
+
+    async def arun(self, model_names: List[str], test_cases: List[Any]) -> Dict[str, List[CaseSamples]]:
+        """并发采样所有 (模型, 测试用例)，返回 模型名称 -> 每个用例的样本（顺序与 test_cases 一致）"""
+        self._executor.reset_slots()
+        tasks = {}
+        for model_name in model_names:
+            print(f"\n🎲 开始采样模型: {model_name}（每个用例 {self.samples} 个样本）")
+            # n > 1 不能与流式输出同时使用，采样使用非流式实例
+            chat = self.runner.create_chat(model_name, streaming=False)
+            tasks[model_name] = [
+                asyncio.ensure_future(self._sample_case(model_name, chat, test_case))
+                for test_case in test_cases
+            ]
+
+        results = {}
+        for model_name, model_tasks in tasks.items():
+            results[model_name] = list(await asyncio.gather(*model_tasks))
+        return results
+
+    def run(self, model_names: List[str], test_cases: List[Any]) -> Dict[str, List[CaseSamples]]:
+        """同步入口，在新的事件循环中执行 arun"""
+        return asyncio.run(self.arun(model_names, test_cases))
+
+
+def summarize_samples(model_name: str, cases: List[CaseSamples],
+                      ks: Tuple[int, ...] = DEFAULT_PASS_AT_K) -> Dict[str, Any]:
+    """汇总单个模型的多样本结果：平均 pass@k、不稳定用例和延迟分布"""
+    n = min((case.n for case in cases), default=0)
+    ks = tuple(k for k in ks if k <= n) or ((n,) if n else ())
+    latencies = [s.latency for case in cases for s in case.samples if not s.cached and s.latency > 0]
+    return {
+        "model": model_name,
+        "cases": len(cases),
+        "samples": n,
+        "requests": sum(case.requests for case in cases),
+        "pass_at_k": {k: sum(case.pass_at(k) for case in cases) / len(cases) for k in ks} if cases else {},
+        "stable_pass": sum(1 for case in cases if case.passed == case.n),
+        "stable_fail": sum(1 for case in cases if case.passed == 0),
+        "flaky": [case for case in cases if 0 < case.passed < case.n],
+        "avg_flakiness": sum(case.flakiness for case in cases) / len(cases) if cases else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_max": max(latencies) if latencies else None
+    }
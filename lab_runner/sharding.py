@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from latency_metrics import LatencyMetrics
+
+logger = logging.getLogger(__name__)
+
+# 分片结果文件第一行的清单记录类型，没有分到任何 (模型, 用例) 组合的分片也会写出清单
+MANIFEST_TYPE = "shard_manifest"
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """解析 "i/N" 形式的分片说明（i 从 0 开始），返回 (i, N)"""
+    try:
+        index, count = (int(part) for part in str(spec).split("/"))
+    except ValueError:
+        raise ValueError(f"分片格式错误: {spec}，应为 i/N，例如 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片序号超出范围: {spec}，i 应在 0 到 N-1 之间")
+    return index, count
+
+
+def shard_of(model_name: str, case_name: str, shard_count: int) -> int:
+    """按 (模型, 用例名称) 的稳定哈希计算所属分片，与进程、机器和 PYTHONHASHSEED 无关"""
+    digest = hashlib.sha256(f"{model_name}\n{case_name}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def plan_shard(model_names: List[str], test_cases: List[Any],
+               shard_index: int, shard_count: int) -> Dict[str, List[Any]]:
+    """返回本分片的执行计划：模型名称 -> 落在本分片的测试用例（保持文件中的顺序）"""
+    return {
+        model_name: [case for case in test_cases if shard_of(model_name, case.name, shard_count) == shard_index]
+        for model_name in model_names
+    }
+
+
+def shard_manifest(prompt_system: str, test_time: str, shard_index: int, shard_count: int,
+                   planned: int) -> Dict[str, Any]:
+    """分片清单：本分片计划运行的 (模型, 用例) 组合数，合并时据此判断分片是否完整"""
+    return {
+        "type": MANIFEST_TYPE,
+        "test_time": test_time,
+        "prompt_system": prompt_system,
+        "shard": f"{shard_index}/{shard_count}",
+        "planned": planned
+    }
+
+
+def split_manifests(records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """把读取的记录分为 (分片清单, 用例结果)"""
+    manifests = [record for record in records if record.get("type") == MANIFEST_TYPE]
+    return manifests, [record for record in records if record.get("type") != MANIFEST_TYPE]
+
+
+def read_records(paths: Iterable[Path]) -> List[Dict[str, Any]]:
+    """读取多个分片的 JSON Lines 结果文件，跳过无法解析的行"""
+    records = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"{path}:{line_number} 不是有效的 JSON，已跳过")
+    return records
+
+
+def merge_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按 (提示词系统, 模型, 用例) 去重，重复运行的分片以测试时间较晚的结果为准"""
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for record in records:
+        key = (record["prompt_system"], record["model"], record["case"])
+        current = merged.get(key)
+        if current is None or record.get("test_time", "") >= current.get("test_time", ""):
+            merged[key] = record
+    return list(merged.values())
+
+
+def missing_shards(records: List[Dict[str, Any]], manifests: Iterable[Dict[str, Any]] = ()) -> List[str]:
+    """检查是否有分片还没有结果或结果不完整
+
+    有清单的分片按清单中的计划组合数核对结果数；旧版本写出的分片文件没有清单，
+    只能根据记录中的 shard 字段判断，空分片会被当作缺失。
+
+    Args:
+        records: 去重后的用例结果
+        manifests: 分片清单，同一分片有多份时以测试时间较晚的为准
+    Returns:
+        缺失的分片（"i/N"）和结果不完整的分片（"i/N（已完成/计划 个用例）"），
+        包含多个提示词系统时带有提示词系统名称
+    """
+    planned: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for manifest in manifests:
+        key = (manifest["prompt_system"], manifest["shard"])
+        current = planned.get(key)
+        if current is None or manifest.get("test_time", "") >= current.get("test_time", ""):
+            planned[key] = manifest
+    done = Counter((record["prompt_system"], record["shard"]) for record in records if record.get("shard"))
+
+    sweeps = {(prompt_system, shard.split("/")[1]) for prompt_system, shard in set(planned) | set(done)}
+    show_system = len({prompt_system for prompt_system, _ in sweeps}) > 1
+    missing = []
+    for prompt_system, count in sorted(sweeps, key=lambda sweep: (sweep[0], int(sweep[1]))):
+        for index in range(int(count)):
+            key = (prompt_system, f"{index}/{count}")
+            label = f"{prompt_system} {key[1]}" if show_system else key[1]
+            if key in planned:
+                if done[key] < planned[key]["planned"]:
+                    missing.append(f"{label}（{done[key]}/{planned[key]['planned']} 个用例）")
+            elif key not in done:
+                missing.append(label)
+    return missing
+
+
+def summarize_records(records: List[Dict[str, Any]],
+                      case_order: Optional[List[str]] = None) -> "OrderedDict[str, List[Dict[str, Any]]]":
+    """把逐用例记录汇总为 提示词系统 -> 与 run_models_concurrently 相同格式的模型结果列表
+
+    每个模型的用例按 case_order（测试用例文件中的顺序）排列，总耗时为各用例执行时间之和，
+    与单机运行时 main() 输出的表格一致。
+
+    Args:
+        case_order: 用例名称顺序，不在其中的用例按首次出现的顺序排在后面
+    """
+    from prompt_test_runner import PromptTestRunner
+
+    position = {name: index for index, name in enumerate(case_order or [])}
+    grouped: "OrderedDict[str, OrderedDict[str, List[Dict[str, Any]]]]" = OrderedDict()
+    for record in records:
+        grouped.setdefault(record["prompt_system"], OrderedDict()).setdefault(record["model"], []).append(record)
+
+    summaries: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for prompt_system, models in grouped.items():
+        model_results = []
+        for model_name, model_records in models.items():
+            first_seen = {record["case"]: index for index, record in enumerate(model_records)}
+            model_records = sorted(
+                model_records,
+                key=lambda r: (position.get(r["case"], len(position)), first_seen[r["case"]])
+            )
+            result = PromptTestRunner.summarize_results(
+                model_name,
+                [bool(record["passed"]) for record in model_records],
+                [float(record["execution_time"]) for record in model_records],
+                latencies=[LatencyMetrics(**record["latency"]) if record.get("latency") else None
+                           for record in model_records]
+            )
+            result["case_names"] = [record["case"] for record in model_records]
+            model_results.append(result)
+        summaries[prompt_system] = model_results
+    return summaries
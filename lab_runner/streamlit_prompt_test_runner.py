@@ -1,51 +1,37 @@
 import streamlit as st
 import json
 import os
+import sys
 from typing import Dict, Any, List
-from dataclasses import dataclass
 from pathlib import Path
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_ollama import ChatOllama
 #from langchain_community.llms import Ollama
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
 from dotenv import load_dotenv
 import logging
 import time
 import datetime
-import csv
-import pandas as pd
 from typing import Optional, Tuple
+from response_cache import ResponseCache, CACHE_MODES
+from case_parser import TestCase, load_test_cases_cached
+from prompt_template import CompiledPrompt, build_messages, load_compiled_prompt, wants_cache_hint, PROMPT_LAYOUTS
+from results_store import ResultsStore
+from latency_metrics import LatencyCallbackHandler, LatencyMetrics
+from usage_ledger import format_cost, summarize_usage
+from job_executor import JobExecutor
+from output_diff import CompareRules, compare_outputs
+
+# 共用的模型调用基础设施位于仓库根目录的 llm_common 包
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+# 模型商配置、实例创建（连接池、限流）和健康检查由各工具共用的模型商注册表提供
+from llm_common.model_registry import LIST_PRICES, ModelRegistry, ModelVendorConfig, create_chat
+from llm_common.rate_limiter import track_wait
 
 # 加载环境变量并设置日志
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class TestCase:
-    name: str
-    input_data: Dict[str, Any]
-    expected_output: Dict[str, Any]
-
-@dataclass
-class TestResult:
-    test_case: TestCase
-    actual_output: Dict[str, Any]
-    passed: bool
-    error_message: str = ""
-    execution_time: float = 0.0
-
-@dataclass
-class ModelVendorConfig:
-    name: str                    # 模型商名称
-    models: List[str]           # 该商家提供的模型列表
-    baseline_models: List[str]  # 该商家的基线模型列表
-    api_key_env: str           # 环境变量中API KEY的名称
-    base_url: str              # API基础URL
-    model_class: Optional[str] = None  # 模型基类名称，可选
+# 后台测试任务运行期间界面刷新进度的间隔（秒）
+JOB_POLL_INTERVAL = 1.0
 
 # 模型商配置
 MODEL_VENDORS = {
@@ -72,7 +58,8 @@ MODEL_VENDORS = {
         ],
         api_key_env="SMALLAI_API_KEY",
         base_url="https://ai98.vip/v1",
-        model_class="ChatOpenAI"  # 使用 OpenAI 基类
+        model_class="ChatOpenAI",  # 使用 OpenAI 基类
+        prices=LIST_PRICES
     ),
     "GoogleAPI": ModelVendorConfig(
         name="GoogleAPI",
@@ -80,7 +67,8 @@ MODEL_VENDORS = {
         baseline_models=["gemini-1.5-flash"],
         api_key_env="GOOGLE_API_KEY",
         base_url=None,
-        model_class="ChatGoogleGenerativeAI"
+        model_class="ChatGoogleGenerativeAI",
+        prices=LIST_PRICES
     ),
     "Ollama": ModelVendorConfig(
         name="Ollama",
@@ -104,7 +92,8 @@ MODEL_VENDORS = {
         baseline_models=["claude-3-opus", "claude-2.1"],
         api_key_env="ANTHROPIC_API_KEY",
         base_url="https://api.anthropic.com/v1",
-        model_class="ChatAnthropic"
+        model_class="ChatAnthropic",
+        prices=LIST_PRICES
     ),
     "Zhipu": ModelVendorConfig(
         name="Zhipu",
@@ -112,7 +101,8 @@ MODEL_VENDORS = {
         baseline_models=["glm-4"],
         api_key_env="ZHIPU_API_KEY",
         base_url="https://open.bigmodel.cn/api/paas/v3/model-api",
-        model_class="ChatOpenAI"  # 使用 OpenAI 基类
+        model_class="ChatOpenAI",  # 使用 OpenAI 基类
+        prices=LIST_PRICES
     ),
     "Baidu": ModelVendorConfig(
         name="Baidu",
@@ -124,20 +114,11 @@ MODEL_VENDORS = {
     )
 }
 
+model_registry = ModelRegistry(MODEL_VENDORS)
+
 def get_model_configs():
     """获取模型配置并验证API密钥"""
-    available_vendors = {}
-    
-    for vendor_name, config in MODEL_VENDORS.items():
-        # 如果不需要API密钥（本地模型）或者有API密钥
-        if config.api_key_env is None:
-            available_vendors[vendor_name] = config
-        else:
-            api_key = os.getenv(config.api_key_env)
-            if api_key:
-                available_vendors[vendor_name] = config
-    
-    return available_vendors
+    return model_registry.available()
 
 class PromptTestRunner:
     def __init__(self):
@@ -146,30 +127,26 @@ class PromptTestRunner:
         # 定义提示词目录
         self.prompt_dir = "prompt_engineering/bot194/01"
         
-        # 定义日志目录和文件
+        # 定义日志目录和结果数据库
         self.log_dir = Path(__file__).parent / "test_logs"
         self.log_dir.mkdir(exist_ok=True)
-        self.csv_log_file = self.log_dir / "test_results.csv"
-        self.detail_log_dir = self.log_dir / "details"
-        self.detail_log_dir.mkdir(exist_ok=True)
+        self.detail_log_dir = self.log_dir / "details"  # 旧版每个用例一个 JSON 的日志目录
+        self.results_store = ResultsStore(self.log_dir / "results.db")
+        
+        # 首次使用数据库时导入旧版详细日志
+        if self.results_store.count() == 0:
+            imported = self.results_store.import_legacy_details(self.detail_log_dir)
+            if imported:
+                logger.info(f"已导入 {imported} 条旧版测试日志")
         
         # 定义配置文件路径
         self.config_file = Path(__file__).parent / "config.json"
-        
-        # 如果CSV文件不存在，创建并写入表头
-        if not self.csv_log_file.exists():
-            with open(self.csv_log_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    '测试时间',
-                    '提示词系统',
-                    '模型',
-                    '测试用例',
-                    '执行时间(秒)',
-                    '测试结果',
-                    '错误信息',
-                    '详细日志文件'
-                ])
+
+        # LLM 响应缓存
+        self.response_cache = ResponseCache()
+
+        # 消息布局（侧边栏可切换），prefix 布局让所有用例共用相同的系统提示词以命中提示词前缀缓存
+        self.prompt_layout = os.getenv("PROMPT_LAYOUT", "inline")
         
         # 定义提示词配置映射
         self.prompt_configs = {
@@ -193,125 +170,17 @@ class PromptTestRunner:
         self.prompt_filename = config["prompt"]
         self.test_cases_filename = config["test_cases"]
         
-        # 从文件加载系统提示词
+        # 从文件加载并编译系统提示词（相同内容只编译一次）
         prompt_file = Path(__file__).parent.parent / self.prompt_dir / self.prompt_filename
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # 处理提示词中的变量标记
-        content = content.replace("{", "{{").replace("}", "}}")
-        content = content.replace("{{{{", "{").replace("}}}}", "}")
-
-        # 系统提示词模板
-        self.system_prompt = content + """
-注意：
-1. 你必须直接返回JSON格式数据，不要在JSON前后添加任何其他文本、对话或说明
-2. 返回的JSON必须是一个完整且有效的JSON对象
-3. 所有字段值必须符合其预期的数据类型（例如：数字、字符串、布尔值、对象等）
-4. 确保所有必需的字段都存在于输出中
-5. 不要在JSON中添加注释
-6. 输出JSON的键值统一使用小写字母
-"""
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt)
-        ])
-        return len(self.system_prompt)
-
-    def load_test_cases(self, test_file_path: str) -> List[TestCase]:
-        """从Markdown文件加载测试用例"""
-        test_cases = []
-        
-        with open(test_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        def extract_json_content(text: str, marker: str) -> str:
-            start_marker = f"##### {marker}\n```json"
-            end_marker = "```"
-            start = text.find(start_marker)
-            if start == -1:
-                return ""
-            start = start + len(start_marker)
-            end = text.find(end_marker, start)
-            if end == -1:
-                return ""
-            json_text = text[start:end].strip()
-            return json_text
-        
-        test_sections = content.split('#### 测试用例')
-        loaded_cases = []
-        errors = []
-        
-        for section in test_sections[1:]:
-            try:
-                name = section.split('\n')[0].strip()
-                input_text = extract_json_content(section, "input.json")
-                output_text = extract_json_content(section, "output.json")
-                
-                if not input_text or not output_text:
-                    errors.append(f"测试用例 {name} 缺少输入或输出JSON")
-                    continue
-                
-                try:
-                    input_json = json.loads(input_text)
-                    output_json = json.loads(output_text)
-                    
-                    test_cases.append(TestCase(
-                        name=name,
-                        input_data=input_json,
-                        expected_output=output_json
-                    ))
-                    loaded_cases.append(name)
-                except json.JSONDecodeError as je:
-                    errors.append(f"JSON解析错误 - 测试用例 {name}: {str(je)}")
-                    continue
-                    
-            except Exception as e:
-                errors.append(f"解析错误 - 测试用例 {name if 'name' in locals() else 'unknown'}: {str(e)}")
-                continue
-        
-        return test_cases, loaded_cases, errors
+        self.system_prompt = load_compiled_prompt(prompt_file)
+        return self.system_prompt.template_length
 
-    def get_chat_model(self, model_name: str, vendor_config: ModelVendorConfig):
-        """根据模型商配置获取对应的聊天模型实例"""
-        temperature = st.session_state.temperature
-
-        if vendor_config.model_class == "ChatAnthropic":
-            return ChatAnthropic(
-                model=model_name,
-                anthropic_api_key=os.getenv(vendor_config.api_key_env),
-                temperature=temperature,
-                streaming=True
-            )
-        elif vendor_config.model_class == "Ollama":
-            return ChatOllama(
-                model=model_name,
-                base_url=vendor_config.base_url,
-                temperature=temperature,
-                streaming=True
-            )
-        elif vendor_config.model_class == "ChatGoogleGenerativeAI":
-            return ChatGoogleGenerativeAI(
-                model=model_name,
-               api_key=os.getenv(vendor_config.api_key_env),
-                temperature=temperature
-                #,convert_system_message_to_human=True
-            )
-        elif vendor_config.model_class == "LLMStudio":  # 默认使用 ChatOpenAI（包括 LLMStudio，因为它兼容 OpenAI 接口）
-            return ChatOpenAI(
-                model=model_name,
-                temperature=temperature,
-                base_url=vendor_config.base_url
-                #api_key=os.getenv(vendor_config.api_key_env),
-                #streaming=True
-            )
-        else:  # 默认使用 ChatOpenAI（包括 LLMStudio，因为它兼容 OpenAI 接口）
-            return ChatOpenAI(
-                model=model_name,
-                temperature=temperature,
-                base_url=vendor_config.base_url,
-                api_key=os.getenv(vendor_config.api_key_env),
-                streaming=True
-            )
+    def load_test_cases(self, test_file_path: str) -> Tuple[List[TestCase], List[str], List[str]]:
+        """从Markdown文件加载测试用例（文件未修改时使用缓存的解析结果）"""
+        test_cases, issues = load_test_cases_cached(test_file_path)
+        loaded_cases = [case.name for case in test_cases]
+        errors = [str(issue) for issue in issues]
+        return test_cases, loaded_cases, errors
 
     def _validate_output_format(self, output: Dict[str, Any]):
         """验证输出格式是否符合规范"""
@@ -323,38 +192,52 @@ class PromptTestRunner:
             if field not in output:
                 raise ValueError(f"Missing required field: {field}")
 
-    def run_test(self, test_case: Dict[str, Any], expected_output: Dict[str, Any], model: str) -> tuple[bool, Dict[str, Any], float, str]:
-        """运行单个测试用例并返回结果、实际输出、执行时间和错误信息"""
+    def run_test(self, test_case: Dict[str, Any], expected_output: Dict[str, Any], model: str,
+                 vendor_config: Optional[ModelVendorConfig] = None,
+                 temperature: Optional[float] = None,
+                 system_prompt: Optional[CompiledPrompt] = None,
+                 compare_rules: Optional[Dict[str, Any]] = None,
+                 layout: Optional[str] = None) -> tuple[bool, Dict[str, Any], float, str, Any]:
+        """运行单个测试用例并返回结果、实际输出、执行时间、错误信息和流式延迟指标（命中缓存时为 None）
+
+        在后台线程中调用时必须显式传入 vendor_config 和 temperature，不能读取 st.session_state；
+        system_prompt 默认使用当前加载的提示词；compare_rules 为测试用例的比较规则；
+        layout 为消息布局，默认使用 self.prompt_layout。
+        """
         start_time = time.time()
         error_msg = ""
         actual_output = {}
+        latency = LatencyCallbackHandler(model_name=model)
         
         try:
-            input_json = json.dumps(test_case, ensure_ascii=False, indent=2)
-            
-            system_content = self.system_prompt.format(
-                input=test_case.get("input", ""),
-                context=json.dumps(test_case.get("context", {}), ensure_ascii=False)
-            )
-            
             try:
                 # 获取当前选中的模型商配置
-                vendor_config = st.session_state.selected_vendor
+                if vendor_config is None:
+                    vendor_config = st.session_state.selected_vendor
+                latency.price = vendor_config.price_of(model)  # 按模型商价格表计算费用
+                if temperature is None:
+                    temperature = st.session_state.temperature
                 
                 # 根据模型商配置获取聊天模型实例
-                chat = self.get_chat_model(model, vendor_config)
+                chat = self.get_chat_model(model, vendor_config, temperature)
                 
-                messages = [
-                    SystemMessage(content=system_content),
-                    HumanMessage(content=input_json)
-                ]
+                messages = build_messages(
+                    system_prompt or self.system_prompt, test_case, layout or self.prompt_layout,
+                    cache_hint=wants_cache_hint(model, vendor_config.model_class)
+                )
                 
-                result = chat.invoke(messages)
-                #print(result.content)
-                #st.sidebar.write(result.content)
+                with track_wait() as waited:
+                    try:
+                        content = self.response_cache.invoke(
+                            chat, messages, model, vendor_config.base_url, temperature,
+                            callbacks=[latency]
+                        )
+                    finally:
+                        start_time += waited.seconds  # 限流排队和退避等待不计入执行时间
+                #print(content)
+                #st.sidebar.write(content)
 
                 try:
-                    content = result.content
                     json_start = content.find('{')
                     json_end = content.rfind('}')
                     if json_start != -1 and json_end != -1:
@@ -363,153 +246,153 @@ class PromptTestRunner:
                     actual_output = json.loads(content)
                     self._validate_output_format(actual_output)
                     
-                    is_match, error_details = self._compare_outputs(actual_output, expected_output)
+                    is_match, error_details = self._compare_outputs(actual_output, expected_output, compare_rules)
                     if is_match:
-                        return True, actual_output, time.time() - start_time, ""
+                        return True, actual_output, time.time() - start_time, "", latency.metrics()
                     else:
                         error_msg = "输出与预期不匹配：\n" + "\n".join(error_details)
-                        return False, actual_output, time.time() - start_time, error_msg
+                        return False, actual_output, time.time() - start_time, error_msg, latency.metrics()
                         
                 except json.JSONDecodeError:
                     error_msg = "AI响应不是有效的JSON格式"
-                    return False, {}, time.time() - start_time, error_msg
+                    return False, {}, time.time() - start_time, error_msg, latency.metrics()
                     
             except Exception as e:
                 error_msg = f"API调用错误: {str(e)}"
-                return False, {}, time.time() - start_time, error_msg
+                return False, {}, time.time() - start_time, error_msg, latency.metrics()
                 
         except Exception as e:
             error_msg = f"测试执行出错: {str(e)}"
-            return False, {}, time.time() - start_time, error_msg
-
-    def _compare_outputs(self, actual: Dict[str, Any], expected: Dict[str, Any]) -> tuple[bool, list]:
-        """比较实际输出和预期输出，返回是否匹配和不匹配的详细信息"""
-        def compare_dicts(actual_dict: Dict[str, Any], expected_dict: Dict[str, Any], path: str = "") -> tuple[bool, list]:
-            errors = []
-            for key, expected_value in expected_dict.items():
-                if key not in actual_dict:
-                    errors.append(f"缺少字段 {path}{key}")
-                    continue
-                    
-                actual_value = actual_dict[key]
-                
-                if isinstance(expected_value, dict):
-                    if not isinstance(actual_value, dict):
-                        errors.append(f"字段类型不匹配 {path}{key}：期望 dict，实际 {type(actual_value).__name__}")
-                        continue
-                    sub_result, sub_errors = compare_dicts(actual_value, expected_value, f"{path}{key}.")
-                    errors.extend(sub_errors)
-                elif isinstance(expected_value, (int, float)):
-                    if not isinstance(actual_value, (int, float)):
-                        errors.append(f"数值类型不匹配 {path}{key}：期望 number，实际 {type(actual_value).__name__}")
-                        continue
-                    if abs(actual_value - expected_value) > 0.01:
-                        errors.append(f"数值不匹配 {path}{key}：期望 {expected_value}，实际 {actual_value}")
-                elif isinstance(expected_value, bool):
-                    if not isinstance(actual_value, bool):
-                        errors.append(f"布尔类型不匹配 {path}{key}：期望 bool，实际 {type(actual_value).__name__}")
-                        continue
-                    if actual_value != expected_value:
-                        errors.append(f"布尔值不匹配 {path}{key}：期望 {expected_value}，实际 {actual_value}")
-                elif isinstance(expected_value, str):
-                    if not isinstance(actual_value, str):
-                        errors.append(f"字段类型不匹配 {path}{key}：期望 string，实际 {type(actual_value).__name__}")
-                        continue
-                    # 字符串只检查类型，不比较内容
-                elif isinstance(expected_value, list):
-                    if not isinstance(actual_value, list):
-                        errors.append(f"列表类型不匹配 {path}{key}：期望 list，实际 {type(actual_value).__name__}")
-                        continue
-                    if len(actual_value) != len(expected_value):
-                        errors.append(f"列表长度不匹配 {path}{key}：期望 {len(expected_value)}，实际 {len(actual_value)}")
-                    # 可以根据需要添加列表元素的详细比较
-                    
-            return len(errors) == 0, errors
-            
-        is_match, error_details = compare_dicts(actual, expected)
-        return is_match, error_details
-
-    def get_chat_model(self, model_name: str, vendor_config: ModelVendorConfig):
-        """根据模型商配置获取对应的聊天模型实例"""
-        temperature = st.session_state.temperature
-
-        if vendor_config.model_class == "ChatAnthropic":
-            return ChatAnthropic(
-                model=model_name,
-                anthropic_api_key=os.getenv(vendor_config.api_key_env),
-                temperature=temperature,
-                streaming=True
-            )
-        elif vendor_config.model_class == "Ollama":
-            return ChatOllama(
-                model=model_name,
-                base_url=vendor_config.base_url,
-                temperature=temperature,
-                streaming=True
-            )
-        elif vendor_config.model_class == "ChatGoogleGenerativeAI":
-            return ChatGoogleGenerativeAI(
-                model=model_name,
-                api_key=os.getenv(vendor_config.api_key_env),
-                temperature=temperature,
-                verbose=True
-            )
-        elif vendor_config.model_class == "LLMStudio":  # 默认使用 ChatOpenAI（包括 LLMStudio，因为它兼容 OpenAI 接口）
-            return ChatOpenAI(
-                model=model_name,
-                temperature=temperature,
-                base_url=vendor_config.base_url
-                #api_key=os.getenv(vendor_config.api_key_env),
-                #streaming=True
-            )
-        else:  # 默认使用 ChatOpenAI（包括 LLMStudio，因为它兼容 OpenAI 接口）
-            return ChatOpenAI(
-                model=model_name,
-                temperature=temperature,
-                base_url=vendor_config.base_url,
-                api_key=os.getenv(vendor_config.api_key_env),
-                streaming=True,
-                verbose=True
-            )
+            return False, {}, time.time() - start_time, error_msg, latency.metrics()
+
+    def _compare_outputs(self, actual: Dict[str, Any], expected: Dict[str, Any],
+                         compare_rules: Optional[Dict[str, Any]] = None) -> tuple[bool, list]:
+        """比较实际输出和预期输出，只检查测试用例中存在的键值，返回全部不匹配的字段"""
+        rules = CompareRules.from_dict(compare_rules) if compare_rules else None
+        report = compare_outputs(actual, expected, rules)
+        return report.passed, report.errors
+
+    def get_chat_model(self, model_name: str, vendor_config: ModelVendorConfig,
+                       temperature: Optional[float] = None):
+        """根据模型商配置获取对应的聊天模型实例（相同配置复用同一实例和连接池，并附加限流与重试）"""
+        if temperature is None:
+            temperature = st.session_state.temperature
+        return create_chat(vendor_config, model_name, temperature, rate_limited=True)
 
     def save_test_results(self, prompt_system: str, model: str, case_name: str, 
                          result: Dict[str, Any], test_time: str = None):
-        """保存测试结果到CSV和详细日志文件"""
+        """保存测试结果到结果数据库（先进入写入缓冲区，由 flush_test_results 批量写入）"""
         if test_time is None:
             test_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-        # 创建详细日志文件名
-        detail_file_name = f"{test_time.replace(':', '-')}_{model}_{case_name}.json"
-        detail_file_path = self.detail_log_dir / detail_file_name
-        
-        # 保存详细结果到JSON文件
-        with open(detail_file_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                "test_time": test_time,
-                "prompt_system": prompt_system,
-                "model": model,
-                "case_name": case_name,
-                "input_data": result["input_data"],
-                "expected_output": result["expected_output"],
-                "actual_output": result["actual_output"],
-                "passed": result["passed"],
-                "execution_time": result["execution_time"],
-                "error": result["error"]
-            }, f, ensure_ascii=False, indent=2)
-        
-        # 保存结果到CSV文件
-        with open(self.csv_log_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                test_time,
-                prompt_system,
+        self.results_store.add(test_time, prompt_system, model, case_name, result)
+
+    def flush_test_results(self):
+        """将缓冲的测试结果批量写入数据库"""
+        self.results_store.flush()
+
+    def make_case_runner(self, vendor_config: ModelVendorConfig, temperature: float):
+        """返回供后台任务执行器调用的 (模型, 测试用例) -> 结果字典 函数
+
+        提示词和消息布局在提交时固定下来，运行期间切换提示词项目不影响正在执行的任务。
+        """
+        system_prompt = self.system_prompt
+        layout = self.prompt_layout
+
+        def run_case(model: str, test_case: TestCase) -> Dict[str, Any]:
+            passed, actual_output, execution_time, error, latency = self.run_test(
+                test_case.input_data,
+                test_case.expected_output,
                 model,
-                case_name,
-                f"{result['execution_time']:.2f}",
-                "通过" if result["passed"] else "失败",
-                result["error"] or "",
-                detail_file_name
-            ])
+                vendor_config,
+                temperature,
+                system_prompt,
+                test_case.compare_rules,
+                layout
+            )
+            return {
+                "passed": passed,
+                "execution_time": execution_time,
+                "latency": latency.to_dict() if latency else None,
+                "error": error,
+                "actual_output": actual_output,
+                "expected_output": test_case.expected_output,
+                "input_data": test_case.input_data,
+                "compare_rules": test_case.compare_rules  # 保存结果时按相同规则统计字段通过率
+            }
+        return run_case
+
+@st.cache_resource
+def get_job_executor() -> JobExecutor:
+    """后台测试任务执行器，在脚本重跑和所有会话之间共享"""
+    return JobExecutor()
+
+def render_field_heatmap(results_store: ResultsStore, prompt_system: str):
+    """根据字段级通过计数绘制 字段路径 x 运行时间 的通过率热力图"""
+    import altair as alt
+    import pandas as pd
+
+    st.subheader("字段通过率热力图")
+    models = results_store.field_stat_models(prompt_system)
+    if not models:
+        st.info(f"提示词系统 {prompt_system} 还没有字段级统计数据")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        model = st.selectbox("模型", options=["全部模型"] + models, key='heatmap_model')
+    with col2:
+        depth = st.slider("字段层级", min_value=1, max_value=6, value=2, key='heatmap_depth',
+                          help="按字段路径的前几级合并统计，例如 1 级只显示 updated_context/process/botstatus")
+    with col3:
+        last_runs = st.slider("最近运行次数", min_value=5, max_value=100, value=20, key='heatmap_runs')
+
+    stats = results_store.field_stats(
+        prompt_system,
+        model=None if model == "全部模型" else model,
+        last_buckets=last_runs
+    )
+    if not stats:
+        return
+
+    df = pd.DataFrame(stats)
+    df["field"] = df["field_path"].str.split(".").str[:depth].str.join(".")
+    df = df.groupby(["bucket", "field"], as_index=False)[["passed", "total"]].sum()
+    df["pass_rate"] = df["passed"] / df["total"]
+
+    chart = alt.Chart(df).mark_rect().encode(
+        x=alt.X("bucket:O", title="运行时间"),
+        y=alt.Y("field:N", title="字段"),
+        color=alt.Color("pass_rate:Q", title="通过率", scale=alt.Scale(domain=[0, 1], scheme="redyellowgreen")),
+        tooltip=["bucket", "field", "passed", "total", alt.Tooltip("pass_rate:Q", format=".0%")]
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+def render_usage_summary(results_store: ResultsStore, prompt_system: str):
+    """按运行和模型显示 token 用量、费用和通过率，用于比较模型之间的准确率与成本"""
+    import pandas as pd
+
+    st.subheader("Token 用量与费用")
+    rows = results_store.usage_summary(prompt_system, last_runs=20)
+    if not rows:
+        st.info(f"提示词系统 {prompt_system} 还没有用量数据（命中响应缓存的用例不计费）")
+        return
+
+    df = pd.DataFrame(rows)
+    totals = df.groupby("model", as_index=False)[["calls", "passed", "input_tokens", "output_tokens", "cost"]].sum(min_count=1)
+    totals["通过率"] = totals["passed"] / totals["calls"]
+    totals["每次通过费用"] = totals["cost"] / totals["passed"].where(totals["passed"] > 0)
+    st.caption("最近 20 次运行按模型合计（费用按模型商价格表计算，美元）")
+    st.dataframe(totals.rename(columns={"model": "模型", "calls": "调用次数", "passed": "通过",
+                                        "input_tokens": "输入tokens", "output_tokens": "输出tokens",
+                                        "cost": "费用"}),
+                 hide_index=True)
+    with st.expander("按运行查看"):
+        st.dataframe(df.rename(columns={"test_time": "运行时间", "model": "模型", "calls": "调用次数",
+                                        "passed": "通过", "input_tokens": "输入tokens",
+                                        "output_tokens": "输出tokens", "cached_tokens": "命中缓存tokens",
+                                        "estimated": "估算次数", "cost": "费用", "unpriced": "无单价次数"})
+                     .drop(columns=["prompt_system"]),
+                     hide_index=True)
 
 def load_config():
     """加载持久化的配置"""
@@ -529,7 +412,9 @@ def save_config():
         'temperature': st.session_state.temperature,
         'selected_vendor_name': st.session_state.get('previous_vendor'),
         'selected_models': st.session_state.get('selected_models', []),
-        'selected_prompt_project': st.session_state.get('prompt_project_selector')
+        'selected_prompt_project': st.session_state.get('prompt_project_selector'),
+        'response_cache_mode': st.session_state.get('response_cache_mode', 'auto'),
+        'prompt_layout': st.session_state.get('prompt_layout', st.session_state.runner.prompt_layout)
     }
     try:
         with open(config_file, 'w', encoding='utf-8') as f:
@@ -565,6 +450,9 @@ def main():
                     st.session_state.previous_vendor = config.get('selected_vendor_name')
                     st.session_state.selected_models = config.get('selected_models', [])
                     st.session_state.prompt_project_selector = config.get('selected_prompt_project')
+                    st.session_state.response_cache_mode = config.get('response_cache_mode', 'auto')
+                    if config.get('prompt_layout') in PROMPT_LAYOUTS:
+                        st.session_state.prompt_layout = config['prompt_layout']
             except Exception as e:
                 logger.error(f"加载配置文件失败: {str(e)}")
                 # 设置默认值
@@ -613,6 +501,26 @@ def main():
         # 更新temperature值
         if temperature != st.session_state.temperature:
             st.session_state.temperature = temperature
+
+        # 响应缓存模式
+        cache_mode = st.selectbox(
+            "响应缓存",
+            options=list(CACHE_MODES),
+            index=list(CACHE_MODES).index(st.session_state.get('response_cache_mode', 'auto')),
+            help="auto: 仅 temperature 为 0 时读写缓存；readwrite: 命中缓存直接返回；record: 总是调用模型并更新缓存；replay: 只使用缓存；off: 不使用缓存"
+        )
+        st.session_state.response_cache_mode = cache_mode
+        st.session_state.runner.response_cache.set_mode(cache_mode)
+
+        # 消息布局
+        prompt_layout = st.selectbox(
+            "消息布局",
+            options=list(PROMPT_LAYOUTS),
+            index=list(PROMPT_LAYOUTS).index(st.session_state.get('prompt_layout', st.session_state.runner.prompt_layout)),
+            help="inline: 变量填入系统提示词；prefix: 所有用例共用相同的系统提示词，变量放在用户消息中，可命中模型商的提示词前缀缓存"
+        )
+        st.session_state.prompt_layout = prompt_layout
+        st.session_state.runner.prompt_layout = prompt_layout
         
         # 提示词项目选择
         if 'prompt_project_selector' not in st.session_state:
@@ -674,6 +582,25 @@ def main():
         # 选择基线模型按钮
         if st.button("选择基线模型"):
             st.session_state.selected_models = selected_vendor.baseline_models
+
+        # 探测所有已配置的模型商，切换到响应最快的模型商的基线模型
+        if st.button("选择最快的基线模型", help="并发探测各模型商的接口（不消耗 token），选择往返时间最短的可用模型商"):
+            with st.spinner("正在探测模型商..."):
+                st.session_state.vendor_probes = model_registry.probe_all(available_vendors, refresh=True)
+                fastest = model_registry.fastest_baseline(available_vendors)
+            if fastest:
+                st.session_state.previous_vendor, baseline_model = fastest
+                st.session_state.selected_models = [baseline_model]
+                st.rerun()
+            else:
+                st.warning("没有可用的模型商")
+        if st.session_state.get('vendor_probes'):
+            with st.expander("模型商探测结果"):
+                for probe in st.session_state.vendor_probes:
+                    if probe.ok:
+                        st.write(f"✅ {probe.vendor}: {probe.latency * 1000:.0f}ms")
+                    else:
+                        st.write(f"❌ {probe.vendor}: {probe.error}")
         
         # 多选模型
         selected_models = st.multiselect(
@@ -736,47 +663,64 @@ def main():
             model_list = ", ".join([f"`{model}`" for model in st.session_state.selected_models])
             st.markdown(f"已选择的模型: {model_list}")
             
-            # 运行测试按钮
-            if st.button("运行测试", key="run_button", disabled=not st.session_state.selected_test_cases):
+            executor = get_job_executor()
+            job_id = st.session_state.get('active_job_id')
+            job = executor.snapshot(job_id) if job_id else None
+            job_running = job is not None and job["status"] == "running"
+            
+            # 运行测试按钮（测试在后台执行，运行期间可以继续修改提示词和配置）
+            if st.button("运行测试", key="run_button",
+                         disabled=not st.session_state.selected_test_cases
+                                  or not st.session_state.selected_models or job_running):
                 # 保存当前配置
                 save_config()
                 
-                # 对每个选中的模型运行测试
+                runner = st.session_state.runner
                 test_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                for model in st.session_state.selected_models:
-                    st.subheader(f"模型: {model}")
-                    model_results = {}
-                    
-                    for case_name in st.session_state.selected_test_cases:
-                        test_case = next(case for case in st.session_state.test_cases if case.name == case_name)
-                        with st.spinner(f"正在运行测试用例: {case_name}"):
-                            passed, actual_output, execution_time, error = st.session_state.runner.run_test(
-                                test_case.input_data,
-                                test_case.expected_output,
-                                model
-                            )
-                            
-                            result = {
-                                "passed": passed,
-                                "execution_time": execution_time,
-                                "error": error,
-                                "actual_output": actual_output,
-                                "expected_output": test_case.expected_output,
-                                "input_data": test_case.input_data
-                            }
-                            
-                            model_results[case_name] = result
-                            
-                            # 保存测试结果
-                            st.session_state.runner.save_test_results(
-                                selected_prompt_project,
-                                model,
-                                case_name,
-                                result,
-                                test_time
-                            )
-                    
-                    st.session_state.results[model] = model_results
+                cases_by_name = {case.name: case for case in st.session_state.test_cases}
+                selected_cases = [cases_by_name[name] for name in st.session_state.selected_test_cases]
+                
+                def save_result(model: str, case_name: str, result: Dict[str, Any]):
+                    # 在后台线程中调用，结果先进入写入缓冲区，每个模型结束后批量写入
+                    runner.save_test_results(selected_prompt_project, model, case_name, result, test_time)
+                
+                job_id = executor.submit(
+                    list(st.session_state.selected_models),
+                    selected_cases,
+                    runner.make_case_runner(st.session_state.selected_vendor, st.session_state.temperature),
+                    prompt_system=selected_prompt_project,
+                    test_time=test_time,
+                    on_result=save_result,
+                    on_model_done=lambda model: runner.flush_test_results()
+                )
+                if st.session_state.get('active_job_id'):
+                    executor.forget(st.session_state.active_job_id)
+                st.session_state.active_job_id = job_id
+                st.session_state.results = {}
+                job = executor.snapshot(job_id)
+                job_running = True
+            
+            # 显示每个模型的进度，可以取消或优先执行某个模型
+            if job is not None:
+                st.session_state.results = job["results"]
+                status_text = {"running": "运行中", "completed": "已完成", "cancelled": "已取消"}[job["status"]]
+                st.markdown(f"#### 测试进度（{status_text}）")
+                for model, progress in job["models"].items():
+                    progress_col, priority_col, cancel_col = st.columns([6, 1, 1])
+                    with progress_col:
+                        label = f"{model}: {progress['done']}/{progress['total']}，通过 {progress['passed']}"
+                        if progress['cancelled']:
+                            label += "（已取消）"
+                        st.progress(progress['done'] / progress['total'] if progress['total'] else 1.0, text=label)
+                    model_running = progress['pending'] > 0
+                    if priority_col.button("优先", key=f"prioritize_{job['job_id']}_{model}", disabled=not model_running):
+                        executor.prioritize(job['job_id'], model)
+                    if cancel_col.button("取消", key=f"cancel_{job['job_id']}_{model}", disabled=not model_running):
+                        executor.cancel(job['job_id'], model)
+                        st.rerun()
+                if job_running and st.button("取消全部", key=f"cancel_all_{job['job_id']}"):
+                    executor.cancel(job['job_id'])
+                    st.rerun()
         
     # 显示测试结果
     if st.session_state.results:
@@ -793,21 +737,46 @@ def main():
             pass_rate = (passed/total)*100 if total > 0 else 0
             total_time = sum(r["execution_time"] for r in model_results.values())
             avg_time = total_time / total if total > 0 else 0
+            ttfts = [r["latency"]["ttft"] for r in model_results.values()
+                     if r.get("latency") and r["latency"]["ttft"] is not None]
+            throughputs = [r["latency"]["tokens_per_sec"] for r in model_results.values()
+                           if r.get("latency") and r["latency"]["tokens_per_sec"] is not None]
+            input_tokens = sum(r["latency"].get("input_tokens", 0) for r in model_results.values() if r.get("latency"))
+            cached_tokens = sum(r["latency"].get("cached_tokens", 0) for r in model_results.values() if r.get("latency"))
             
-            # 显示统计信息
-            cols = st.columns(6)
+            # 显示统计信息（缓存命中的用例没有流式延迟指标）
+            cols = st.columns(8)
             cols[0].metric("总用例数", total)
             cols[1].metric("通过", passed)
             cols[2].metric("失败", failed)
             cols[3].metric("通过率", f"{pass_rate:.1f}%")
             cols[4].metric("总耗时", f"{total_time:.2f}秒")
             cols[5].metric("平均耗时", f"{avg_time:.2f}秒")
+            cols[6].metric("平均首字延迟", f"{sum(ttfts) / len(ttfts):.2f}秒" if ttfts else "-")
+            cols[7].metric("平均吞吐", f"{sum(throughputs) / len(throughputs):.1f} tok/s" if throughputs else "-")
+            usage = summarize_usage([LatencyMetrics(**r["latency"]) for r in model_results.values() if r.get("latency")])
+            if input_tokens:
+                st.caption(f"输入 {input_tokens} tokens，命中提示词缓存 {cached_tokens} tokens "
+                           f"({cached_tokens / input_tokens * 100:.1f}%) · 输出 {usage['output_tokens']} tokens · "
+                           f"费用 {format_cost(usage['cost'])}"
+                           + (f"（{usage['estimated']} 次调用没有用量信息，按本地分词器估算）" if usage['estimated'] else ""))
             
             # 显示详细结果
             for case_name, result in model_results.items():
                 with st.expander(f"{'✅' if result['passed'] else '❌'} {case_name} ({result['execution_time']:.2f}秒)"):
                     if result["error"]:
                         st.error(result["error"])
+                    latency = result.get("latency")
+                    if latency and latency["ttft"] is not None:
+                        st.caption(
+                            f"首字延迟 {latency['ttft']:.2f}秒 · 输出 {latency['output_tokens']} tokens · "
+                            f"{latency['tokens_per_sec'] or 0:.1f} tok/s · "
+                            f"token间隔 p50 {latency['itl_p50'] * 1000 if latency['itl_p50'] is not None else 0:.0f}ms / "
+                            f"p90 {latency['itl_p90'] * 1000 if latency['itl_p90'] is not None else 0:.0f}ms"
+                            + (f" · 缓存命中 {latency['cached_tokens']}/{latency['input_tokens']} 输入tokens"
+                               if latency.get("input_tokens") else "")
+                            + (f" · 费用 {format_cost(latency['cost'])}" if latency.get("cost") is not None else "")
+                        )
                     
                     col1, col2, col3 = st.columns(3)
                     
@@ -830,13 +799,12 @@ def main():
     st.divider()  # 添加分隔线
     st.subheader("历史记录查看")
     
-    if os.path.exists(st.session_state.runner.csv_log_file):
+    results_store = st.session_state.runner.results_store
+    if results_store.count() > 0:
         # 下载按钮和最近记录显示
-        with open(st.session_state.runner.csv_log_file, 'r', encoding='utf-8') as f:
-            csv_content = f.read()
         st.download_button(
             "下载CSV测试记录",
-            csv_content,
+            results_store.export_csv(),
             "test_results.csv",
             "text/csv",
             key='download_csv'
@@ -844,24 +812,24 @@ def main():
         
         # 显示最近的测试记录
         st.subheader("最近的测试记录")
-        df = pd.read_csv(st.session_state.runner.csv_log_file)
-        st.dataframe(df.tail(10))
+        df = results_store.to_dataframe(limit=10)
+        st.dataframe(df)
+        
+        # 字段通过率热力图：按运行时间显示每个输出字段的通过率，用于定位提示词修改导致的回归
+        render_field_heatmap(results_store, selected_prompt_project)
+
+        # 按运行和模型汇总 token 用量与费用
+        render_usage_summary(results_store, selected_prompt_project)
         
         # 三栏布局显示详细日志
         st.subheader("详细日志查看")
-        log_files = list(st.session_state.runner.detail_log_dir.glob("*.json"))
-        if log_files:
-            # 按修改时间排序，最新的在前面
-            log_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            
-            # 创建一个更友好的显示格式
+        log_records = results_store.query(limit=200)
+        if log_records:
+            # 创建一个更友好的显示格式：时间 - 模型 - 测试用例（最新的在前面）
             log_options = {}
-            for f in log_files:
-                # 获取文件修改时间
-                mtime = datetime.datetime.fromtimestamp(os.path.getmtime(f))
-                # 创建显示名称：时间 - 模型 - 测试用例
-                display_name = f"{mtime.strftime('%Y-%m-%d %H:%M:%S')} - {f.stem}"
-                log_options[display_name] = f
+            for record in log_records:
+                display_name = f"{record['test_time']} - {record['model']} - {record['case_name']} (#{record['id']})"
+                log_options[display_name] = record['id']
             
             # 上部分：两栏布局显示日志列表和基本信息
             col1, col2 = st.columns(2)
@@ -875,9 +843,7 @@ def main():
                 )
             
             if selected_log_display:
-                selected_log_file = log_options[selected_log_display]
-                with open(selected_log_file, 'r', encoding='utf-8') as f:
-                    log_data = json.load(f)
+                log_data = results_store.get(log_options[selected_log_display])
                     
                 with col2:
                     st.markdown("#### 测试信息")
@@ -886,6 +852,11 @@ def main():
                     st.write(f"**模型:** {log_data['model']}")
                     st.write(f"**测试用例:** {log_data['case_name']}")
                     st.write(f"**执行时间:** {log_data['execution_time']:.2f}秒")
+                    if log_data['ttft'] is not None:
+                        st.write(f"**首字延迟:** {log_data['ttft']:.2f}秒")
+                        st.write(f"**输出速度:** {log_data['output_tokens']} tokens, {log_data['tokens_per_sec'] or 0:.1f} tok/s")
+                    if log_data['input_tokens']:
+                        st.write(f"**输入tokens:** {log_data['input_tokens']}（命中提示词缓存 {log_data['cached_tokens'] or 0}）")
                     st.write(f"**测试结果:** {'✅ 通过' if log_data['passed'] else '❌ 失败'}")
                     if log_data['error']:
                         st.error(f"错误信息:\n{log_data['error']}")
@@ -906,5 +877,13 @@ def main():
                     st.markdown("#### 实际输出")
                     st.json(log_data['actual_output'])
 
+    # 后台任务运行期间定时重跑脚本以刷新进度和增量结果
+    job_id = st.session_state.get('active_job_id')
+    if job_id:
+        job = get_job_executor().snapshot(job_id)
+        if job is not None and job["status"] == "running":
+            time.sleep(JOB_POLL_INTERVAL)
+            st.rerun()
+
 if __name__ == "__main__":
     main()
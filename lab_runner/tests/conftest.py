@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# lab_runner 的模块按平铺方式导入（与在 lab_runner 目录下运行脚本时一致），llm_common 位于仓库根目录
+LAB_RUNNER_DIR = Path(__file__).resolve().parent.parent
+REPO_ROOT = LAB_RUNNER_DIR.parent
+for path in (LAB_RUNNER_DIR, REPO_ROOT):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,134 @@
+import json
+from types import SimpleNamespace
+
+from batch_runner import BatchBackend, BatchTestRunner, LocalFileBatchBackend, build_batch_line, parse_batch_output
+from prompt_test_runner import PromptTestRunner
+from response_cache import ResponseCache
+
+
+def message(type_, content):
+    return SimpleNamespace(type=type_, content=content)
+
+
+class FakeRunner:
+    """提供 BatchTestRunner 需要的 PromptTestRunner 方法"""
+
+    def __init__(self):
+        self.built_for = []
+
+    def _build_messages(self, input_data, model_name=""):
+        self.built_for.append(model_name)
+        return [message("system", "提示词"), message("human", json.dumps(input_data, ensure_ascii=False))]
+
+    @staticmethod
+    def _parse_response(content):
+        return json.loads(content)
+
+    def _validate_output_format(self, output):
+        if "message" not in output:
+            raise ValueError("缺少 message 字段")
+
+    def _compare_outputs(self, output, expected, rules=None):
+        return output == expected
+
+
+CASES = [SimpleNamespace(name=f"用例 {i}", input_data={"input": i}, expected_output={"message": i},
+                         compare_rules=None) for i in range(3)]
+
+
+def echo(body):
+    """按输入返回 {"message": input}，input 为 2 时模拟请求失败"""
+    value = json.loads(body["messages"][-1]["content"])["input"]
+    if value == 2:
+        raise RuntimeError("模型不可用")
+    return json.dumps({"message": value})
+
+
+def test_build_batch_line():
+    line = build_batch_line("0-1", "gpt-4-turbo", [message("system", "s"), message("human", "h")], 0.0)
+    assert line["custom_id"] == "0-1"
+    assert line["body"] == {"model": "gpt-4-turbo", "temperature": 0.0,
+                            "messages": [{"role": "system", "content": "s"}, {"role": "user", "content": "h"}]}
+    assert "temperature" not in build_batch_line("0-1", "m", [], None)["body"]
+
+
+def test_parse_batch_output():
+    lines = [
+        json.dumps({"custom_id": "a", "response": {"status_code": 200,
+                                                   "body": {"choices": [{"message": {"content": "ok"}}]}}}),
+        json.dumps({"custom_id": "b", "error": {"message": "超时"}}),
+        json.dumps({"custom_id": "c", "response": {"status_code": 500, "body": {"error": "x"}}}),
+        ""
+    ]
+    results = parse_batch_output(lines)
+    assert results["a"] == ("ok", None)
+    assert results["b"] == (None, "超时")
+    assert results["c"][0] is None and results["c"][1].startswith("HTTP 500")
+
+
+def test_local_backend_round_trip(tmp_path):
+    backend = LocalFileBatchBackend(echo, batch_dir=tmp_path / "batches")
+    input_path = tmp_path / "input.jsonl"
+    lines = [build_batch_line(str(i), "m", [message("human", json.dumps({"input": i}))], None) for i in range(3)]
+    input_path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+
+    batch_id = backend.submit(input_path)
+    assert backend.fetch_output(batch_id) == []
+    assert backend.status(batch_id) == "completed"
+    results = parse_batch_output(backend.fetch_output(batch_id))
+    assert results["0"] == (json.dumps({"message": 0}), None)
+    assert results["2"] == (None, "模型不可用")
+
+
+def test_batch_runner_grades_results(tmp_path):
+    runner = FakeRunner()
+    batch = BatchTestRunner(runner, LocalFileBatchBackend(echo, batch_dir=tmp_path), batch_dir=tmp_path)
+    results = batch.run(["gpt-4-turbo", "claude-3-5-sonnet-20241022"], CASES, poll_interval=0)
+    for model, model_results in results.items():
+        assert [result.passed for result in model_results] == [True, True, False]
+        assert "模型不可用" in model_results[2].error_message
+    # 每个请求按各自的模型构建消息（Claude 模型需要 cache_control 标记）
+    assert runner.built_for == ["gpt-4-turbo"] * 3 + ["claude-3-5-sonnet-20241022"] * 3
+
+
+class ExpiredBackend(BatchBackend):
+    """超时结束的批处理任务，只完成了第一个请求"""
+
+    def submit(self, input_path):
+        with open(input_path, encoding="utf-8") as f:
+            self.first = json.loads(f.readline())
+        return "batch_expired"
+
+    def status(self, batch_id):
+        return "expired"
+
+    def fetch_output(self, batch_id):
+        value = json.loads(self.first["body"]["messages"][-1]["content"])["input"]
+        body = {"choices": [{"message": {"content": json.dumps({"message": value})}}]}
+        return [json.dumps({"custom_id": self.first["custom_id"], "response": {"status_code": 200, "body": body}})]
+
+
+def test_expired_batch_keeps_partial_results(tmp_path):
+    batch = BatchTestRunner(FakeRunner(), ExpiredBackend(), batch_dir=tmp_path)
+    results = batch.run(["gpt-4-turbo"], CASES, poll_interval=0)["gpt-4-turbo"]
+    assert [result.passed for result in results] == [True, False, False]
+    assert "expired" in results[1].error_message
+
+
+def test_local_backend_replays_cached_block_content(tmp_path, monkeypatch):
+    """prefix 布局下 Claude 模型的系统消息是带 cache_control 标记的内容块列表"""
+    monkeypatch.setenv("OPENAI_API_BASE", "https://api.example.com/v1")
+    runner = PromptTestRunner.__new__(PromptTestRunner)
+    runner.response_cache = ResponseCache(cache_dir=tmp_path / "cache", mode="readwrite")
+    messages = [message("system", [{"type": "text", "text": "提示词", "cache_control": {"type": "ephemeral"}}]),
+                message("human", json.dumps({"input": 1}))]
+    key = ResponseCache.key_for_messages(messages, "claude-3-5-sonnet-20241022", "https://api.example.com/v1", 0.0)
+    runner.response_cache.put(key, json.dumps({"message": 1}))
+
+    backend = LocalFileBatchBackend(runner._cached_response_for_batch, batch_dir=tmp_path / "batches")
+    input_path = tmp_path / "input.jsonl"
+    line = build_batch_line("0", "claude-3-5-sonnet-20241022", messages, 0.0)
+    input_path.write_text(json.dumps(line) + "\n", encoding="utf-8")
+    batch_id = backend.submit(input_path)
+    backend.status(batch_id)
+    assert parse_batch_output(backend.fetch_output(batch_id))["0"] == (json.dumps({"message": 1}), None)
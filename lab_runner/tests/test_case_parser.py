@@ -0,0 +1,142 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import case_parser
+
+TEST_CASE_FILES = sorted((Path(__file__).resolve().parents[2] / "prompt_engineering").rglob("*test_cases*.md"))
+
+
+def legacy_load_test_cases(test_file_path):
+    """旧版 PromptTestRunner.load_test_cases 的解析逻辑（去掉打印），返回 (名称, 输入, 输出) 列表"""
+    with open(test_file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    def extract_json_content(text, marker):
+        start_marker = f"##### {marker}\n```json"
+        start = text.find(start_marker)
+        if start == -1:
+            return ""
+        start = start + len(start_marker)
+        end = text.find("```", start)
+        if end == -1:
+            return ""
+        return text[start:end].strip()
+
+    test_cases = []
+    for section in content.split('#### 测试用例')[1:]:
+        name = section.split('\n')[0].strip()
+        input_text = extract_json_content(section, "input.json")
+        output_text = extract_json_content(section, "output.json")
+        if not input_text or not output_text:
+            continue
+        try:
+            test_cases.append((name, json.loads(input_text), json.loads(output_text)))
+        except json.JSONDecodeError:
+            continue
+    return test_cases
+
+
+@pytest.mark.parametrize("test_file", TEST_CASE_FILES, ids=lambda path: path.name)
+def test_matches_legacy_parser(test_file):
+    issues = []
+    parsed = [(case.name, case.input_data, case.expected_output)
+              for case in case_parser.iter_test_cases(str(test_file), issues)]
+    assert parsed == legacy_load_test_cases(test_file)
+    assert parsed
+
+
+def test_shipped_test_case_files_found():
+    assert len(TEST_CASE_FILES) >= 3
+
+
+def write_cases(tmp_path, text):
+    path = tmp_path / "cases.md"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_compare_block_and_heading_variants(tmp_path):
+    path = write_cases(tmp_path, """# 标题
+
+#### 测试用例 1：带比较规则
+##### input.json
+```json
+{"input": "a"}
+```
+
+##### output.json
+```json
+{"message": "ok"}
+```
+##### compare.json
+```json
+{"string_rules": {"message": "exact"}}
+```
+##### 测试用例 不是用例标题
+#### 测试用例 2：没有输出
+##### input.json
+```json
+{"input": "b"}
+```
+""")
+    issues = []
+    cases = list(case_parser.iter_test_cases(path, issues))
+    assert [case.name for case in cases] == ["1：带比较规则"]
+    assert cases[0].compare_rules == {"string_rules": {"message": "exact"}}
+    assert [(issue.case_name, issue.line) for issue in issues] == [("2：没有输出", 18)]
+
+
+def test_json_error_reports_file_line(tmp_path):
+    path = write_cases(tmp_path, """#### 测试用例 坏的JSON
+##### input.json
+```json
+{
+    "input": "a",
+    "context": {,}
+}
+```
+##### output.json
+```json
+{}
+```
+""")
+    issues = []
+    assert list(case_parser.iter_test_cases(path, issues)) == []
+    assert issues[0].line == 6
+    assert "input.json 解析错误" in issues[0].message
+
+
+def test_unclosed_fence(tmp_path):
+    path = write_cases(tmp_path, """#### 测试用例 未闭合
+##### input.json
+```json
+{"input": "a"}
+```
+##### output.json
+```json
+{"message": "ok"}
+""")
+    issues = []
+    assert list(case_parser.iter_test_cases(path, issues)) == []
+    assert "output.json 代码块未闭合" in str(issues[0])
+
+
+def test_cache_reparses_changed_file(tmp_path):
+    text = """#### 测试用例 {name}
+##### input.json
+```json
+{{}}
+```
+##### output.json
+```json
+{{}}
+```
+"""
+    path = write_cases(tmp_path, text.format(name="一"))
+    cases, issues = case_parser.load_test_cases_cached(path)
+    assert [case.name for case in cases] == ["一"] and issues == []
+    assert case_parser.load_test_cases_cached(path)[0] == cases
+    write_cases(tmp_path, text.format(name="第二个"))
+    assert [case.name for case in case_parser.load_test_cases_cached(path)[0]] == ["第二个"]
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from incremental_store import IncrementalResultStore, fingerprint_config
+
+CASES = [SimpleNamespace(name=f"用例 {i}", input_data={"i": i}, expected_output={"message": i},
+                         compare_rules=None) for i in range(3)]
+CONFIG_FP = fingerprint_config("https://api.example.com/v1", 0.0)
+
+
+def test_reuses_unchanged_results(tmp_path):
+    store = IncrementalResultStore("prompt.md", store_dir=tmp_path)
+    for case in CASES:
+        store.record("m", case, "p1", CONFIG_FP, True, 1.0)
+    store.save()
+
+    reloaded = IncrementalResultStore("prompt.md", store_dir=tmp_path)
+    changed, reused = reloaded.partition("m", CASES, "p1", CONFIG_FP)
+    assert changed == [] and set(reused) == {case.name for case in CASES}
+    changed, reused = reloaded.partition("m", CASES, "p2", CONFIG_FP)
+    assert changed == CASES and reused == {}
+
+
+def test_changed_case_is_rerun(tmp_path):
+    store = IncrementalResultStore("prompt.md", store_dir=tmp_path)
+    for case in CASES:
+        store.record("m", case, "p1", CONFIG_FP, True, 1.0)
+    edited = SimpleNamespace(**{**vars(CASES[1]), "expected_output": {"message": "新的期望"}})
+    changed, _ = store.partition("m", [CASES[0], edited, CASES[2]], "p1", CONFIG_FP)
+    assert changed == [edited]
+
+
+def test_api_error_results_are_rerun(tmp_path):
+    store = IncrementalResultStore("prompt.md", store_dir=tmp_path)
+    store.record("m", CASES[0], "p1", CONFIG_FP, False, 0.5, api_error=True)
+    store.record("m", CASES[1], "p1", CONFIG_FP, False, 1.0)
+    changed, reused = store.partition("m", CASES[:2], "p1", CONFIG_FP)
+    # 模型输出不匹配的失败结果可以复用，API调用错误没有得到模型输出，需要重新运行
+    assert changed == [CASES[0]] and list(reused) == [CASES[1].name]
+
+
+def test_compare_rules_change_reruns_case(tmp_path):
+    store = IncrementalResultStore("prompt.md", store_dir=tmp_path)
+    store.record("m", CASES[0], "p1", CONFIG_FP, True, 1.0)
+    with_rules = SimpleNamespace(**{**vars(CASES[0]), "compare_rules": {"string": "exact"}})
+    changed, _ = store.partition("m", [with_rules], "p1", CONFIG_FP)
+    assert changed == [with_rules]
+
+
+def test_layout_is_part_of_config_fingerprint():
+    assert fingerprint_config("https://api.example.com/v1", 0.0, "prefix") != CONFIG_FP
+    assert fingerprint_config("https://api.example.com/v1", 0.0, "inline") == CONFIG_FP
@@ -0,0 +1,104 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from job_executor import JobExecutor
+
+CASES = [SimpleNamespace(name=f"用例 {i}", input_data={"i": i}, expected_output={}) for i in range(5)]
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor(max_workers=3)
+    yield executor
+    executor.shutdown()
+
+
+def run_case(model, test_case):
+    return {"passed": test_case.input_data["i"] % 2 == 0, "execution_time": 0.0}
+
+
+def test_runs_every_case_for_every_model(executor):
+    done_models = []
+    job_id = executor.submit(["a", "b"], CASES, run_case, prompt_system="资源管理",
+                             on_model_done=done_models.append)
+    assert executor.wait(job_id, timeout=5)
+    snapshot = executor.snapshot(job_id)
+    assert snapshot["status"] == "completed"
+    for model in ("a", "b"):
+        assert list(snapshot["results"][model]) == [case.name for case in CASES]
+        assert snapshot["models"][model]["done"] == 5
+        assert snapshot["models"][model]["passed"] == 3
+    assert sorted(done_models) == ["a", "b"]
+
+
+@pytest.mark.parametrize("models, cases", [(["a", "b"], []), ([], CASES)])
+def test_empty_job_completes_immediately(executor, models, cases):
+    done_models = []
+    job_id = executor.submit(models, cases, run_case, on_model_done=done_models.append)
+    assert executor.snapshot(job_id)["status"] == "completed"
+    assert executor.wait(job_id, timeout=0)
+    assert done_models == models
+
+
+def test_errors_become_failed_results(executor):
+    def failing(model, test_case):
+        raise RuntimeError("连接失败")
+
+    job_id = executor.submit(["a"], CASES[:2], failing)
+    assert executor.wait(job_id, timeout=5)
+    results = executor.snapshot(job_id)["results"]["a"]
+    assert all(not result["passed"] and "连接失败" in result["error"] for result in results.values())
+
+
+def test_cancel_keeps_running_cases():
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking(model, test_case):
+        started.set()
+        release.wait(5)
+        return {"passed": True}
+
+    single = JobExecutor(max_workers=1)
+    try:
+        job_id = single.submit(["a"], CASES, blocking)
+        assert started.wait(5)
+        single.cancel(job_id)
+        release.set()
+        assert single.wait(job_id, timeout=5)
+        snapshot = single.snapshot(job_id)
+        assert snapshot["status"] == "cancelled"
+        assert snapshot["models"]["a"]["done"] == 1
+        assert snapshot["models"]["a"]["cancelled"]
+    finally:
+        release.set()
+        single.shutdown()
+
+
+def test_prioritized_model_runs_first():
+    order = []
+    gate = threading.Event()
+
+    def record(model, test_case):
+        gate.wait(5)
+        order.append(model)
+        return {"passed": True}
+
+    single = JobExecutor(max_workers=1)
+    try:
+        job_id = single.submit(["a", "b"], CASES[:3], record)
+        single.prioritize(job_id, "b")
+        gate.set()
+        assert single.wait(job_id, timeout=5)
+        # 工作线程可能在调整优先级之前已经取出 a 的第一个用例
+        assert order in (["a", "b", "b", "b", "a", "a"], ["b", "b", "b", "a", "a", "a"])
+    finally:
+        single.shutdown()
+
+
+def test_forget_only_finished_jobs(executor):
+    job_id = executor.submit(["a"], [], run_case)
+    executor.forget(job_id)
+    assert executor.snapshot(job_id) is None
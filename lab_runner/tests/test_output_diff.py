@@ -0,0 +1,123 @@
+import pytest
+
+from output_diff import DICT, CompareRules, compare_outputs, flatten
+
+
+def test_flatten_paths_depth_first():
+    table = flatten({"a": {"b": 1, "c": [1, 2]}, "d": "x"})
+    assert list(table) == ["a", "a.b", "a.c", "d"]
+    assert table["a"] == (None, DICT)
+    assert table["a.b"] == ("a", 1)
+    assert table["a.c"] == ("a", [1, 2])
+
+
+def test_flatten_expands_ordered_lists():
+    rules = CompareRules(list_modes={"items": "ordered"})
+    table = flatten({"items": [{"id": 1}, {"id": 2}]}, rules)
+    assert table["items[0]"] == ("items", DICT)
+    assert table["items[1].id"] == ("items[1]", 2)
+
+
+def test_default_rules_match_previous_runner():
+    expected = {"n": 1.0, "flag": True, "name": "期望", "items": [1, 2, 3], "empty": None}
+    actual = {"n": 1.005, "flag": 1, "name": "不同的文本", "items": ["a"], "empty": "anything"}
+    report = compare_outputs(actual, expected)
+    assert report.passed
+    assert report.field_pass_rate == 1.0
+
+
+def test_default_rules_check_numbers_and_presence():
+    report = compare_outputs({"n": 2, "other": 1}, {"n": 1, "missing": "x", "flag": True})
+    kinds = {m.path: m.kind for m in report.mismatches}
+    assert kinds == {"n": "value", "missing": "missing", "flag": "missing"}
+    assert compare_outputs({"n": "1"}, {"n": 1}).mismatches[0].kind == "type"
+
+
+def test_tolerance_per_path():
+    rules = CompareRules(tolerances={"resources.*": 5})
+    expected = {"resources": {"gold": 100}, "score": 10}
+    assert compare_outputs({"resources": {"gold": 104}, "score": 10}, expected, rules).passed
+    assert not compare_outputs({"resources": {"gold": 100}, "score": 10.5}, expected, rules).passed
+
+
+@pytest.mark.parametrize("rule, expected, actual, passed", [
+    ("type", "Hello World", "other", True),
+    ("type", "Hello World", 1, False),
+    ("exact", "Hello World", "Hello World", True),
+    ("exact", "Hello World", "Hello  World", False),
+    ("normalized", "Hello World", "  ＨＥＬＬＯ   world ", True),
+    ("regex", "Hello.*", "Hello there", True),
+    ("regex", "Hello", "Hello there", False),
+])
+def test_string_rules(rule, expected, actual, passed):
+    rules = CompareRules(string_rule=rule)
+    assert compare_outputs({"s": actual}, {"s": expected}, rules).passed is passed
+
+
+def test_regex_rule_matches_whole_value():
+    rules = CompareRules(string_rules={"message": "regex"})
+    assert compare_outputs({"message": "成功添加iron资源"}, {"message": "成功添加.*资源"}, rules).passed
+    assert not compare_outputs({"message": "添加失败"}, {"message": "成功.*"}, rules).passed
+
+
+def test_list_modes():
+    expected = {"items": ["a", "b", "b"]}
+    cases = {
+        "length": (["x", "y", "z"], ["a"]),
+        "unordered": (["b", "a", "b"], ["a", "b", "c"]),
+        "subset": (["b", "c", "a", "b"], ["a", "b"]),
+    }
+    for mode, (passing, failing) in cases.items():
+        rules = CompareRules(list_mode=mode)
+        assert compare_outputs({"items": passing}, expected, rules).passed, mode
+        assert not compare_outputs({"items": failing}, expected, rules).passed, mode
+
+
+def test_unordered_list_reports_missing_and_extra_elements():
+    report = compare_outputs({"items": ["a", "c"]}, {"items": ["a", "b"]}, CompareRules(list_mode="unordered"))
+    assert report.mismatches[0].kind == "elements"
+    assert "缺少 \"b\"" in report.errors[0] and "多余 \"c\"" in report.errors[0]
+
+
+def test_ordered_list_compares_elements_after_length_mismatch():
+    rules = CompareRules(list_modes={"items": "ordered"})
+    report = compare_outputs({"items": [{"id": 1}]}, {"items": [{"id": 2}, {"id": 3}]}, rules)
+    assert [(m.path, m.kind) for m in report.mismatches] == [
+        ("items", "length"), ("items[0].id", "value"), ("items[1]", "missing")
+    ]
+
+
+def test_strict_types():
+    rules = CompareRules(strict_types=True)
+    assert not compare_outputs({"flag": 1}, {"flag": True}, rules).passed
+    assert not compare_outputs({"flag": False}, {"flag": True}, rules).passed
+    assert not compare_outputs({"empty": "x"}, {"empty": None}, rules).passed
+    assert compare_outputs({"flag": True, "empty": None}, {"flag": True, "empty": None}, rules).passed
+
+
+def test_missing_object_reported_once():
+    expected = {"context": {"gold": 1, "wood": 2}, "ok": 1}
+    report = compare_outputs({"ok": 1}, expected)
+    assert report.errors == ["缺少字段 context"]
+    assert report.field_results == {"context.gold": False, "context.wood": False, "ok": True}
+    assert report.field_pass_rate == pytest.approx(1 / 3)
+
+
+def test_non_object_expected_output():
+    assert compare_outputs(3.001, 3).passed
+    assert compare_outputs({"a": 1}, 3).mismatches[0].path == "$"
+
+
+def test_from_dict_and_validation():
+    rules = CompareRules.from_dict({"tolerance": 2, "string_rule": "exact", "list_modes": {"a": "subset"},
+                                    "strict_types": True})
+    assert rules.tolerance_for("x") == 2.0
+    assert rules.string_rule_for("x") == "exact"
+    assert rules.list_mode_for("a") == "subset"
+    assert rules.list_mode_for("b") == "any"
+    assert rules.strict_types
+    assert CompareRules.from_dict(None) == CompareRules()
+    with pytest.raises(ValueError):
+        CompareRules(list_mode="sorted")
+    with pytest.raises(ValueError):
+        CompareRules.from_dict({"string_rules": {"a": "fuzzy"}})
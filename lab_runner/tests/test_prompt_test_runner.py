@@ -0,0 +1,61 @@
+import asyncio
+import contextlib
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from prompt_test_runner import PromptTestRunner
+from response_cache import ResponseCache
+
+OUTPUT = {"updated_context": {}, "process": [], "botstatus": {}, "message": "好的", "dialogue": []}
+
+
+class FakeChat:
+    """按给定内容回复的聊天模型，content 为异常时抛出"""
+    model_name = "gpt-4o-mini"
+    openai_api_base = "https://api.example.com/v1"
+    temperature = 0.7
+
+    def __init__(self, content):
+        self.content = content
+
+    def invoke(self, messages, **kwargs):
+        if isinstance(self.content, Exception):
+            raise self.content
+        return SimpleNamespace(content=self.content)
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.invoke(messages, **kwargs)
+
+
+@pytest.fixture
+def runner(tmp_path):
+    runner = PromptTestRunner.__new__(PromptTestRunner)
+    runner.response_cache = ResponseCache(cache_dir=tmp_path, mode="off")
+    runner._build_messages = lambda test_case, model_name="": [SimpleNamespace(type="human", content="输入")]
+    return runner
+
+
+def run_both(runner, chat, expected=OUTPUT):
+    """同步和异步版本的结果（不含执行时间和延迟指标）"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync = runner.run_test({"input": "你好"}, expected, chat)
+        async_ = asyncio.run(runner.arun_test({"input": "你好"}, expected, chat))
+    return (sync[0], sync[3]), (async_[0], async_[3])
+
+
+@pytest.mark.parametrize("content, outcome", [
+    (json.dumps(OUTPUT, ensure_ascii=False), (True, False)),
+    ("不是 JSON", (False, False)),
+    (json.dumps({"message": "缺少字段"}), (False, False)),   # 输出格式错误不是API调用错误
+    (TimeoutError("Request timed out"), (False, True)),
+])
+def test_run_test_outcomes(runner, content, outcome):
+    assert run_both(runner, FakeChat(content)) == (outcome, outcome)
+
+
+def test_mismatch_fails(runner):
+    expected = {**OUTPUT, "botstatus": {"hp": 1}}
+    assert run_both(runner, FakeChat(json.dumps(OUTPUT, ensure_ascii=False)), expected) == ((False, False),) * 2
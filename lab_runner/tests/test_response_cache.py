@@ -0,0 +1,16 @@
+from response_cache import ResponseCache
+
+
+def test_auto_mode_only_caches_zero_temperature(tmp_path):
+    cache = ResponseCache(cache_dir=tmp_path, mode="auto")
+    assert cache.mode_for(0.0) == "readwrite"
+    assert cache.mode_for(0.7) == "off" and cache.mode_for(None) == "off"
+    assert ResponseCache(cache_dir=tmp_path, mode="replay").mode_for(0.7) == "replay"
+
+
+def test_explicit_zero_limits_override_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_MAX_MB", "500")
+    monkeypatch.setenv("RESPONSE_CACHE_MAX_AGE_DAYS", "7")
+    assert ResponseCache(cache_dir=tmp_path).max_size_bytes == 500 * 1024 * 1024
+    cache = ResponseCache(cache_dir=tmp_path, max_size_mb=0, max_age_days=0)
+    assert cache.max_size_bytes == 0 and cache.max_age_seconds == 0
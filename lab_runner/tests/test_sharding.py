@@ -0,0 +1,86 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from sharding import (MANIFEST_TYPE, merge_records, missing_shards, parse_shard_spec, plan_shard, read_records,
+                      shard_manifest, shard_of, split_manifests)
+
+MODELS = ["gpt-4-turbo", "qwen-max", "glm-4"]
+CASES = [SimpleNamespace(name=f"用例 {i}") for i in range(20)]
+
+
+def record(case, shard, model="gpt-4-turbo", test_time="2026-01-01 00:00:00", prompt_system="资源管理", **extra):
+    return {"prompt_system": prompt_system, "model": model, "case": case, "shard": shard,
+            "test_time": test_time, "passed": True, "execution_time": 1.0, **extra}
+
+
+def test_parse_shard_spec():
+    assert parse_shard_spec("1/4") == (1, 4)
+    for spec in ("4/4", "-1/2", "0/0", "a/b", "1"):
+        with pytest.raises(ValueError):
+            parse_shard_spec(spec)
+
+
+def test_plan_covers_every_pair_exactly_once():
+    shard_count = 4
+    seen = []
+    for index in range(shard_count):
+        for model, cases in plan_shard(MODELS, CASES, index, shard_count).items():
+            seen.extend((model, case.name) for case in cases)
+    assert sorted(seen) == sorted((model, case.name) for model in MODELS for case in CASES)
+
+
+def test_plan_is_stable_and_keeps_file_order():
+    plan = plan_shard(MODELS, CASES, 2, 3)
+    assert plan == plan_shard(MODELS, CASES, 2, 3)
+    for model, cases in plan.items():
+        assert cases == [case for case in CASES if shard_of(model, case.name, 3) == 2]
+    # 哈希只依赖模型和用例名称
+    assert shard_of("glm-4", "用例 1", 8) == shard_of("glm-4", "用例 1", 8)
+
+
+def test_merge_keeps_latest_result():
+    older = record("用例 1", "0/2", test_time="2026-01-01 00:00:00", passed=False)
+    newer = record("用例 1", "0/2", test_time="2026-01-02 00:00:00")
+    other = record("用例 2", "1/2")
+    merged = merge_records([newer, other, older])
+    assert len(merged) == 2
+    assert next(r for r in merged if r["case"] == "用例 1")["passed"] is True
+
+
+def test_read_and_split_manifests(tmp_path):
+    path = tmp_path / "shard_0.jsonl"
+    lines = [json.dumps(shard_manifest("资源管理", "t", 0, 2, 1)), "not json", json.dumps(record("用例 1", "0/2"))]
+    path.write_text("\n".join(lines) + "\n\n", encoding="utf-8")
+    manifests, records = split_manifests(read_records([path]))
+    assert [m["type"] for m in manifests] == [MANIFEST_TYPE]
+    assert [r["case"] for r in records] == ["用例 1"]
+
+
+def test_empty_shard_with_manifest_is_not_missing():
+    manifests = [shard_manifest("资源管理", "t", 0, 3, 2), shard_manifest("资源管理", "t", 1, 3, 0),
+                 shard_manifest("资源管理", "t", 2, 3, 1)]
+    records = [record("用例 1", "0/3"), record("用例 2", "0/3"), record("用例 3", "2/3")]
+    assert missing_shards(records, manifests) == []
+
+
+def test_missing_and_incomplete_shards():
+    manifests = [shard_manifest("资源管理", "t", 0, 3, 2), shard_manifest("资源管理", "t", 1, 3, 0)]
+    records = [record("用例 1", "0/3")]
+    assert missing_shards(records, manifests) == ["0/3（1/2 个用例）", "2/3"]
+
+
+def test_rerun_manifest_replaces_older_one():
+    manifests = [shard_manifest("资源管理", "2026-01-01", 0, 1, 5), shard_manifest("资源管理", "2026-01-02", 0, 1, 1)]
+    assert missing_shards([record("用例 1", "0/1")], manifests) == []
+
+
+def test_legacy_files_without_manifest():
+    records = [record("用例 1", "0/3"), record("用例 2", "2/3")]
+    assert missing_shards(records) == ["1/3"]
+
+
+def test_missing_shards_names_prompt_system_when_mixed():
+    records = [record("用例 1", "0/2"), record("用例 1", "1/2", prompt_system="建造系统")]
+    assert missing_shards(records) == ["建造系统 0/2", "资源管理 1/2"]
@@ -0,0 +1,39 @@
+from latency_metrics import LatencyCallbackHandler, LatencyMetrics
+from results_store import ResultsStore
+from usage_ledger import summarize_usage
+
+
+def failed_call_metrics():
+    """模拟一次失败的调用：开始后收到 on_llm_error"""
+    handler = LatencyCallbackHandler(model_name="gpt-4o")
+    handler.on_chat_model_start({}, [[]])
+    handler.on_llm_error(RuntimeError("429"))
+    return handler.metrics()
+
+
+def test_failed_call_has_no_usage():
+    metrics = failed_call_metrics()
+    assert metrics.usage_estimated is None and metrics.cost is None
+    assert metrics.to_dict()["usage_estimated"] is None
+
+
+def test_summarize_usage_skips_cache_hits_and_failed_calls():
+    ok = LatencyMetrics(input_tokens=100, output_tokens=20, cost=0.01)
+    unpriced = LatencyMetrics(input_tokens=50, output_tokens=5, usage_estimated=True)
+    usage = summarize_usage([ok, unpriced, None, failed_call_metrics()])
+    assert usage["calls"] == 2
+    assert usage["input_tokens"] == 150 and usage["estimated"] == 1
+    assert usage["cost"] == 0.01 and usage["unpriced"] == 1
+
+
+def test_results_store_usage_summary_skips_failed_calls(tmp_path):
+    store = ResultsStore(tmp_path / "results.db")
+    base = {"execution_time": 1.0, "input_data": {}, "expected_output": {}, "actual_output": {},
+            "field_results": {}}
+    store.add("t1", "资源管理", "gpt-4o", "用例 1",
+              {**base, "passed": True, "latency": LatencyMetrics(input_tokens=10, cost=0.5).to_dict()})
+    store.add("t1", "资源管理", "gpt-4o", "用例 2",
+              {**base, "passed": False, "latency": failed_call_metrics().to_dict()})
+    store.add("t1", "资源管理", "gpt-4o", "用例 3", {**base, "passed": True})  # 命中响应缓存
+    [summary] = store.usage_summary()
+    assert summary["calls"] == 1 and summary["unpriced"] == 0 and summary["cost"] == 0.5
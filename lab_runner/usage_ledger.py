@@ -0,0 +1,97 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每条消息的格式开销（角色标记等），与 OpenAI 的计数方式一致
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# tiktoken 不认识的模型（Claude、Gemini、国内模型等）使用的编码
+FALLBACK_ENCODING = "o200k_base"
+
+_lock = threading.Lock()
+_encodings: Dict[str, Any] = {}
+_tokenizer_unavailable = False
+
+
+def _encoding_for(model_name: str):
+    """返回模型对应的 tiktoken 编码，未安装 tiktoken 或无法下载编码文件时返回 None"""
+    global _tokenizer_unavailable
+    with _lock:
+        if _tokenizer_unavailable:
+            return None
+        if model_name in _encodings:
+            return _encodings[model_name]
+        try:
+            import tiktoken
+
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+        except Exception as e:
+            # 编码文件在首次使用时下载，未安装 tiktoken 或离线时不再重试，改为按字符数估算
+            logger.warning(f"无法加载 tiktoken 编码，token 数按字符数估算: {str(e)}")
+            _tokenizer_unavailable = True
+            return None
+        _encodings[model_name] = encoding
+        return encoding
+
+
+def count_tokens(text: str, model_name: str = "") -> int:
+    """用本地分词器计算文本的 token 数，没有分词器时按字符数估算"""
+    if not text:
+        return 0
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        # 中文约 1 字符 1 token，英文约 4 字符 1 token
+        ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+        return ascii_chars // 4 + (len(text) - ascii_chars)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _content_text(content: Any) -> str:
+    """消息内容的文本，支持字符串和内容块列表（例如带 cache_control 的系统提示词）"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(block if isinstance(block, str) else str(block.get("text", ""))
+                       for block in content if isinstance(block, (str, dict)))
+    return str(content or "")
+
+
+def count_message_tokens(messages: List[Any], model_name: str = "") -> int:
+    """估算一组聊天消息（LangChain 消息对象或字符串）的输入 token 数"""
+    return sum(count_tokens(_content_text(getattr(message, "content", message)), model_name)
+               + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def summarize_usage(metrics: List[Any]) -> Dict[str, Any]:
+    """汇总多次调用的 token 用量和费用，跳过命中响应缓存（没有调用模型）和调用失败（没有用量）的用例
+
+    Args:
+        metrics: LatencyMetrics 列表（或 None）
+    Returns:
+        calls: 实际调用次数；estimated: 没有用量信息、按本地分词器估算的调用数；
+        cost: 已知单价的调用费用之和（美元），全部调用都没有单价时为 None；
+        unpriced: 没有单价的调用数
+    """
+    called = [m for m in metrics if m is not None and m.usage_estimated is not None]
+    priced = [m.cost for m in called if m.cost is not None]
+    return {
+        "calls": len(called),
+        "input_tokens": sum(m.input_tokens for m in called),
+        "output_tokens": sum(m.output_tokens for m in called),
+        "cached_tokens": sum(m.cached_tokens for m in called),
+        "estimated": sum(1 for m in called if m.usage_estimated),
+        "cost": sum(priced) if priced else None,
+        "unpriced": len(called) - len(priced)
+    }
+
+
+def format_cost(cost: Optional[float]) -> str:
+    """费用显示格式，未知时显示 -"""
+    if cost is None:
+        return "-"
+    return f"${cost:.4f}" if cost < 1 else f"${cost:.2f}"
@@ -0,0 +1,81 @@
+"""卡牌、卡组和卡牌命令配置的只读目录
+
+配置文件按修改时间缓存：同一进程中的 GameManager、CommandProcessor 和界面共用一份解析结果，
+并预先建立按 card_id 索引的字典，文件修改后下次读取时自动重新加载。
+目录中的数据是共享的，卡牌定义是只读的，对局中的卡牌是引用定义的 CardInstance（见 card_instance.py）。
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CARDS_PATH = os.path.join(BASE_DIR, "cards.json")
+DECKS_PATH = os.path.join(BASE_DIR, "decks.json")
+COMMANDS_PATH = os.path.join(BASE_DIR, "cards_commands.json")
+
+# cards_commands.json 中没有单独配置的卡牌使用的默认命令配置
+DEFAULT_COMMANDS_ID = "all"
+
+
+@dataclass(frozen=True)
+class CardCatalog:
+    cards: List[Dict[str, Any]]           # cards.json 中的卡牌列表
+    by_id: Dict[str, Mapping[str, Any]]   # 卡牌ID -> 只读的卡牌定义（对局中的卡牌实例共享引用）
+
+
+@dataclass(frozen=True)
+class CommandCatalog:
+    entries: List[Dict[str, Any]]              # cards_commands.json 中的配置列表
+    by_card_id: Dict[str, Dict[str, Any]]      # 卡牌ID -> 命令配置（不含默认配置）
+    default: Optional[Dict[str, Any]] = None   # card_id 为 "all" 的默认配置
+
+    def for_card(self, card_id: str) -> Optional[Dict[str, Any]]:
+        """卡牌的命令配置，没有单独配置时返回默认配置"""
+        return self.by_card_id.get(str(card_id), self.default)
+
+
+_lock = threading.Lock()
+_cache: Dict[str, Tuple[float, Any]] = {}
+
+
+def _load_cached(path: str, build: Callable[[Any], Any]) -> Any:
+    """读取 JSON 文件并用 build 建立目录，文件未修改时返回缓存结果"""
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        value = build(json.load(f))
+    with _lock:
+        _cache[path] = (mtime, value)
+    return value
+
+
+def _build_card_catalog(cards: List[Dict[str, Any]]) -> CardCatalog:
+    return CardCatalog(cards=cards, by_id={str(card["id"]): MappingProxyType(dict(card)) for card in cards})
+
+
+def _build_command_catalog(entries: List[Dict[str, Any]]) -> CommandCatalog:
+    by_card_id = {}
+    for entry in entries:
+        # 与逐个查找时一致，同一卡牌有多条配置时使用第一条
+        by_card_id.setdefault(str(entry.get("card_id", "")), entry)
+    default = by_card_id.pop(DEFAULT_COMMANDS_ID, None)
+    return CommandCatalog(entries=entries, by_card_id=by_card_id, default=default)
+
+
+def card_catalog(path: str = CARDS_PATH) -> CardCatalog:
+    return _load_cached(path, _build_card_catalog)
+
+
+def command_catalog(path: str = COMMANDS_PATH) -> CommandCatalog:
+    return _load_cached(path, _build_command_catalog)
+
+
+def load_decks(path: str = DECKS_PATH) -> Dict[str, Dict[str, Any]]:
+    """卡组ID -> 卡组配置（name、description、cards）"""
+    return _load_cached(path, lambda decks: decks)
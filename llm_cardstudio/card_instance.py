@@ -0,0 +1,137 @@
+"""对局中的卡牌实例
+
+卡组中同一张卡牌可以有多张（例如两张 card_26），以前每张都是卡牌定义的字典副本、共用同一个 id，
+按 id 查找和 `card in list` 比较时会取到另一张同名卡牌。CardInstance 为每张卡牌分配本局唯一的实例ID，
+引用共享的只读卡牌定义，只保存会在对局中变化的属性，内存占用和复制成本都很小。
+"""
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+# 对局中可以修改的属性，其余字段（名称、类型、费用、效果描述等）从卡牌定义中读取
+MUTABLE_FIELDS = ("attack", "health", "armor", "status", "effects")
+_MUTABLE_FIELDS = frozenset(MUTABLE_FIELDS)
+
+
+class CardInstance:
+    """一张卡牌实例：唯一的实例ID + 只读的卡牌定义 + 可变属性
+
+    支持 card['name']、card.get('cost')、card['health'] = 0 等字典式访问，按字典处理卡牌的代码不需要修改：
+    - card['id'] 是实例ID（如 "card_26#3"），card['card_id'] 是卡牌定义ID（如 "card_26"）
+    - 只有 MUTABLE_FIELDS 可以赋值，修改其他字段抛出 KeyError
+    - 相等比较按对象，`card in list` 不会匹配到属性相同的另一张卡牌
+    - record() 缓存不可变的属性记录，供状态快照共享（见 game_snapshot.py），赋值时缓存失效
+    """
+    __slots__ = ("id", "definition", "attack", "health", "armor", "status", "effects", "_record")
+
+    def __init__(self, instance_id: str, definition: Mapping[str, Any], attack: int = 0, health: int = 0,
+                 armor: int = 0, status: Optional[str] = None, effects: tuple = ()):
+        self.id = instance_id
+        self.definition = definition
+        self.attack = attack
+        self.health = health
+        self.armor = armor
+        self.status = status
+        self.effects = effects  # 附加的状态效果，修改时整体替换为新的 tuple
+        self._record = None
+
+    @classmethod
+    def create(cls, definition: Mapping[str, Any], instance_id: str) -> "CardInstance":
+        """按卡牌定义的初始属性创建实例"""
+        return cls(instance_id, definition,
+                   attack=definition.get("attack", 0),
+                   health=definition.get("health", 0),
+                   armor=definition.get("armor", 0),
+                   status=definition.get("status"),
+                   effects=tuple(definition.get("effects", ())))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], definitions: Mapping[str, Mapping[str, Any]],
+                  instance_id: Optional[str] = None) -> "CardInstance":
+        """从存档中的字典恢复实例
+
+        Args:
+            definitions: 卡牌定义ID -> 卡牌定义，卡牌目录中没有的卡牌使用存档中的字段作为定义
+            instance_id: 实例ID，None 时使用存档中的 id（旧存档没有 card_id 字段，需要调用方分配新ID）
+        """
+        card_id = data.get("card_id", data.get("id"))
+        definition = definitions.get(card_id)
+        if definition is None:
+            fields = {key: value for key, value in data.items() if key not in _MUTABLE_FIELDS}
+            fields.pop("card_id", None)
+            fields["id"] = card_id
+            definition = MappingProxyType(fields)
+        card = cls.create(definition, instance_id or data.get("id"))
+        for field_name in MUTABLE_FIELDS:
+            if field_name in data:
+                value = data[field_name]
+                setattr(card, field_name, tuple(value) if field_name == "effects" else value)
+        return card
+
+    @classmethod
+    def from_record(cls, record: tuple) -> "CardInstance":
+        """从快照中的记录重建实例，记录继续作为缓存，未修改的卡牌在下一个快照中共享同一记录"""
+        card = cls(*record)
+        card._record = record
+        return card
+
+    def record(self) -> tuple:
+        """不可变的记录 (实例ID, 卡牌定义, attack, health, armor, status, effects)"""
+        if self._record is None:
+            self._record = (self.id, self.definition, self.attack, self.health, self.armor, self.status, self.effects)
+        return self._record
+
+    def clone(self) -> "CardInstance":
+        """复制可变属性，共享卡牌定义"""
+        return CardInstance(self.id, self.definition, self.attack, self.health, self.armor, self.status, self.effects)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可 JSON 序列化的完整卡牌数据（用于存档、界面显示和 LLM 上下文）"""
+        data = dict(self.definition)
+        data.update(id=self.id, card_id=self.definition["id"], attack=self.attack, health=self.health,
+                    armor=self.armor, status=self.status, effects=list(self.effects))
+        return data
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "id":
+            return self.id
+        if key == "card_id":
+            return self.definition["id"]
+        if key in _MUTABLE_FIELDS:
+            return getattr(self, key)
+        return self.definition[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in _MUTABLE_FIELDS:
+            raise KeyError(f"卡牌属性 {key} 不可修改")
+        setattr(self, key, value)
+        self._record = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: object) -> bool:
+        return key in ("id", "card_id") or key in _MUTABLE_FIELDS or key in self.definition
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __repr__(self) -> str:
+        return (f"CardInstance({self.id!r}, {self.definition.get('name')!r}, "
+                f"attack={self.attack}, health={self.health})")
+
+
+def to_plain(value: Any) -> Any:
+    """把包含卡牌实例的状态转换为普通的字典和列表（副本），可以直接 JSON 序列化"""
+    if isinstance(value, CardInstance):
+        return value.to_dict()
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
@@ -1,15 +1,27 @@
-import streamlit as st
+import sys
+from collections import deque
 from typing import Any, List, Dict, Optional
 import json
 from datetime import datetime
 
+# 无界面运行时最多保留的日志条数
+MAX_HEADLESS_LOGS = 1000
+
 class DebugUtils:
     """调试工具类，用于统一管理调试信息的输出"""
     
     def __init__(self, debug_mode: bool = True):
         self.debug_mode = debug_mode
+        self.headless_logs = deque(maxlen=MAX_HEADLESS_LOGS)
+
+    def _log_store(self):
+        """日志存储：Streamlit 会话中保存在 session_state，无界面运行时（批量模拟）保存在实例中"""
+        st = sys.modules.get("streamlit")
+        if st is None or not st.runtime.exists():
+            return self.headless_logs
         if 'debug_logs' not in st.session_state:
             st.session_state.debug_logs = []
+        return st.session_state.debug_logs
     
     def log(self, category: str, message: str, data: Optional[Any] = None):
         """记录调试信息
@@ -31,7 +43,7 @@ class DebugUtils:
         }
         
         # 添加到session state中保存
-        st.session_state.debug_logs.append(log_entry)
+        self._log_store().append(log_entry)
         
         # 同时打印到控制台
         print(f"[{timestamp}] [{category}] {message}")
@@ -48,17 +60,18 @@ class DebugUtils:
         Returns:
             符合条件的日志列表
         """
-        logs = st.session_state.debug_logs
+        logs = list(self._log_store())
         if category:
             logs = [log for log in logs if log["category"] == category]
         return logs[-limit:]
     
     def clear_logs(self):
         """清空日志"""
-        st.session_state.debug_logs = []
+        self._log_store().clear()
     
     def render_debug_panel(self):
         """在Streamlit侧边栏渲染调试面板"""
+        import streamlit as st
         with st.sidebar:
             with st.expander("🔍 调试面板", expanded=False):
                 # 显示最近的日志
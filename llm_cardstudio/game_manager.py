@@ -2,17 +2,47 @@ import json
 import os
 import random
 import time
-import streamlit as st
-from typing import Dict, List, Any, Tuple
-from re import T
+import zlib
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from debug_utils import debug_utils
+from card_catalog import card_catalog
+from card_instance import CardInstance, to_plain
+from game_snapshot import (ZONE_STATE_KEYS, OWNERS, GameSnapshot, UndoHistory, decode_save, encode_save,
+                           freeze, freeze_zone, thaw)
 import asyncio
 
+# 建立 卡牌ID -> 卡牌 索引的区域（与 CommandProcessor 命令参数中的位置名称一致）
+CARD_ZONES = ("hand", "field", "deck", "discard")
+
+# 存档文件后缀（压缩的快照增量编码），旧版存档为 .json
+SAVE_EXTENSION = ".sav"
+
+
 class GameManager:
-    def __init__(self):
-        """初始化游戏管理器"""
+    """游戏管理器：游戏状态与主循环状态机，不依赖 Streamlit
+
+    无界面运行时（time_scale 为 0）阶段切换和命令动画不再等待，游戏消息保存在 game_messages 中，
+    可以用 run_until_idle 驱动状态机批量模拟对局；gui_main 传入等待倍率和消息回调作为界面适配层。
+    """
+
+    def __init__(self, time_scale: float = 0.0, message_sink: Optional[Callable[[str], None]] = None,
+                 seed: Optional[int] = None, self_play: bool = False):
+        """初始化游戏管理器
+
+        Args:
+            time_scale: 阶段切换和命令动画的等待时间倍率，界面使用 1.0，0 表示不等待
+            message_sink: 游戏消息回调，None 时消息追加到 game_messages
+            seed: 洗牌和 AI 决策的随机种子，相同种子和卡组得到相同的对局
+            self_play: 玩家回合也由 AI 决策（与对手相同的随机策略），用于自我对弈模拟
+        """
+        self.time_scale = time_scale
+        self.message_sink = message_sink
+        self.rng = random.Random(seed)
+        self.self_play = self_play
         self.load_cards()
         self.selected_decks = None
+        self.history = UndoHistory()
+        self._last_snapshot = None
         self._initialize_game_state()
         
         # 初始化命令处理器
@@ -28,19 +58,14 @@ class GameManager:
         }
         
         # 初始化命令序列
-        if 'command_sequence' not in st.session_state:
-            st.session_state.command_sequence = {
-                'commands': [],
-                'current_index': 0,
-                'is_executing': False
-            }
+        self.command_sequence = {
+            'commands': [],
+            'current_index': 0,
+            'is_executing': False
+        }
         
         # 初始化游戏消息
-        if 'game_messages' not in st.session_state:
-            st.session_state.game_messages = []
-            
-        self.command_sequence = st.session_state.command_sequence
-        self.game_messages = st.session_state.game_messages
+        self.game_messages = []
 
     def set_commands_processor(self, processor):
         """设置命令处理器实例"""
@@ -73,6 +98,11 @@ class GameManager:
                 "player": [],    # 我方手牌
                 "opponent": []   # 对手手牌
             },
+            "played_cards": {
+                "player": [],    # 我方打出过的卡牌ID
+                "opponent": []   # 对手打出过的卡牌ID
+            },
+            "next_card_serial": 1,  # 下一个卡牌实例的序号
             "log": []
         }
         
@@ -89,13 +119,14 @@ class GameManager:
                 "discard_pile": []
             }
         }
+        self.rebuild_card_index()
 
     def load_cards(self):
-        """加载卡牌数据"""
+        """加载卡牌数据（进程内共享的卡牌目录，按卡牌ID预先建立索引）"""
         try:
-            cards_path = os.path.join(os.path.dirname(__file__), 'cards.json')
-            with open(cards_path, 'r', encoding='utf-8') as f:
-                self.available_cards = json.load(f)
+            catalog = card_catalog()
+            self.available_cards = catalog.cards
+            self.cards_by_id = catalog.by_id
             debug_utils.log("game", "加载卡牌数据成功", {
                 "卡牌数量": len(self.available_cards),
                 "卡牌列表": [card["name"] for card in self.available_cards]
@@ -103,6 +134,185 @@ class GameManager:
         except Exception as e:
             debug_utils.log("game", "加载卡牌数据出错", {"错误": str(e)})
             self.available_cards = []
+            self.cards_by_id = {}
+
+    def new_card_instance(self, definition) -> CardInstance:
+        """按卡牌定义创建卡牌实例，实例ID（如 card_26#3）在本局内唯一"""
+        serial = self.game_state.get("next_card_serial", 1)
+        self.game_state["next_card_serial"] = serial + 1
+        return CardInstance.create(definition, f"{definition['id']}#{serial}")
+
+    def _restore_card_instances(self):
+        """把读档得到的卡牌字典恢复为卡牌实例，旧存档中的卡牌（没有 card_id 字段）分配新的实例ID"""
+        zones = [self.get_card_list(position, owner) for position in CARD_ZONES for owner in ("player", "opponent")]
+        zones += [self.deck_state[owner].get("draw_history", []) for owner in ("player", "opponent")]
+        
+        # 新卡牌实例的序号接在存档中已有的实例之后
+        serials = [int(card["id"].rsplit("#", 1)[1]) for cards in zones for card in cards
+                   if "card_id" in card and str(card.get("id", "")).rsplit("#", 1)[-1].isdigit()]
+        self.game_state["next_card_serial"] = max(self.game_state.get("next_card_serial", 1),
+                                                  max(serials, default=0) + 1)
+        for cards in zones:
+            for i, card in enumerate(cards):
+                if "card_id" in card:
+                    cards[i] = CardInstance.from_dict(card, self.cards_by_id)
+                else:
+                    definition = self.cards_by_id.get(str(card.get("id")), {"id": card.get("id")})
+                    cards[i] = CardInstance.from_dict(card, self.cards_by_id,
+                                                      instance_id=self.new_card_instance(definition).id)
+
+    def get_card_list(self, position: str, owner: str) -> List[Dict]:
+        """获取指定位置的卡牌列表"""
+        if position == 'hand':
+            return self.game_state['hand_cards'][owner]
+        elif position == 'field':
+            return self.game_state['field_cards'][owner]
+        elif position == 'deck':
+            return self.deck_state[owner]['deck']
+        elif position == 'discard':
+            return self.deck_state[owner]['discard_pile']
+        else:
+            raise ValueError(f"无效的位置: {position}")
+
+    def rebuild_card_index(self):
+        """按当前状态重建各区域的 卡牌ID -> 卡牌 索引
+        
+        区域中的卡牌只通过 add_card / remove_card / move_card 增减，索引随之更新；
+        整体替换状态（初始化、发牌、读档）后需要重建。
+        """
+        self.card_index = {}
+        for position in CARD_ZONES:
+            for owner in ("player", "opponent"):
+                index = {}
+                for card in self.get_card_list(position, owner):
+                    index.setdefault(str(card.get('id')), []).append(card)
+                self.card_index[(position, owner)] = index
+
+    def find_card(self, position: str, owner: str, card_id: str) -> Optional[Dict]:
+        """按ID查找区域中的卡牌，同一ID有多张时返回最先进入该区域的一张"""
+        cards = self.card_index[(position, owner)].get(str(card_id))
+        return cards[0] if cards else None
+
+    def add_card(self, position: str, owner: str, card: Dict):
+        """把卡牌放到区域末尾"""
+        self.get_card_list(position, owner).append(card)
+        self.card_index[(position, owner)].setdefault(str(card.get('id')), []).append(card)
+
+    def remove_card(self, position: str, owner: str, card: Dict) -> bool:
+        """从区域中移除这张卡牌（按对象匹配，不会误删属性相同的另一张同名卡牌）
+        
+        Returns:
+            bool: 卡牌是否在该区域中
+        """
+        card_list = self.get_card_list(position, owner)
+        # 从末尾查找：抽牌总是取卡组最后一张
+        for i in range(len(card_list) - 1, -1, -1):
+            if card_list[i] is card:
+                del card_list[i]
+                break
+        else:
+            return False
+
+        card_id = str(card.get('id'))
+        same_id = self.card_index[(position, owner)].get(card_id, [])
+        for i, c in enumerate(same_id):
+            if c is card:
+                del same_id[i]
+                break
+        if not same_id:
+            self.card_index[(position, owner)].pop(card_id, None)
+        return True
+
+    def move_card(self, card: Dict, source: str, target: str, owner: str) -> bool:
+        """把卡牌从 source 区域移动到 target 区域，卡牌不在 source 中时返回 False"""
+        if not self.remove_card(source, owner, card):
+            return False
+        self.add_card(target, owner, card)
+        return True
+
+    def snapshot(self) -> GameSnapshot:
+        """当前状态的不可变快照，与上一个快照共享没有变化的卡牌记录和区域"""
+        last = self._last_snapshot
+        previous = last.zones if last else {}
+        zones = {}
+        for owner in OWNERS:
+            for position in CARD_ZONES:
+                zones[(position, owner)] = freeze_zone(self.get_card_list(position, owner),
+                                                       previous.get((position, owner)))
+            zones[("draw_history", owner)] = freeze_zone(self.deck_state[owner]["draw_history"],
+                                                         previous.get(("draw_history", owner)))
+        snapshot = GameSnapshot(
+            state=freeze({key: value for key, value in self.game_state.items() if key not in ZONE_STATE_KEYS},
+                         last.state if last else None),
+            zones=zones,
+            selected_decks=freeze(self.selected_decks, last.selected_decks if last else None)
+        )
+        self._last_snapshot = snapshot
+        return snapshot
+
+    def restore(self, snapshot: GameSnapshot):
+        """恢复到快照的状态，卡牌实例按记录重建（共享卡牌定义），进行中的命令序列被丢弃"""
+        cards: Dict[str, CardInstance] = {}
+
+        def zone(position, owner):
+            # 同一实例在多个区域中（手牌和抽牌记录）恢复为同一个对象
+            restored = []
+            for record in snapshot.zones.get((position, owner), ()):
+                card = cards.get(record[0])
+                if card is None:
+                    card = cards[record[0]] = CardInstance.from_record(record)
+                restored.append(card)
+            return restored
+
+        hand_cards = {owner: zone("hand", owner) for owner in OWNERS}
+        field_cards = {owner: zone("field", owner) for owner in OWNERS}
+        self.deck_state = {
+            owner: {"deck": zone("deck", owner), "draw_history": zone("draw_history", owner),
+                    "discard_pile": zone("discard", owner)}
+            for owner in OWNERS
+        }
+        self.game_state = {**thaw(snapshot.state, cards), "hand_cards": hand_cards, "field_cards": field_cards}
+        self.selected_decks = thaw(snapshot.selected_decks, cards)
+        self.rebuild_card_index()
+        self._last_snapshot = snapshot
+
+        self.command_sequence = {'commands': [], 'current_index': 0, 'is_executing': False}
+        self.command_sequence_state = {
+            'is_paused': False,
+            'is_interrupted': False,
+            'awaiting_selection': None,
+            'current_command': None
+        }
+
+    def fork(self, seed: Optional[int] = None) -> "GameManager":
+        """从当前状态分出一个独立的无界面对局（例如 AI 前瞻搜索时试走一步），不影响当前对局"""
+        branch = GameManager(seed=seed, self_play=self.self_play)
+        branch.restore(self.snapshot())
+        return branch
+
+    def checkpoint(self, label: str, snapshot: Optional[GameSnapshot] = None):
+        """记录撤销点，snapshot 为操作前的快照，None 时使用当前状态"""
+        self.history.record(label, snapshot or self.snapshot())
+
+    def undo(self) -> bool:
+        """撤销到上一个撤销点"""
+        entry = self.history.undo(self.snapshot())
+        if entry is None:
+            return False
+        label, snapshot = entry
+        self.restore(snapshot)
+        self.add_game_message(f"↩️ 已撤销: {label}")
+        return True
+
+    def redo(self) -> bool:
+        """重做被撤销的操作"""
+        entry = self.history.redo(self.snapshot())
+        if entry is None:
+            return False
+        label, snapshot = entry
+        self.restore(snapshot)
+        self.add_game_message(f"↪️ 已重做: {label}")
+        return True
 
     def get_available_cards(self):
         """获取手牌列表"""
@@ -138,11 +348,7 @@ class GameManager:
             # })
             
             # 查找卡牌并移动卡牌
-            card = None
-            for i, c in enumerate(hand_cards):
-                if str(c.get('id', '')) == str(card_id):
-                    card = c
-                    break
+            card = self.find_card('hand', player_type, card_id)
                     
             if not card:
                 print(f"未找到卡牌: {card_id}")
@@ -180,6 +386,8 @@ class GameManager:
                 if not success:
                     print(f"处理卡牌命令失败: {card_id}")
             
+            # 记录打出的卡牌，用于统计卡牌使用率
+            self.game_state.setdefault("played_cards", {"player": [], "opponent": []})[player_type].append(card['card_id'])
             return True
             
         except Exception as e:
@@ -188,11 +396,11 @@ class GameManager:
             return False
 
     def get_game_state(self):
-        """获取完整的游戏状态"""
-        return {
+        """获取完整的游戏状态（卡牌实例转换为字典的副本，用于界面显示和 LLM 上下文）"""
+        return to_plain({
             **self.game_state,
             "deck_state": self.deck_state
-        }
+        })
 
     def get_deck_state(self):
         """获取卡组状态"""
@@ -207,9 +415,9 @@ class GameManager:
         if not self.deck_state[player_type]["deck"]:
             return None
             
-        card = self.deck_state[player_type]["deck"].pop()
+        card = self.deck_state[player_type]["deck"][-1]
+        self.move_card(card, "deck", "hand", player_type)
         self.deck_state[player_type]["draw_history"].append(card)
-        self.game_state["hand_cards"][player_type].append(card)
         return card
     
     def discard_card(self, player_type: str, card):
@@ -219,21 +427,26 @@ class GameManager:
             player_type: 玩家类型 ("player" 或 "opponent")
             card: 要丢弃的卡牌
         """
-        if card in self.game_state["hand_cards"][player_type]:
-            self.game_state["hand_cards"][player_type].remove(card)
-            self.deck_state[player_type]["discard_pile"].append(card)
+        self.move_card(card, "hand", "discard", player_type)
 
     def add_game_message(self, message):
         """添加游戏消息到聊天记录"""
-        if "messages" in st.session_state:
-            st.session_state.messages.append({
+        if self.message_sink is not None:
+            self.message_sink(message)
+        else:
+            self.game_messages.append({
                 "role": "assistant",
                 "content": message
             })
 
+    def wait(self, duration):
+        """按 time_scale 等待，无界面运行时不等待"""
+        if duration > 0 and self.time_scale > 0:
+            time.sleep(duration * self.time_scale)
+
     def _player_phase_transition(self, duration=0.5):
         """模拟玩家回合阶段切换的过渡效果"""
-        time.sleep(duration)
+        self.wait(duration)
 
     def _process_game_start(self):
         """处理游戏开始阶段"""
@@ -243,6 +456,7 @@ class GameManager:
         
         # 重新初始化游戏状态
         self._initialize_game_state()
+        self.history.clear()
         
         # 如果有选择的卡组，初始化玩家和对手的卡组
         if self.selected_decks:
@@ -250,24 +464,25 @@ class GameManager:
             player_cards = []
             opponent_cards = []
             
-            # 将卡牌ID转换为完整的卡牌信息
+            # 将卡牌ID转换为卡牌实例（同一张卡牌的多个副本有各自的实例ID）
             for card_id in self.selected_decks["player"]:
-                card = next((c for c in self.available_cards if c["id"] == card_id), None)
+                card = self.cards_by_id.get(str(card_id))
                 if card:
-                    player_cards.append(card.copy())
+                    player_cards.append(self.new_card_instance(card))
                     
             for card_id in self.selected_decks["opponent"]:
-                card = next((c for c in self.available_cards if c["id"] == card_id), None)
+                card = self.cards_by_id.get(str(card_id))
                 if card:
-                    opponent_cards.append(card.copy())
+                    opponent_cards.append(self.new_card_instance(card))
             
             # 随机打乱卡组
-            random.shuffle(player_cards)
-            random.shuffle(opponent_cards)
+            self.rng.shuffle(player_cards)
+            self.rng.shuffle(opponent_cards)
             
             # 设置卡组
             self.deck_state["player"]["deck"] = player_cards
             self.deck_state["opponent"]["deck"] = opponent_cards
+            self.rebuild_card_index()
             
             debug_utils.log("game", "卡组初始化", {
                 "玩家卡组数量": len(player_cards),
@@ -342,9 +557,9 @@ class GameManager:
 
     def start_game(self):
         """开始新游戏"""
-        if not st.session_state.game_manager.selected_decks or \
-                not st.session_state.game_manager.selected_decks.get("player") or \
-                not st.session_state.game_manager.selected_decks.get("opponent"):
+        if not self.selected_decks or \
+                not self.selected_decks.get("player") or \
+                not self.selected_decks.get("opponent"):
             print("错误：卡组信息不正确，无法开始游戏")
             return
         if self.game_state["gameloop_state"] != "welcome":
@@ -364,7 +579,9 @@ class GameManager:
         self._player_phase_transition(duration)
 
     def save_game(self, save_name):
-        """保存游戏状态到文件
+        """保存游戏状态到文件（saves/{save_name}.sav）
+
+        存档是快照的增量编码（卡牌只保存实例ID和变化的属性）经 zlib 压缩，见 game_snapshot.py
         
         Args:
             save_name: 存档名称
@@ -387,15 +604,13 @@ class GameManager:
                     "player_hp": self.game_state.get("player_stats", {}).get("hp", 0),
                     "opponent_hp": self.game_state.get("opponent_stats", {}).get("hp", 0)
                 },
-                "game_state": self.game_state,
-                "deck_state": self.deck_state,
-                "selected_decks": self.selected_decks
             }
+            payload = encode_save(self.snapshot(), save_data["info"], self.cards_by_id)
             
             # 保存到文件
-            save_path = os.path.join(save_dir, f"{save_name}.json")
-            with open(save_path, "w", encoding="utf-8") as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
+            save_path = os.path.join(save_dir, f"{save_name}{SAVE_EXTENSION}")
+            with open(save_path, "wb") as f:
+                f.write(payload)
                 
             debug_utils.log("game", "保存游戏成功", {
                 "存档名称": save_name,
@@ -409,7 +624,7 @@ class GameManager:
             return False, f"保存失败: {str(e)}"
 
     def load_game(self, save_name):
-        """从文件加载游戏状态
+        """从文件加载游戏状态，支持压缩存档（.sav）和旧版 JSON 存档（.json）
         
         Args:
             save_name: 存档名称
@@ -420,36 +635,47 @@ class GameManager:
         try:
             # 构建存档路径
             save_dir = os.path.join(os.path.dirname(__file__), "saves")
-            save_path = os.path.join(save_dir, f"{save_name}.json")
+            save_path = os.path.join(save_dir, f"{save_name}{SAVE_EXTENSION}")
+            legacy_path = os.path.join(save_dir, f"{save_name}.json")
             
             # 检查文件是否存在
-            if not os.path.exists(save_path):
+            if not os.path.exists(save_path) and not os.path.exists(legacy_path):
                 return False, f"存档文件不存在: {save_name}"
             
-            # 读取存档文件
-            with open(save_path, "r", encoding="utf-8") as f:
-                save_data = json.load(f)
-            
-            # 验证必要的游戏数据
-            if "game_state" not in save_data or "deck_state" not in save_data:
-                return False, "存档数据缺少必要的游戏状态数据"
-            
-            # 使用深拷贝恢复游戏状态
-            import copy
-            self.game_state = copy.deepcopy(save_data["game_state"])
-            self.deck_state = copy.deepcopy(save_data["deck_state"])
-            
-            # 检查并处理可选数据
             warning_messages = []
-            
-            if "selected_decks" not in save_data:
-                warning_messages.append("警告: 存档中缺少卡组选择数据")
-                self.selected_decks = None
+            if os.path.exists(save_path):
+                with open(save_path, "rb") as f:
+                    snapshot, info = decode_save(f.read(), self.cards_by_id)
+                self.restore(snapshot)
+                if self.selected_decks is None:
+                    warning_messages.append("警告: 存档中缺少卡组选择数据")
             else:
-                self.selected_decks = copy.deepcopy(save_data["selected_decks"])
-            
-            # 获取存档信息（如果有的话）
-            info = save_data.get("info", {})
+                save_path = legacy_path
+                with open(save_path, "r", encoding="utf-8") as f:
+                    save_data = json.load(f)
+                
+                # 验证必要的游戏数据
+                if "game_state" not in save_data or "deck_state" not in save_data:
+                    return False, "存档数据缺少必要的游戏状态数据"
+                
+                # 使用深拷贝恢复游戏状态
+                import copy
+                self.game_state = copy.deepcopy(save_data["game_state"])
+                self.deck_state = copy.deepcopy(save_data["deck_state"])
+                self._restore_card_instances()
+                self.rebuild_card_index()
+                self._last_snapshot = None
+                
+                # 检查并处理可选数据
+                if "selected_decks" not in save_data:
+                    warning_messages.append("警告: 存档中缺少卡组选择数据")
+                    self.selected_decks = None
+                else:
+                    self.selected_decks = copy.deepcopy(save_data["selected_decks"])
+                
+                # 获取存档信息（如果有的话）
+                info = save_data.get("info", {})
+            self.history.clear()
             save_time = info.get("save_time", "未知时间")
             turn = self.game_state.get("turn_info", {}).get("current_turn", 0)
             player_hp = self.game_state.get("player_stats", {}).get("hp", 0)
@@ -476,7 +702,7 @@ class GameManager:
             
             return True, "\n".join(success_message)
             
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, zlib.error):
             return False, "存档文件格式错误"
         except Exception as e:
             debug_utils.log("game", "加载游戏失败", {"错误": str(e)})
@@ -486,15 +712,16 @@ class GameManager:
         """获取所有存档文件列表
         
         Returns:
-            list: 存档文件名列表（不含.json后缀）
+            list: 存档文件名列表（不含 .sav / .json 后缀）
         """
         try:
             save_dir = os.path.join(os.path.dirname(__file__), "saves")
             if not os.path.exists(save_dir):
                 return []
                 
-            # 获取所有.json文件并去掉后缀
-            save_files = [f[:-5] for f in os.listdir(save_dir) if f.endswith('.json')]
+            # 获取所有存档文件并去掉后缀，同名的新旧存档只列一次
+            save_files = {os.path.splitext(f)[0] for f in os.listdir(save_dir)
+                          if f.endswith(SAVE_EXTENSION) or f.endswith('.json')}
             return sorted(save_files)
             
         except Exception as e:
@@ -586,7 +813,7 @@ class GameManager:
             bool: 是否执行攻击
         """
         # 目前使用随机决策，50%概率攻击
-        return random.random() < 0.5
+        return self.rng.random() < 0.5
 
     def ai_decide_playcard(self):
         """AI决定是否打出卡牌
@@ -595,7 +822,7 @@ class GameManager:
             bool: 是否执行打出卡牌
         """
         # 目前使用随机决策，50%概率打出卡牌 
-        return random.random() < 0.5
+        return self.rng.random() < 0.5
 
     def _process_gameloop_state(self):
         """处理游戏主循环状态"""
@@ -642,8 +869,9 @@ class GameManager:
             return True
             
         elif gameloop_state == "player_turn":
-            # 玩家回合
-            if self._process_player_turn():
+            # 玩家回合（自我对弈时由 AI 代替玩家）
+            player_turn_done = self._process_ai_turn("player") if self.self_play else self._process_player_turn()
+            if player_turn_done:
                 self.game_state["gameloop_state"] = "next_turn"
                 return True
             
@@ -672,6 +900,36 @@ class GameManager:
         # 返回 状态是否变更?
         return False
 
+    def _loop_position(self):
+        """主循环状态和双方回合阶段，用于判断状态机是否还在推进"""
+        return (self.game_state.get("gameloop_state"),
+                self.game_state.get("player_turn_state"),
+                self.game_state.get("opponent_turn_state"))
+
+    def run_until_idle(self, max_steps: int = 10000) -> str:
+        """无界面驱动主循环，直到需要外部输入
+        
+        与 gui_main 的刷新逻辑一致：状态发生变化才再次处理，命令序列在两次状态处理之间执行完。
+        停在欢迎阶段、玩家行动阶段、命令序列等待卡牌选择或游戏结束（restart_game）时返回。
+        
+        Args:
+            max_steps: 最多执行的命令和状态处理次数，防止状态机异常时死循环
+            
+        Returns:
+            str: 当前的 gameloop_state
+        """
+        for _ in range(max_steps):
+            if self.is_executing_commands():
+                if self.is_command_sequence_paused():
+                    break
+                self.process_next_command()
+                continue
+            position = self._loop_position()
+            self._process_gameloop_state()
+            if self._loop_position() == position:
+                break
+        return self.game_state.get("gameloop_state", "welcome")
+
     def _process_player_turn(self):
         """处理玩家回合
         Returns:
@@ -709,89 +967,104 @@ class GameManager:
 
     def _process_opponent_turn(self):
         """处理对手回合"""
-        opponent_turn_state = self.game_state.get("opponent_turn_state", "start")
-        print(f"处理对手回合状态: {opponent_turn_state}")
-        if opponent_turn_state == "start":
+        return self._process_ai_turn("opponent")
+
+    def _process_ai_turn(self, player_type: str = "opponent"):
+        """处理 AI 控制的回合（对手，或自我对弈时的玩家）
+        
+        Args:
+            player_type: AI 控制的一方，"player" 或 "opponent"
+            
+        Returns:
+            bool: 如果回合结束返回True，否则返回False
+        """
+        turn_state_key = f"{player_type}_turn_state"
+        side_name = "对手" if player_type == "opponent" else "玩家"
+        ai_turn_state = self.game_state.get(turn_state_key, "start")
+        print(f"处理{side_name}回合状态: {ai_turn_state}")
+        if ai_turn_state == "start":
             # 回合开始阶段
-            self.add_game_message("🤖 **对手回合开始...**")
+            self.add_game_message(f"🤖 **{side_name}回合开始...**")
             self._ai_thinking("正在分析局势...")
-            self.game_state["opponent_turn_state"] = "draw_card"
+            self.game_state[turn_state_key] = "draw_card"
             return False
             
-        elif opponent_turn_state == "draw_card":
+        elif ai_turn_state == "draw_card":
             # 抽牌阶段
-            self.add_game_message("🎴 **对手抽取了一张卡牌**")
-            self.draw_card("opponent")
-            self.game_state["opponent_turn_state"] = "action"
+            self.add_game_message(f"🎴 **{side_name}抽取了一张卡牌**")
+            self.draw_card(player_type)
+            self.game_state[turn_state_key] = "action"
             return False
             
-        elif opponent_turn_state == "action":
+        elif ai_turn_state == "action":
             # AI行动阶段
             self._ai_thinking("正在计算最佳行动...")
             
             if self.ai_decide_playcard():
-                print("对手回合 action 打牌")
-                # 对手简单AI：随机打一张手牌
-                opponent_hand = self.game_state["hand_cards"]["opponent"]
-                if opponent_hand:
+                print(f"{side_name}回合 action 打牌")
+                # 简单AI：随机打一张手牌
+                ai_hand = self.game_state["hand_cards"][player_type]
+                if ai_hand:
                     # 筛选能量足够的卡牌
                     playable_cards = [
-                        card for card in opponent_hand 
-                        if card.get("cost", 0) <= self.game_state["opponent_stats"]["energy"]
+                        card for card in ai_hand 
+                        if card.get("cost", 0) <= self.game_state[f"{player_type}_stats"]["energy"]
                     ]
                     
                     if playable_cards:
-                        card_to_play = random.choice(playable_cards)
+                        card_to_play = self.rng.choice(playable_cards)
                         # 使用卡牌
-                        self.play_card(card_to_play["id"], "opponent")
+                        self.play_card(card_to_play["id"], player_type)
             else:
-                print("🤖 对手不想打牌")
+                print(f"🤖 {side_name}不想打牌")
                         
-            self.game_state["opponent_turn_state"] = "action_2"
+            self.game_state[turn_state_key] = "action_2"
             return False
 
-        elif opponent_turn_state == "action_2":
+        elif ai_turn_state == "action_2":
             # 使用完手牌后，AI决定是否攻击
             self._ai_thinking("思考是否发起攻击...", 0.5)
             if self.ai_decide_attack():
-                print("对手回合 action_2 发起攻击")
+                print(f"{side_name}回合 action_2 发起攻击")
+                enemy_type = "player" if player_type == "opponent" else "opponent"
                 # 获取AI场上的卡牌
-                ai_field_cards = self.game_state["field_cards"]["opponent"]
+                ai_field_cards = self.game_state["field_cards"][player_type]
                 if not ai_field_cards:
                     # 如果场上没有卡牌，则无法攻击
-                    self.add_game_message("🤖 对手场上没有可用于攻击的卡牌")
+                    self.add_game_message(f"🤖 {side_name}场上没有可用于攻击的卡牌")
                 else:
                     # 随机选择一张攻击卡牌
-                    attacker_card = random.choice(ai_field_cards)
+                    attacker_card = self.rng.choice(ai_field_cards)
                     
                     # 获取可能的攻击目标
-                    player_field_cards = self.game_state["field_cards"]["player"]
+                    enemy_field_cards = self.game_state["field_cards"][enemy_type]
                     possible_targets = ["opponent_hero"]  # 始终可以攻击英雄
-                    if player_field_cards:
-                        # 如果玩家场上有卡牌，将它们加入可能的目标
-                        possible_targets.extend([card["id"] for card in player_field_cards])
+                    if enemy_field_cards:
+                        # 如果敌方场上有卡牌，将它们加入可能的目标
+                        possible_targets.extend([card["id"] for card in enemy_field_cards])
                     
                     # 随机选择攻击目标
-                    target_id = random.choice(possible_targets)
+                    target_id = self.rng.choice(possible_targets)
                     
                     # 执行攻击
                     attack_success = self.opponent_perform_attack(
                         attacker_card_id=attacker_card["id"],
-                        target_card_id=target_id
+                        target_card_id=target_id,
+                        player_type=player_type
                     )
                     
                     if attack_success:
-                        self.add_game_message(f"🤖 对手使用 {attacker_card['name']} 发起攻击")
+                        self.add_game_message(f"🤖 {side_name}使用 {attacker_card['name']} 发起攻击")
             else:
-                print("🤖 对手不想发起攻击")
+                print(f"🤖 {side_name}不想发起攻击")
             
-            self.game_state["opponent_turn_state"] = "end_turn"
+            self.game_state[turn_state_key] = "end_turn"
             return False
             
-        elif opponent_turn_state == "end_turn":
+        elif ai_turn_state == "end_turn":
             # 回合结束阶段
             self._ai_thinking("回合结束...", 1.5)
-            self.add_game_message("🔄 **对手回合结束**")
+            self.add_game_message(f"🔄 **{side_name}回合结束**")
             self.game_state["gameloop_state"] = "next_turn"
             return True
             
@@ -1019,16 +1292,19 @@ class GameManager:
             # 发生错误时中断命令序列
             self.interrupt_command_sequence()
 
-    def opponent_perform_attack(self, attacker_card_id: str, target_card_id: str) -> bool:
+    def opponent_perform_attack(self, attacker_card_id: str, target_card_id: str,
+                                player_type: str = "opponent") -> bool:
         """AI对手执行攻击动作
         
         Args:
             attacker_card_id: AI攻击者卡牌ID
-            target_card_id: 目标卡牌ID (玩家场上的卡牌或英雄)
+            target_card_id: 目标卡牌ID (敌方场上的卡牌，或 "opponent_hero" 表示敌方英雄)
+            player_type: 发起攻击的一方，自我对弈时玩家也由 AI 攻击
             
         Returns:
             bool: 攻击是否成功执行
         """
+        enemy_type = "player" if player_type == "opponent" else "opponent"
         try:
             # 检查是否已经攻击过
             if self.game_state.get("has_attacked_this_turn", False):
@@ -1037,8 +1313,7 @@ class GameManager:
                 return False
 
             # 获取攻击者卡牌
-            attacker = next((card for card in self.game_state["field_cards"]["opponent"] 
-                            if str(card["id"]) == str(attacker_card_id)), None)
+            attacker = self.find_card("field", player_type, attacker_card_id)
             if not attacker:
                 self.add_game_message("❌ 找不到AI攻击者卡牌")
                 return False
@@ -1047,12 +1322,13 @@ class GameManager:
             if target_card_id == "opponent_hero":
                 # 直接攻击英雄
                 damage = attacker.get("attack", 0)
-                self.game_state["player_stats"]["hp"] = max(0, self.game_state["player_stats"]["hp"] - damage)
-                self.add_game_message(f"⚔️ {attacker['name']} 对玩家英雄造成了 {damage} 点伤害")
+                enemy_stats = self.game_state[f"{enemy_type}_stats"]
+                enemy_stats["hp"] = max(0, enemy_stats["hp"] - damage)
+                self.add_game_message(
+                    f"⚔️ {attacker['name']} 对{'玩家' if enemy_type == 'player' else '对手'}英雄造成了 {damage} 点伤害")
             else:
                 # 攻击场上的卡牌
-                target = next((card for card in self.game_state["field_cards"]["player"] 
-                             if str(card["id"]) == str(target_card_id)), None)
+                target = self.find_card("field", enemy_type, target_card_id)
                              
                 if not target:
                     self.add_game_message("❌ 找不到目标卡牌")
@@ -1074,13 +1350,11 @@ class GameManager:
                 
                 # 检查卡牌是否死亡
                 if target["health"] <= 0:
-                    self.game_state["field_cards"]["player"].remove(target)
-                    self.deck_state["player"]["discard_pile"].append(target)
+                    self.move_card(target, "field", "discard", enemy_type)
                     self.add_game_message(f"💀 {target['name']} 被击败了")
                     
                 if attacker["health"] <= 0:
-                    self.game_state["field_cards"]["opponent"].remove(attacker)
-                    self.deck_state["opponent"]["discard_pile"].append(attacker)
+                    self.move_card(attacker, "field", "discard", player_type)
                     self.add_game_message(f"💀 {attacker['name']} 被击败了")
             
             # 设置攻击标记
@@ -0,0 +1,213 @@
+"""对局状态快照：撤销/重做、AI 前瞻分支和紧凑存档
+
+快照是不可变的结构（tuple 和只读字典），与上一个快照共享没有变化的部分：
+- 每张卡牌实例缓存自己的不可变记录 (实例ID, 卡牌定义, attack, health, armor, status, effects)，
+  修改属性时缓存失效，所以只有变化过的卡牌会生成新记录，卡牌定义始终共享引用
+- 区域（手牌、场上、卡组、弃牌堆、抽牌记录）中的卡牌和顺序都没有变化时，直接复用上一个快照的 tuple
+- 其余状态（生命、能量、回合信息、打出记录等）冻结时与上一个快照逐项比较，没有变化的字典和列表直接复用
+
+恢复时按记录重建卡牌实例，卡牌定义不复制。存档写入快照的增量编码：卡牌只保存实例ID
+和与卡牌定义不同的属性，卡牌定义由 cards.json 提供，整体用 zlib 压缩。
+"""
+import json
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from card_instance import MUTABLE_FIELDS, CardInstance
+
+# 存档格式版本，旧的 JSON 存档没有版本号
+SAVE_FORMAT_VERSION = 2
+
+# 存放在 game_state 之外、由快照单独保存的卡牌区域
+ZONE_STATE_KEYS = ("hand_cards", "field_cards")
+OWNERS = ("player", "opponent")
+
+
+class CardRef(NamedTuple):
+    """game_state 中对卡牌实例的引用（例如 selected_attacker），恢复时指向重建后的同一实例"""
+    id: str
+
+
+@dataclass(frozen=True)
+class GameSnapshot:
+    state: Mapping[str, Any]                             # 冻结的 game_state（不含手牌和场上卡牌）
+    zones: Mapping[Tuple[str, str], Tuple[tuple, ...]]   # (区域, 玩家) -> 卡牌记录，区域包含 draw_history
+    selected_decks: Any = None
+
+    @property
+    def turn(self) -> int:
+        return self.state.get("turn_info", {}).get("current_turn", 0)
+
+
+def freeze(value: Any, previous: Any = None) -> Any:
+    """把状态转换为不可变结构：字典 -> 只读字典，列表 -> tuple，卡牌实例 -> CardRef
+
+    previous 是上一个快照中对应的冻结值，内容没有变化的部分直接复用，与上一个快照共享。
+    """
+    if isinstance(value, CardInstance):
+        return previous if isinstance(previous, CardRef) and previous.id == value.id else CardRef(value.id)
+    if isinstance(value, (dict, MappingProxyType)):
+        if not isinstance(previous, MappingProxyType):
+            previous = MappingProxyType({})
+        items = {key: freeze(item, previous.get(key)) for key, item in value.items()}
+        if len(items) == len(previous) and all(previous.get(key) is item for key, item in items.items()):
+            return previous
+        return MappingProxyType(items)
+    if isinstance(value, (list, tuple)):
+        if not isinstance(previous, tuple) or isinstance(previous, CardRef) or len(previous) > len(value):
+            previous = ()
+        if len(previous) == len(value) and all(a is b for a, b in zip(value, previous)):
+            return previous  # 元素都是没有变化的标量（卡组的卡牌ID列表等）
+        # 列表大多只在末尾追加（日志、打出记录），按位置比较
+        items = tuple(freeze(item, previous[i] if i < len(previous) else None) for i, item in enumerate(value))
+        if len(items) == len(previous) and all(a is b for a, b in zip(items, previous)):
+            return previous
+        return items
+    return value
+
+
+def thaw(value: Any, cards: Mapping[str, CardInstance]) -> Any:
+    """freeze 的逆过程，CardRef 解析为 cards 中的卡牌实例"""
+    if isinstance(value, CardRef):
+        return cards.get(value.id)
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item, cards) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item, cards) for item in value]
+    return value
+
+
+def freeze_zone(cards: List[CardInstance], previous: Optional[Tuple[tuple, ...]]) -> Tuple[tuple, ...]:
+    """区域的卡牌记录，卡牌和顺序都没有变化时返回上一个快照的 tuple"""
+    if previous is not None and len(previous) == len(cards) and \
+            all(card._record is record for card, record in zip(cards, previous)):
+        return previous
+    return tuple(card.record() for card in cards)
+
+
+class UndoHistory:
+    """撤销/重做栈，保存 (说明, 快照)；快照共享未变化的数据，每步只占用变化部分的内存"""
+
+    def __init__(self, max_size: int = 100):
+        self.undo_stack = deque(maxlen=max_size)
+        self.redo_stack: List[Tuple[str, GameSnapshot]] = []
+
+    def record(self, label: str, snapshot: GameSnapshot):
+        """记录操作前的状态，新操作会清空重做栈"""
+        self.undo_stack.append((label, snapshot))
+        self.redo_stack.clear()
+
+    def undo(self, current: GameSnapshot) -> Optional[Tuple[str, GameSnapshot]]:
+        """返回要恢复的 (说明, 快照)，current 进入重做栈"""
+        if not self.undo_stack:
+            return None
+        label, snapshot = self.undo_stack.pop()
+        self.redo_stack.append((label, current))
+        return label, snapshot
+
+    def redo(self, current: GameSnapshot) -> Optional[Tuple[str, GameSnapshot]]:
+        if not self.redo_stack:
+            return None
+        label, snapshot = self.redo_stack.pop()
+        self.undo_stack.append((label, current))
+        return label, snapshot
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+
+def _zone_key(position: str, owner: str) -> str:
+    return f"{position}/{owner}"
+
+
+def _encode_card(record: tuple, definitions: Mapping[str, Mapping[str, Any]]) -> Any:
+    """卡牌记录的增量编码：实例ID，或 [实例ID, 与卡牌定义不同的属性]
+
+    不在卡牌目录中的卡牌（旧存档中已删除的卡牌）保存完整字段。
+    """
+    card = CardInstance.from_record(record)
+    definition = record[1]
+    if definitions.get(definition["id"]) is not definition or \
+            card.id.rsplit("#", 1)[0] != definition["id"]:
+        return card.to_dict()
+    initial = CardInstance.create(definition, card.id)
+    changes = {field_name: list(value) if field_name == "effects" else value
+               for field_name, value in zip(MUTABLE_FIELDS, record[2:])
+               if value != getattr(initial, field_name)}
+    return [card.id, changes] if changes else card.id
+
+
+def _decode_card(data: Any, definitions: Mapping[str, Mapping[str, Any]]) -> tuple:
+    if isinstance(data, dict):
+        return CardInstance.from_dict(data, definitions).record()
+    instance_id, changes = (data, {}) if isinstance(data, str) else data
+    card = CardInstance.create(definitions[instance_id.rsplit("#", 1)[0]], instance_id)
+    for field_name, value in changes.items():
+        card[field_name] = tuple(value) if field_name == "effects" else value
+    return card.record()
+
+
+def _plain(value: Any) -> Any:
+    """冻结状态 -> 可 JSON 序列化的数据，CardRef 写为 {"$card": 实例ID}"""
+    if isinstance(value, CardRef):
+        return {"$card": value.id}
+    if isinstance(value, MappingProxyType):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _unplain(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {"$card"}:
+            return CardRef(value["$card"])
+        return MappingProxyType({key: _unplain(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_unplain(item) for item in value)
+    return value
+
+
+def encode_save(snapshot: GameSnapshot, info: Dict[str, Any],
+                definitions: Mapping[str, Mapping[str, Any]]) -> bytes:
+    """快照 -> 压缩的存档数据"""
+    data = {
+        "version": SAVE_FORMAT_VERSION,
+        "info": info,
+        "state": _plain(snapshot.state),
+        "zones": {_zone_key(*key): [_encode_card(record, definitions) for record in records]
+                  for key, records in snapshot.zones.items()},
+        "selected_decks": _plain(snapshot.selected_decks)
+    }
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(text.encode("utf-8"), 9)
+
+
+def decode_save(payload: bytes, definitions: Mapping[str, Mapping[str, Any]]) -> Tuple[GameSnapshot, Dict[str, Any]]:
+    """压缩的存档数据 -> (快照, 存档信息)"""
+    data = json.loads(zlib.decompress(payload).decode("utf-8"))
+    if data.get("version") != SAVE_FORMAT_VERSION:
+        raise ValueError(f"不支持的存档版本: {data.get('version')}")
+    # 同一实例在多个区域（例如手牌和抽牌记录）中共用一条记录
+    records: Dict[str, tuple] = {}
+    zones = {}
+    for key, cards in data["zones"].items():
+        position, owner = key.split("/", 1)
+        zone = []
+        for card in cards:
+            record = _decode_card(card, definitions)
+            zone.append(records.setdefault(record[0], record))
+        zones[(position, owner)] = tuple(zone)
+    snapshot = GameSnapshot(state=_unplain(data["state"]), zones=MappingProxyType(zones),
+                            selected_decks=_unplain(data.get("selected_decks")))
+    return snapshot, data.get("info", {})
@@ -3,6 +3,7 @@ from turtle import up
 import streamlit as st
 from llm_interaction import LLMInteraction
 from game_manager import GameManager
+from card_catalog import card_catalog, load_decks
 from player_manager import PlayerManager
 from debug_utils import debug_utils
 import os
@@ -12,9 +13,21 @@ from datetime import datetime
 from typing import List, Dict
 import asyncio
 
+def add_game_message_to_chat(message):
+    """GameManager 的消息回调：把游戏消息写入聊天记录"""
+    if "messages" in st.session_state:
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": message
+        })
+
+def create_game_manager():
+    """创建界面使用的 GameManager：保留阶段切换和命令动画的等待，游戏消息显示在聊天区"""
+    return GameManager(time_scale=1.0, message_sink=add_game_message_to_chat)
+
 # 初始化全局session state
 if 'initialized' not in st.session_state:
-    st.session_state.game_manager = GameManager()
+    st.session_state.game_manager = create_game_manager()
     st.session_state.llm_interaction = LLMInteraction()
     st.session_state.player_manager = PlayerManager()
     # 设置命令处理器
@@ -51,6 +64,24 @@ def update_ui_state():
     # st.rerun()
 
 
+def run_undoable(label, action):
+    """执行玩家操作，操作成功时记录操作前的撤销点"""
+    game_manager = st.session_state.game_manager
+    snapshot = game_manager.snapshot()
+    result = action()
+    if result:
+        game_manager.checkpoint(label, snapshot)
+    return result
+
+def sync_after_restore():
+    """撤销/重做后同步界面记录的状态，恢复的状态不再触发一次阶段处理"""
+    game_state = st.session_state.game_manager.game_state
+    st.session_state["last_gameloop_state"] = game_state.get("gameloop_state", "welcome")
+    st.session_state["last_player_turn_state"] = game_state.get("player_turn_state", "end_turn")
+    st.session_state["last_opponent_turn_state"] = game_state.get("opponent_turn_state", "end_turn")
+    st.session_state.card_selection["is_selecting"] = False
+    st.session_state.card_selection_active = False
+
 def render_sidebar_controls(game_state, gameloop_state):
     """渲染侧边栏控制界面"""
     with st.sidebar:
@@ -67,6 +98,24 @@ def render_sidebar_controls(game_state, gameloop_state):
                     st.success(message)
                 else:
                     st.error(message)
+
+            # 撤销/重做：命令序列执行中和对手回合不可用
+            game_manager = st.session_state.game_manager
+            history = game_manager.history
+            busy = game_manager.is_executing_commands() or gameloop_state != "player_turn"
+            undo_col, redo_col = st.columns(2)
+            with undo_col:
+                if st.button(f"↩️ 撤销 ({len(history.undo_stack)})", use_container_width=True,
+                             disabled=busy or not history.can_undo()):
+                    game_manager.undo()
+                    sync_after_restore()
+                    st.rerun()
+            with redo_col:
+                if st.button(f"↪️ 重做 ({len(history.redo_stack)})", use_container_width=True,
+                             disabled=busy or not history.can_redo()):
+                    game_manager.redo()
+                    sync_after_restore()
+                    st.rerun()
         
         # 载入游戏功能仅在welcome状态可用
         if gameloop_state == "welcome":
@@ -95,16 +144,9 @@ def render_sidebar_controls(game_state, gameloop_state):
 
 def render_deck_selection():
     """渲染卡组选择界面"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    decks_json_path = os.path.join(current_dir, 'decks.json')
-    cards_json_path = os.path.join(current_dir, 'cards.json')
-
-    with open(decks_json_path, 'r', encoding='utf-8') as f:
-        decks_data = json.load(f)
-    with open(cards_json_path, 'r', encoding='utf-8') as f:
-        cards_data = json.load(f)
-    
-    cards_dict = {card['id']: card for card in cards_data}
+    # 卡组和卡牌目录在进程内缓存，界面刷新时不再重新读取和建立索引
+    decks_data = load_decks()
+    cards_dict = card_catalog().by_id
     col1, col2 = st.columns(2)
     
     # 渲染玩家卡组选择
@@ -328,11 +370,14 @@ def process_command_input(user_input):
                 })
                 
                 # 使用卡牌（会自动处理命令）
-                result = st.session_state.game_manager.play_card(selected_card_id)
+                card = st.session_state.game_manager.find_card("hand", "player", selected_card_id)
+                card_name = card.get("name", selected_card_id) if card else selected_card_id
+                result = run_undoable(f"使用 {card_name}",
+                                      lambda: st.session_state.game_manager.play_card(selected_card_id))
     
         # 如果是攻击的操作
         elif "攻击" in user_input:
-            result = st.session_state.game_manager.player_perform_attack()
+            result = run_undoable("攻击", st.session_state.game_manager.player_perform_attack)
             if not result:
                 # 如果return False, BUGFIX: 无法继续执行(无法主动刷新)
                 # 使用指令命令序列输出错误, 触发更新
@@ -340,7 +385,8 @@ def process_command_input(user_input):
  
         # 如果是结束回合的操作，直接结束回合
         elif "结束" in user_input and "回合" in user_input:
-            st.session_state.game_manager.end_turn()
+            run_undoable(f"结束第 {game_state['turn_info']['current_turn']} 回合",
+                         st.session_state.game_manager.end_turn)
             # st.session_state.game_manager.game_state["player_turn_state"] = "end_turn"
 
         # 不理解用户输入
@@ -776,7 +822,7 @@ if __name__ == '__main__':
 
     if "game_manager" not in st.session_state:
        # 初始化游戏状态
-       st.session_state.game_manager =  GameManager()
+       st.session_state.game_manager = create_game_manager()
         # 初始化消息列表
        st.session_state.messages = []
     # 初始化卡牌选择状态
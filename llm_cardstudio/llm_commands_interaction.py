@@ -3,8 +3,8 @@ from typing import Dict, List, Any, Tuple, Optional
 import time
 import os
 from debug_utils import debug_utils
+from card_catalog import CommandCatalog, command_catalog
 import asyncio
-from langchain.tools import StructuredTool
 
 class CommandProcessor:
     def __init__(self, game_manager):
@@ -47,45 +47,51 @@ class CommandProcessor:
         }
         
         # 加载卡牌命令配置
-        self.commands_config = self._load_commands_config()
-        
-        # 初始化游戏工具
-        self.game_tools = [
-            StructuredTool.from_function(
-                func=self.start_game,
-                name="start_game",
-                description="开始新的游戏"
-            ),
-            StructuredTool.from_function(
-                func=self.end_turn,
-                name="end_turn",
-                description="结束当前回合"
-            ),
-            StructuredTool.from_function(
-                func=self.play_card,
-                name="play_card",
-                description="打出一张手牌"
-            ),
-            StructuredTool.from_function(
-                func=self.attack,
-                name="attack",
-                description="使用卡牌进行攻击"
-            )
-        ]
-        # self.game_tools = [self.start_game, self.end_turn, self.play_card, self.attack]
+        self.commands_catalog = self._load_commands_config()
+        self.commands_config = self.commands_catalog.entries
+        self._game_tools = None
 
-        # 加载卡牌命令配置
-        self.commands_config = self._load_commands_config()
+    @property
+    def game_tools(self):
+        """LLM 可调用的游戏工具
+        
+        创建 StructuredTool 需要为每个函数生成 pydantic 模型（每个命令处理器约 20ms），
+        只在 LLM 交互第一次使用时创建，无界面模拟对局时不再产生这部分开销。
+        """
+        if self._game_tools is None:
+            from langchain.tools import StructuredTool
+            self._game_tools = [
+                StructuredTool.from_function(
+                    func=self.start_game,
+                    name="start_game",
+                    description="开始新的游戏"
+                ),
+                StructuredTool.from_function(
+                    func=self.end_turn,
+                    name="end_turn",
+                    description="结束当前回合"
+                ),
+                StructuredTool.from_function(
+                    func=self.play_card,
+                    name="play_card",
+                    description="打出一张手牌"
+                ),
+                StructuredTool.from_function(
+                    func=self.attack,
+                    name="attack",
+                    description="使用卡牌进行攻击"
+                )
+            ]
+            # self._game_tools = [self.start_game, self.end_turn, self.play_card, self.attack]
+        return self._game_tools
 
-    def _load_commands_config(self) -> dict:
-        """加载卡牌命令配置"""
+    def _load_commands_config(self) -> CommandCatalog:
+        """加载卡牌命令配置（进程内共享，按卡牌ID预先建立索引并解析默认 all 配置）"""
         try:
-            config_path = os.path.join(os.path.dirname(__file__), 'cards_commands.json')
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return command_catalog()
         except Exception as e:
             self.game_manager.add_game_message(f"❌ 加载卡牌命令配置失败: {str(e)}")
-            return {}
+            return CommandCatalog(entries=[], by_card_id={})
 
     def _apply_state_updates(self, updates: Dict[str, Any]):
         """应用状态更新"""
@@ -120,12 +126,12 @@ class CommandProcessor:
         pay_cost = params.get('pay_cost', source == 'hand' and target_position == 'field')
         
         try:
-            # 获取源位置的卡牌列表
-            source_list = self._get_card_list(source, player_type)
-            target_list = self._get_card_list(target_position, player_type)
+            # 校验位置
+            self._get_card_list(source, player_type)
+            self._get_card_list(target_position, player_type)
             
             # 查找卡牌
-            card = next((c for c in source_list if c['id'] == card_id), None)
+            card = self.game_manager.find_card(source, player_type, card_id)
             if not card:
                 print(f"❌ 找不到卡牌 {player_type}:{card_id}:{source}:{target_position}")
                 return False
@@ -146,8 +152,7 @@ class CommandProcessor:
                 print(f"扣除 {energy_cost} 点能量")
             
             # 移动卡牌
-            source_list.remove(card)
-            target_list.append(card)
+            self.game_manager.move_card(card, source, target_position, player_type)
             
             print("移动卡牌指令处理成功")
             return True
@@ -225,16 +230,15 @@ class CommandProcessor:
         
         try:
             # 获取卡牌模板
-            card_template = next((c for c in self.game_manager.available_cards if c['id'] == card_id), None)
+            card_template = self.game_manager.cards_by_id.get(str(card_id))
             if not card_template:
                 return False
                 
             # 创建新卡牌
-            new_card = card_template.copy()
+            new_card = self.game_manager.new_card_instance(card_template)
             
             # 添加到指定位置
-            target_list = self._get_card_list(position, owner)
-            target_list.append(new_card)
+            self.game_manager.add_card(position, owner, new_card)
             return True
             
         except Exception as e:
@@ -294,16 +298,14 @@ class CommandProcessor:
         draw_count = params.get('draw_count', 1)
         
         try:
-            # 获取玩家的牌库和手牌
+            # 获取玩家的牌库
             deck = self.game_manager.deck_state[target_id]['deck']
-            hand = self.game_manager.game_state['hand_cards'][target_id]
             
             # 执行抽牌
             for _ in range(draw_count):
                 if not deck:
                     return False
-                card = deck.pop()
-                hand.append(card)
+                self.game_manager.move_card(deck[-1], 'deck', 'hand', target_id)
             return True
             
         except Exception as e:
@@ -318,18 +320,16 @@ class CommandProcessor:
         
         card_id = params.get('card_id')
         position = params.get('position')
+        player_type = params.get('player_type', 'player')
         
         try:
-            # 获取卡牌列表
-            card_list = self._get_card_list(position)
-            
             # 查找卡牌
-            card = next((c for c in card_list if c['id'] == card_id), None)
+            card = self.game_manager.find_card(position, player_type, card_id)
             if not card:
                 return False
                 
             # 摧毁卡牌
-            card_list.remove(card)
+            self.game_manager.remove_card(position, player_type, card)
             return True
             
         except Exception as e:
@@ -483,16 +483,7 @@ class CommandProcessor:
     # def _get_card_list(self, position: str, owner: str = 'player') -> List[Dict]:
     def _get_card_list(self, position: str, owner: str) -> List[Dict]:
         """获取指定位置的卡牌列表"""
-        if position == 'hand':
-            return self.game_manager.game_state['hand_cards'][owner]
-        elif position == 'field':
-            return self.game_manager.game_state['field_cards'][owner]
-        elif position == 'deck':
-            return self.game_manager.deck_state[owner]['deck']
-        elif position == 'discard':
-            return self.game_manager.deck_state[owner]['discard_pile']
-        else:
-            raise ValueError(f"无效的位置: {position}")
+        return self.game_manager.get_card_list(position, owner)
 
     def _get_target(self, target_id: str) -> Optional[Dict]:
         """获取目标对象"""
@@ -501,8 +492,7 @@ class CommandProcessor:
         
         # 在场上查找卡牌
         for owner in ['player', 'opponent']:
-            field = self.game_manager.game_state['field_cards'][owner]
-            card = next((c for c in field if c['id'] == target_id), None)
+            card = self.game_manager.find_card('field', owner, target_id)
             if card:
                 return card
                 
@@ -525,7 +515,7 @@ class CommandProcessor:
                 return False
                 
             # 查找指定的卡牌
-            attacker = next((c for c in field_cards if c['id'] == card_id), None)
+            attacker = self.game_manager.find_card('field', player_type, card_id)
             if not attacker:
                 self.game_manager.add_game_message(f"❌ 找不到指定的攻击者卡牌")
                 return False
@@ -563,8 +553,7 @@ class CommandProcessor:
                 return True
             else:
                 # 攻击场上的卡牌
-                field_cards = self.game_manager.game_state['field_cards'][target_type]
-                target = next((c for c in field_cards if c['id'] == card_id), None)
+                target = self.game_manager.find_card('field', target_type, card_id)
                 
                 if not target:
                     self.game_manager.add_game_message(f"❌ 找不到指定的目标卡牌")
@@ -659,13 +648,9 @@ class CommandProcessor:
     def _move_to_graveyard(self, card: Dict[str, Any], owner: str):
         """将卡牌移动到墓地"""
         try:
-            # 从场上移除卡牌
-            field_cards = self.game_manager.game_state['field_cards'][owner]
-            if card in field_cards:
-                field_cards.remove(card)
-            
-            # 添加到弃牌堆
-            self.game_manager.deck_state[owner]['discard_pile'].append(card)
+            # 从场上移除卡牌，添加到弃牌堆（不在场上时直接放入弃牌堆）
+            if not self.game_manager.move_card(card, 'field', 'discard', owner):
+                self.game_manager.add_card('discard', owner, card)
             self.game_manager.add_game_message(f"💀 {card.get('name', '未知卡牌')} 被击败，进入了墓地")
             
         except Exception as e:
@@ -678,8 +663,7 @@ class CommandProcessor:
         damage_type = params.get('damage_type', 'attack')
         
         # 获取攻击者卡牌
-        attacker = next((card for card in self.game_manager.game_state['field_cards']['player'] 
-                        if card['id'] == attacker_id), None)
+        attacker = self.game_manager.find_card('field', 'player', attacker_id)
         if not attacker:
             return False
             
@@ -687,8 +671,7 @@ class CommandProcessor:
         
         if defender_id:
             # 攻击场上的卡牌
-            defender = next((card for card in self.game_manager.game_state['field_cards']['opponent'] 
-                           if card['id'] == defender_id), None)
+            defender = self.game_manager.find_card('field', 'opponent', defender_id)
             if defender:
                 defender['health'] = max(0, defender['health'] - damage)
                 self.game_manager.add_game_message(f"🗡️ {attacker['name']} 对 {defender['name']} 造成了 {damage} 点伤害")
@@ -706,13 +689,11 @@ class CommandProcessor:
             return False
             
         # 检查对手场上的卡牌
-        opponent_field = self.game_manager.game_state['field_cards']['opponent']
-        card = next((card for card in opponent_field if card['id'] == card_id), None)
+        card = self.game_manager.find_card('field', 'opponent', card_id)
         
         if card and card['health'] <= 0:
             # 移动到墓地
-            opponent_field.remove(card)
-            self.game_manager.deck_state['opponent']['discard_pile'].append(card)
+            self.game_manager.move_card(card, 'field', 'discard', 'opponent')
             self.game_manager.add_game_message(f"💀 {card['name']} 被摧毁了")
             
         return True
@@ -730,18 +711,9 @@ class CommandProcessor:
             Dict[str, Any]: 命令序列
         """
         try:
-            # 查找卡牌命令配置 (优先查找特定 card_id)
-            card_commands = next(
-                (cmd for cmd in self.commands_config if str(cmd.get("card_id", "")) == str(card_id)),
-                None
-            )
-
-            #如果找不到特定卡牌的命令配置，则查找 card_id 为 "all" 的默认配置
-            if not card_commands:
-                card_commands = next(
-                    (cmd for cmd in self.commands_config if str(cmd.get("card_id", "")) == "all"),
-                    None
-                )
+            # 查找卡牌命令配置 (优先查找特定 card_id，找不到时使用 card_id 为 "all" 的默认配置)
+            # card_id 是卡牌实例ID，命令配置按卡牌定义ID查找
+            card_commands = self.commands_catalog.for_card(card.get('card_id', card_id) if card else card_id)
             
             if not card_commands:
                 print(f"❌ 找不到卡牌命令配置: {card_id} 或 默认 all 配置")
@@ -841,9 +813,9 @@ class CommandProcessor:
                 print(error_message)
                 return False
                 
-            # 处理持续时间
-            if duration > 0:
-                await asyncio.sleep(duration)
+            # 处理持续时间（按 time_scale 缩放，无界面运行时不等待）
+            if duration > 0 and self.game_manager.time_scale > 0:
+                await asyncio.sleep(duration * self.game_manager.time_scale)
             
             # 添加成功消息
             success_message = f"✅ 命令执行成功: {action}"
@@ -891,8 +863,7 @@ class CommandProcessor:
                 return False
                 
             # 处理持续时间
-            if duration > 0:
-                time.sleep(duration)
+            self.game_manager.wait(duration)
             
             # 添加成功消息
             success_message = f"✅ 命令执行成功: {action}"
@@ -1,13 +1,14 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain  # 修复导入路径
-import google.generativeai as genai
+from langchain_core.prompts import ChatPromptTemplate
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 import json
-from langchain.tools import tool
-from langchain_anthropic import ChatAnthropic
+
+# 共用的模型调用基础设施位于仓库根目录的 llm_common 包
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+# 模型实例通过各工具共用的模型商注册表创建（按 model_class 延迟导入集成，复用实例和连接池）
+from llm_common.model_registry import ModelRegistry, ModelVendorConfig
 
 # 加载环境变量
 load_dotenv()
@@ -77,60 +78,52 @@ CONTEXT_PROMPT = """
 # 设置Google API密钥
 os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 
+# 游戏助手可选的模型：use_model -> 模型商配置（使用其中第一个模型）
+ASSISTANT_MODELS = {
+    "google": ModelVendorConfig(
+        name="GoogleAPI",
+        models=["gemini-2.0-flash-exp"],  # model = os.getenv("GOOGLE_MODEL_NAME", "gemini-pro")
+        baseline_models=["gemini-2.0-flash-exp"],
+        api_key_env="GOOGLE_API_KEY",
+        base_url=None,
+        model_class="ChatGoogleGenerativeAI"
+    ),
+    # small.AI (ChatAnthropic tool calling 错误)，通过 OpenAI 兼容接口调用
+    "claude": ModelVendorConfig(
+        name="SmallAI",
+        models=["claude-3-5-sonnet-20241022"],
+        baseline_models=["claude-3-5-sonnet-20241022"],
+        api_key_env="OPENAI_API_KEY",
+        base_url=os.getenv("OPENAI_API_BASE"),
+        model_class="ChatOpenAI"
+    ),
+    "deepseek": ModelVendorConfig(
+        name="DeepSeek",
+        models=["deepseek-chat"],
+        baseline_models=["deepseek-chat"],
+        api_key_env="DEEPSEEK_API_KEY",
+        base_url=os.getenv("DEEPSEEK_API_BASE"),
+        model_class="ChatOpenAI"
+    ),
+    "openai": ModelVendorConfig(
+        name="OpenAI",
+        models=["gpt-3.5-turbo-1106"],  # model=os.getenv("OPENAI_MODEL_NAME", "gpt-4")
+        baseline_models=["gpt-3.5-turbo-1106"],
+        api_key_env="OPENAI_API_KEY",
+        base_url=os.getenv("OPENAI_API_BASE"),
+        model_class="ChatOpenAI"
+    )
+}
+
+assistant_registry = ModelRegistry(ASSISTANT_MODELS)
+
 class LLMInteraction:
     def __init__(self):
-        use_model= "deepseek"
-        if use_model == "google":
-            # 初始化Gemini模型
-            model = "gemini-2.0-flash-exp"
-            # model = os.getenv("GOOGLE_MODEL_NAME", "gemini-pro")
-            # base_url = os.getenv("OPENAI_API_BASE")
-            self.llm = ChatGoogleGenerativeAI(
-                api_key=os.getenv("GOOGLE_API_KEY"),
-                model=model,    # 从环境变量读取模型名称，默认为gemini-pro
-                temperature=0,
-                streaming=True
-            )
-            print(f"使用Gemini模型 {model}")
-        elif use_model == "claude":
-            model = "claude-3-5-sonnet-20241022"
-            base_url = os.getenv("OPENAI_API_BASE")
-            # small.AI (tool calling 错误)
-            # self.llm = ChatAnthropic(
-            self.llm = ChatOpenAI(
-                model=model,
-                api_key=os.getenv("OPENAI_API_KEY"),
-                base_url=base_url,
-                temperature=0,
-                streaming=True
-            )
-            print(f"使用ChatAnthropic模型 {model}，API BASE URL={base_url}")
-        elif use_model == "deepseek":
-            # 初始化OpenAI模型
-            model = "deepseek-chat"
-            # model=os.getenv("OPENAI_MODEL_NAME", "gpt-4")    # 从环境变量读取模型名称，默认为gpt-4
-            base_url = os.getenv("DEEPSEEK_API_BASE")
-            self.llm = ChatOpenAI(
-                api_key=os.getenv("DEEPSEEK_API_KEY"),
-                model=model,
-                base_url=base_url,
-                temperature=0,
-                streaming=True
-            )
-            print(f"使用DeepSeek官方模型 {model}，API BASE URL={base_url}")
-        else:
-            # 初始化OpenAI模型
-            model = "gpt-3.5-turbo-1106"
-            # model=os.getenv("OPENAI_MODEL_NAME", "gpt-4")    # 从环境变量读取模型名称，默认为gpt-4
-            base_url = os.getenv("OPENAI_API_BASE")
-            self.llm = ChatOpenAI(
-                api_key=os.getenv("OPENAI_API_KEY"),
-                model=model,
-                base_url=base_url,
-                temperature=0,
-                streaming=True
-            )
-            print(f"使用OpenAI模型 {model}，API BASE URL={base_url}")
+        use_model= "deepseek"  # 可选: google, claude, deepseek, openai
+        config = ASSISTANT_MODELS[use_model]
+        model = config.models[0]
+        self.llm = assistant_registry.get_chat(use_model, model, temperature=0, streaming=True)
+        print(f"使用{config.name}模型 {model}，API BASE URL={config.base_url}")
 
 
         # 初始化对话历史
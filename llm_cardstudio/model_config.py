@@ -1,25 +1,16 @@
-from dataclasses import dataclass
-from typing import List, Optional
+from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_ollama import ChatOllama
-from langchain_google_genai import ChatGoogleGenerativeAI
 
+# 共用的模型调用基础设施位于仓库根目录的 llm_common 包
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+# 模型商配置、实例创建和健康检查由各工具共用的模型商注册表提供
+from llm_common.model_registry import ModelRegistry, ModelVendorConfig
 
 # 确保加载环境变量
 load_dotenv()
 
-@dataclass
-class ModelVendorConfig:
-    name: str                    # 模型商名称
-    models: List[str]           # 该商家提供的模型列表
-    baseline_models: List[str]  # 该商家的基线模型列表
-    api_key_env: str           # 环境变量中API KEY的名称
-    base_url: str              # API基础URL
-    model_class: Optional[str] = None  # 模型基类名称，可选
-
 # 卡牌测试使用的模型配置
 CARD_TEST_MODELS = {
     "SMALLAI": ModelVendorConfig(
@@ -56,6 +47,8 @@ CARD_TEST_MODELS = {
     )
 }
 
+model_registry = ModelRegistry(CARD_TEST_MODELS)
+
 # 默认的模型配置
 DEFAULT_VENDOR = "SMALLAI"
 DEFAULT_MODEL = "gemini-2.0-flash-exp"
@@ -93,79 +86,32 @@ def get_available_models(use_default: bool = True):
     return available_vendors
 
 def get_default_model():
-    """获取默认的模型配置"""
+    """获取默认的模型配置
+
+    默认供应商的API密钥未配置时，探测其他可用供应商，使用响应最快的供应商的基线模型。
+    """
     if DEFAULT_VENDOR not in CARD_TEST_MODELS:
         raise ValueError(f"默认供应商 {DEFAULT_VENDOR} 不存在")
     
     config = CARD_TEST_MODELS[DEFAULT_VENDOR]
-    api_key = os.getenv(config.api_key_env)
-    if not api_key:
-        raise ValueError(f"默认供应商 {DEFAULT_VENDOR} 的API密钥未配置")
-    
     if DEFAULT_MODEL not in config.models:
         raise ValueError(f"默认模型 {DEFAULT_MODEL} 不在供应商 {DEFAULT_VENDOR} 的模型列表中")
+
+    if not config.configured:
+        fastest = model_registry.fastest_baseline()
+        if fastest is None:
+            raise ValueError(f"默认供应商 {DEFAULT_VENDOR} 的API密钥未配置，且没有其他可用的供应商")
+        print(f"默认供应商 {DEFAULT_VENDOR} 的API密钥未配置，使用响应最快的供应商: {fastest[0]}/{fastest[1]}")
+        return fastest
     
     return DEFAULT_VENDOR, DEFAULT_MODEL
 
-def create_model_instance(vendor_name: str, model_name: str):
-    """创建模型实例"""
-    config = CARD_TEST_MODELS.get(vendor_name)
-    if not config:
-        raise ValueError(f"未知的供应商: {vendor_name}")
-
-    # 检查API密钥（如果需要的话）
-    api_key = None
-    if config.api_key_env:
-        api_key = os.getenv(config.api_key_env)
-        if not api_key:
-            raise ValueError(f"供应商 {vendor_name} 的API密钥未配置")
+# 卡牌测试中不使用流式输出的模型类型，其余（包括 ChatGoogleGenerativeAI）流式输出；
+# 与 vendor_adapters 中的默认值不同，保持卡牌测试原有的行为
+NON_STREAMING_MODEL_CLASSES = ("ChatAnthropic", "Ollama", "LLMStudio")
 
+def create_model_instance(vendor_name: str, model_name: str):
+    """创建模型实例（相同配置复用同一实例和连接池）"""
     print(f"正在创建模型实例: {vendor_name}/{model_name}")
-    print(f"使用API基础URL: {config.base_url}")
-    
-    if api_key:
-        print(f"使用API密钥: {api_key}")
-    else:
-        print("该模型不需要API密钥")
-
-    temperature = 0.0
-
-    # 根据模型类型创建实例
-    if config.model_class == "ChatAnthropic":
-        return ChatAnthropic(
-            model=model_name,
-            anthropic_api_key=api_key,
-            temperature=temperature
-            # streaming=True
-        )
-    elif config.model_class == "Ollama":
-        return ChatOllama(
-            model=model_name,
-            base_url=config.base_url,
-            temperature=temperature
-            # streaming=True
-        )
-    elif config.model_class == "ChatGoogleGenerativeAI":
-        return ChatGoogleGenerativeAI(
-            model=model_name,
-            api_key=api_key,
-            temperature=temperature,
-            streaming=True
-        )
-    elif config.model_class == "LLMStudio":
-        # LLMStudio 使用 OpenAI 兼容接口，但不需要 API key
-        return ChatOpenAI(
-            model=model_name,
-            api_key="dummy-key",  # LLMStudio 需要一个占位符 API key
-            base_url=config.base_url,
-            temperature=temperature
-            # streaming=True
-        )
-    else:
-        return ChatOpenAI(
-            model=model_name,
-            api_key=api_key,
-            base_url=config.base_url,
-            temperature=temperature,
-            streaming=True
-        )
+    streaming = model_registry.get(vendor_name).model_class not in NON_STREAMING_MODEL_CLASSES
+    return model_registry.get_chat(vendor_name, model_name, temperature=0.0, streaming=streaming)
@@ -1,11 +1,10 @@
 from typing import Dict, List, Any, Union
-from langchain.prompts import PromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field, validator, field_validator, ValidationError
 from typing import List, Optional
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import OutputParserException
+from langchain_core.exceptions import OutputParserException
 import os
 from dotenv import load_dotenv
 from model_config import get_available_models, create_model_instance, CARD_TEST_MODELS, get_default_model
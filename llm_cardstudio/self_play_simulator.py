@@ -0,0 +1,285 @@
+"""自我对弈模拟：decks.json 中的卡组两两对战，双方都使用 GameManager 对手回合的随机策略
+
+统计各卡组胜率、平均对局回合数、每张卡牌的打出次数和打出后的胜率，以及模拟吞吐量（局/秒），
+既用于卡牌和卡组平衡，也作为引擎改动的性能基准。
+
+用法（在 llm_cardstudio 目录执行）：
+    python self_play_simulator.py --games 100
+    python self_play_simulator.py --games 500 --workers 8 --seed 7 --decks deck_1 deck_3
+    python self_play_simulator.py --games 200 --output results/self_play.json
+
+每局的随机种子由 --seed、对阵卡组和局号决定，与进程数和执行顺序无关，相同参数得到相同的结果。
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from card_catalog import card_catalog, load_decks
+from debug_utils import debug_utils
+from game_manager import GameManager
+
+# 超过该回合数仍未分出胜负的对局按平局处理
+DEFAULT_MAX_TURNS = 100
+
+
+@dataclass
+class GameSpec:
+    """一局模拟的对阵和随机种子"""
+    player_deck: str     # 先手（player）使用的卡组ID
+    opponent_deck: str   # 后手（opponent）使用的卡组ID
+    game_index: int
+    seed: int
+
+
+@dataclass
+class GameResult:
+    player_deck: str
+    opponent_deck: str
+    seed: int
+    winner: Optional[str]  # "player"、"opponent"，平局或超过回合上限为 None
+    turns: int
+    played_cards: Dict[str, List[str]] = field(default_factory=dict)  # 双方打出的卡牌ID
+
+
+def game_seed(base_seed: int, player_deck: str, opponent_deck: str, game_index: int) -> int:
+    """每局的随机种子，只取决于基础种子、对阵和局号"""
+    return zlib.crc32(f"{base_seed}:{player_deck}:{opponent_deck}:{game_index}".encode("utf-8"))
+
+
+def build_specs(deck_ids: List[str], games: int, base_seed: int) -> List[GameSpec]:
+    """所有不同卡组的有序对阵（双方各先手一次），每个对阵 games 局"""
+    return [
+        GameSpec(player_deck, opponent_deck, index, game_seed(base_seed, player_deck, opponent_deck, index))
+        for player_deck, opponent_deck in itertools.permutations(deck_ids, 2)
+        for index in range(games)
+    ]
+
+
+def play_game(spec: GameSpec, decks: Dict[str, Dict[str, Any]], max_turns: int = DEFAULT_MAX_TURNS) -> GameResult:
+    """无界面、无等待地模拟一局自我对弈"""
+    game_manager = GameManager(seed=spec.seed, self_play=True)
+    game_manager.selected_decks = {
+        "player": decks[spec.player_deck]["cards"],
+        "opponent": decks[spec.opponent_deck]["cards"]
+    }
+    game_manager.start_game()
+
+    game_state = game_manager.game_state
+    while True:
+        before = (game_manager.game_state["gameloop_state"], game_manager.game_state["turn_info"]["current_turn"])
+        state = game_manager.run_until_idle(max_steps=100)
+        game_state = game_manager.game_state
+        if state == "restart_game" or game_state["turn_info"]["current_turn"] > max_turns:
+            break
+        if (state, game_state["turn_info"]["current_turn"]) == before:
+            # 状态机没有推进（例如命令序列等待卡牌选择），按平局结束
+            break
+
+    return GameResult(
+        player_deck=spec.player_deck,
+        opponent_deck=spec.opponent_deck,
+        seed=spec.seed,
+        winner=game_state.get("winner") if state == "restart_game" else None,
+        turns=game_state["turn_info"]["current_turn"],
+        played_cards={side: list(cards) for side, cards in game_state.get("played_cards", {}).items()}
+    )
+
+
+_worker_decks: Dict[str, Dict[str, Any]] = {}
+_worker_max_turns = DEFAULT_MAX_TURNS
+
+
+def _quiet_engine():
+    """关闭调试日志，引擎的过程输出对批量模拟没有意义"""
+    debug_utils.debug_mode = False
+
+
+def _init_worker(decks: Dict[str, Dict[str, Any]], max_turns: int):
+    global _worker_decks, _worker_max_turns
+    _worker_decks = decks
+    _worker_max_turns = max_turns
+    _quiet_engine()
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+
+
+def _play_in_worker(spec: GameSpec) -> GameResult:
+    return play_game(spec, _worker_decks, _worker_max_turns)
+
+
+def run_simulation(specs: List[GameSpec], decks: Dict[str, Dict[str, Any]], workers: int = 1,
+                   max_turns: int = DEFAULT_MAX_TURNS) -> List[GameResult]:
+    """执行所有对局，workers 大于 1 时分发到进程池，结果顺序与 specs 一致"""
+    if workers <= 1:
+        _quiet_engine()
+        with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+            return [play_game(spec, decks, max_turns) for spec in specs]
+
+    chunksize = max(1, len(specs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(decks, max_turns)) as pool:
+        return list(pool.map(_play_in_worker, specs, chunksize=chunksize))
+
+
+def summarize(results: List[GameResult], decks: Dict[str, Dict[str, Any]],
+              card_names: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """汇总卡组胜率、对阵结果和卡牌统计
+
+    卡牌的 win_rate 是打出过该卡牌的一方最终获胜的比例（每局每方只计一次），
+    与整体胜率比较可以看出卡牌对胜负的贡献。
+    """
+    card_names = card_names or {}
+    deck_stats = defaultdict(lambda: {"games": 0, "wins": 0, "losses": 0, "draws": 0, "turns": 0})
+    pairings = defaultdict(lambda: {"games": 0, "player_wins": 0, "opponent_wins": 0, "draws": 0, "turns": 0})
+    card_stats = defaultdict(lambda: {"plays": 0, "games": 0, "wins": 0})
+
+    for result in results:
+        pairing = pairings[(result.player_deck, result.opponent_deck)]
+        pairing["games"] += 1
+        pairing["turns"] += result.turns
+        if result.winner is None:
+            pairing["draws"] += 1
+        else:
+            pairing[f"{result.winner}_wins"] += 1
+
+        for side, deck_id in (("player", result.player_deck), ("opponent", result.opponent_deck)):
+            stats = deck_stats[deck_id]
+            stats["games"] += 1
+            stats["turns"] += result.turns
+            if result.winner is None:
+                stats["draws"] += 1
+            elif result.winner == side:
+                stats["wins"] += 1
+            else:
+                stats["losses"] += 1
+
+            played = result.played_cards.get(side, [])
+            for card_id in played:
+                card_stats[card_id]["plays"] += 1
+            for card_id in set(played):
+                card_stats[card_id]["games"] += 1
+                if result.winner == side:
+                    card_stats[card_id]["wins"] += 1
+
+    def rate(count, total):
+        return count / total if total else 0.0
+
+    return {
+        "games": len(results),
+        "avg_turns": rate(sum(r.turns for r in results), len(results)),
+        "decks": {
+            deck_id: {
+                "name": decks.get(deck_id, {}).get("name", deck_id),
+                **stats,
+                "win_rate": rate(stats["wins"], stats["games"]),
+                "avg_turns": rate(stats["turns"], stats["games"])
+            }
+            for deck_id, stats in sorted(deck_stats.items())
+        },
+        "pairings": [
+            {
+                "player_deck": player_deck,
+                "opponent_deck": opponent_deck,
+                **stats,
+                "player_win_rate": rate(stats["player_wins"], stats["games"]),
+                "avg_turns": rate(stats["turns"], stats["games"])
+            }
+            for (player_deck, opponent_deck), stats in sorted(pairings.items())
+        ],
+        "cards": {
+            card_id: {
+                "name": card_names.get(card_id, card_id),
+                **stats,
+                "win_rate": rate(stats["wins"], stats["games"])
+            }
+            for card_id, stats in sorted(card_stats.items(), key=lambda item: -item[1]["plays"])
+        }
+    }
+
+
+def load_card_names() -> Dict[str, str]:
+    return {card_id: card.get("name", card_id) for card_id, card in card_catalog().by_id.items()}
+
+
+def print_report(summary: Dict[str, Any], elapsed: float, workers: int, top: int = 10):
+    games = summary["games"]
+    print(f"\n🎮 自我对弈模拟完成: {games} 局，{workers} 个进程，耗时 {elapsed:.2f}秒，"
+          f"{games / elapsed if elapsed else 0:.1f} 局/秒，平均 {summary['avg_turns']:.1f} 回合")
+
+    print("\n🏆 卡组胜率:")
+    print("=" * 72)
+    print("{:<10} {:<12} {:>6} {:>6} {:>6} {:>6} {:>8} {:>8}".format(
+        "卡组", "名称", "局数", "胜", "负", "平", "胜率", "平均回合"))
+    print("-" * 72)
+    for deck_id, stats in sorted(summary["decks"].items(), key=lambda item: -item[1]["win_rate"]):
+        print("{:<10} {:<12} {:>6} {:>6} {:>6} {:>6} {:>7.1%} {:>8.1f}".format(
+            deck_id, stats["name"], stats["games"], stats["wins"], stats["losses"], stats["draws"],
+            stats["win_rate"], stats["avg_turns"]))
+
+    print("\n⚔️ 对阵结果（先手 vs 后手）:")
+    print("-" * 72)
+    for pairing in summary["pairings"]:
+        print("{:<10} vs {:<10} {:>6}局  先手胜率 {:>6.1%}  平局 {:>4}  平均 {:.1f} 回合".format(
+            pairing["player_deck"], pairing["opponent_deck"], pairing["games"],
+            pairing["player_win_rate"], pairing["draws"], pairing["avg_turns"]))
+
+    print(f"\n🃏 打出次数最多的 {top} 张卡牌:")
+    print("-" * 72)
+    print("{:<10} {:<16} {:>8} {:>8} {:>10}".format("卡牌", "名称", "打出次数", "出场局数", "出场胜率"))
+    for card_id, stats in list(summary["cards"].items())[:top]:
+        print("{:<10} {:<16} {:>8} {:>8} {:>9.1%}".format(
+            card_id, stats["name"], stats["plays"], stats["games"], stats["win_rate"]))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="卡组自我对弈模拟与胜率统计")
+    parser.add_argument("--games", type=int, default=100, help="每个对阵（先手卡组, 后手卡组）的局数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数，1 表示在当前进程执行")
+    parser.add_argument("--seed", type=int, default=0, help="基础随机种子")
+    parser.add_argument("--decks", nargs="*", help="参与模拟的卡组ID，默认 decks.json 中的全部卡组")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS, help="超过该回合数按平局处理")
+    parser.add_argument("--top", type=int, default=10, help="列出打出次数最多的卡牌数量")
+    parser.add_argument("--output", help="把汇总结果和每局结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    decks = load_decks()
+    deck_ids = args.decks or list(decks)
+    unknown = [deck_id for deck_id in deck_ids if deck_id not in decks]
+    if unknown:
+        parser.error(f"未知的卡组: {', '.join(unknown)}")
+    if len(deck_ids) < 2:
+        parser.error("至少需要两个卡组")
+
+    specs = build_specs(deck_ids, args.games, args.seed)
+    start = time.perf_counter()
+    results = run_simulation(specs, decks, args.workers, args.max_turns)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(results, decks, load_card_names())
+    print_report(summary, elapsed, args.workers, args.top)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "seed": args.seed,
+                "games_per_pairing": args.games,
+                "max_turns": args.max_turns,
+                "elapsed": elapsed,
+                "games_per_sec": len(results) / elapsed if elapsed else None,
+                "summary": summary,
+                "results": [asdict(result) for result in results]
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
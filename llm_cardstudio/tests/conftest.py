@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# llm_cardstudio 的模块按平铺方式导入（与在 llm_cardstudio 目录下运行时一致）
+CARDSTUDIO_DIR = Path(__file__).resolve().parent.parent
+if str(CARDSTUDIO_DIR) not in sys.path:
+    sys.path.insert(0, str(CARDSTUDIO_DIR))
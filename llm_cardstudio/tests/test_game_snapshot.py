@@ -0,0 +1,137 @@
+import contextlib
+import io
+import json
+import zlib
+from pathlib import Path
+from types import MappingProxyType
+
+import pytest
+
+from card_instance import CardInstance, to_plain
+from debug_utils import debug_utils
+from game_manager import GameManager
+from game_snapshot import SAVE_FORMAT_VERSION, UndoHistory, decode_save, encode_save, freeze, thaw
+
+DECKS = json.loads((Path(__file__).resolve().parent.parent / "decks.json").read_text(encoding="utf-8"))
+
+DEFINITION = MappingProxyType({"id": "card_1", "name": "测试随从", "type": "minion", "cost": 2,
+                               "attack": 2, "health": 3, "effects": ["taunt"]})
+
+
+@pytest.fixture(autouse=True)
+def quiet_engine(monkeypatch):
+    monkeypatch.setattr(debug_utils, "debug_mode", False)
+
+
+def started_game(seed=3, steps=1):
+    """开始一局自我对弈并推进若干步，返回 GameManager"""
+    game = GameManager(seed=seed, self_play=True)
+    game.selected_decks = {"player": DECKS["deck_1"]["cards"], "opponent": DECKS["deck_2"]["cards"]}
+    with contextlib.redirect_stdout(io.StringIO()):
+        game.start_game()
+        for _ in range(steps):
+            game.run_until_idle(max_steps=20)
+    return game
+
+
+def plain_state(game):
+    return to_plain({"game_state": game.game_state, "deck_state": game.deck_state,
+                     "selected_decks": game.selected_decks})
+
+
+def test_card_instance_dict_access():
+    card = CardInstance.create(DEFINITION, "card_1#1")
+    assert card["id"] == "card_1#1" and card["card_id"] == "card_1"
+    assert card["name"] == "测试随从" and card.get("missing", 0) == 0
+    assert card.effects == ("taunt",)
+    card["health"] = 1
+    assert card.health == 1
+    with pytest.raises(KeyError):
+        card["cost"] = 0
+    assert card != card.clone() and card.clone().definition is DEFINITION
+
+
+def test_card_record_cache_invalidated_on_change():
+    card = CardInstance.create(DEFINITION, "card_1#1")
+    record = card.record()
+    assert card.record() is record
+    card["attack"] = 5
+    assert card.record() is not record and card.record()[2] == 5
+    assert CardInstance.from_record(record).record() is record
+
+
+def test_card_dict_round_trip():
+    card = CardInstance.create(DEFINITION, "card_1#1")
+    card["health"] = 1
+    restored = CardInstance.from_dict(card.to_dict(), {"card_1": DEFINITION})
+    assert restored.record() == card.record()
+    assert restored.definition is DEFINITION
+
+
+def test_freeze_shares_unchanged_parts():
+    card = CardInstance.create(DEFINITION, "card_1#1")
+    state = {"stats": {"hp": 3}, "log": ["开始"], "selected": card}
+    first = freeze(state)
+    assert freeze(state, first) is first
+    state["log"].append("回合 1")
+    second = freeze(state, first)
+    assert second is not first and second["stats"] is first["stats"]
+    assert thaw(second, {card.id: card}) == state
+
+
+def test_undo_history():
+    history = UndoHistory(max_size=2)
+    history.record("一", "s1")
+    history.record("二", "s2")
+    history.record("三", "s3")
+    assert history.undo("current") == ("三", "s3")
+    assert history.redo("s3") == ("三", "current")
+    assert [label for label, _ in history.undo_stack] == ["二", "三"]
+    history.record("四", "s4")
+    assert not history.can_redo()
+
+
+def test_snapshot_reuses_unchanged_zones():
+    game = started_game()
+    first = game.snapshot()
+    second = game.snapshot()
+    assert second.state is first.state
+    assert all(second.zones[key] is first.zones[key] for key in first.zones)
+
+
+def test_restore_snapshot():
+    game = started_game()
+    snapshot = game.snapshot()
+    expected = plain_state(game)
+    with contextlib.redirect_stdout(io.StringIO()):
+        game.run_until_idle(max_steps=20)
+    game.restore(snapshot)
+    assert plain_state(game) == expected
+
+
+def test_save_round_trip():
+    game = started_game()
+    hand = game.game_state["hand_cards"]["player"]
+    hand[0]["health"] = hand[0]["health"] + 7   # 与卡牌定义不同的属性也要写入存档
+    info = {"save_name": "测试", "turn": game.snapshot().turn}
+
+    payload = encode_save(game.snapshot(), info, game.cards_by_id)
+    assert json.loads(zlib.decompress(payload))["version"] == SAVE_FORMAT_VERSION
+
+    snapshot, restored_info = decode_save(payload, game.cards_by_id)
+    loaded = GameManager(seed=0)
+    loaded.restore(snapshot)
+    assert restored_info == info
+    assert plain_state(loaded) == plain_state(game)
+    # 手牌和抽牌记录中的同一张卡牌恢复为同一个实例，卡牌定义共享卡牌目录
+    drawn = {card.id: card for card in loaded.deck_state["player"]["draw_history"]}
+    for card in loaded.game_state["hand_cards"]["player"]:
+        if card.id in drawn:
+            assert drawn[card.id] is card
+        assert card.definition is loaded.cards_by_id[card["card_id"]]
+
+
+def test_decode_rejects_unknown_version():
+    payload = zlib.compress(json.dumps({"version": 1}).encode("utf-8"))
+    with pytest.raises(ValueError):
+        decode_save(payload, {})
@@ -0,0 +1 @@
+"""lab_runner、llm_cardstudio 等工具共用的模型调用基础设施"""
@@ -0,0 +1,91 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """HTTP 连接池配置"""
+    max_connections: int = 20            # 最大连接数
+    max_keepalive_connections: int = 10  # 最大保持连接数
+    keepalive_expiry: float = 30.0       # 空闲连接保持时间（秒）
+
+    @classmethod
+    def from_vendor(cls, vendor_config) -> "PoolSettings":
+        """从 ModelVendorConfig 读取连接池配置"""
+        return cls(
+            max_connections=getattr(vendor_config, "max_connections", cls.max_connections),
+            max_keepalive_connections=getattr(vendor_config, "max_keepalive_connections", cls.max_keepalive_connections),
+            keepalive_expiry=getattr(vendor_config, "keepalive_expiry", cls.keepalive_expiry)
+        )
+
+
+class ChatClientPool:
+    """聊天模型客户端注册表
+
+    - 按 (模型商, 模型, base_url, temperature, streaming) 缓存聊天模型实例
+    - 同一 base_url 的 OpenAI 兼容客户端共用一组 httpx 连接池，避免重复握手
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._chat_models: Dict[Tuple, Any] = {}
+        self._http_clients: Dict[Tuple, Tuple[Any, Any]] = {}
+
+    def get_or_create(self, vendor: str, model: str, base_url: Optional[str],
+                      temperature: Optional[float], streaming: bool,
+                      factory: Callable[[], Any], options: Tuple = ()) -> Any:
+        """获取缓存的聊天模型实例，不存在时调用 factory 创建
+
+        options 为 factory 使用的其他构造参数，参数不同的实例分别缓存。
+        """
+        key = (vendor, model, base_url, temperature, streaming, options)
+        with self._lock:
+            chat = self._chat_models.get(key)
+            if chat is None:
+                chat = factory()
+                self._chat_models[key] = chat
+            return chat
+
+    def http_clients(self, base_url: Optional[str], settings: PoolSettings = PoolSettings()) -> Tuple[Any, Any]:
+        """获取 base_url 对应的共享 (httpx.Client, httpx.AsyncClient)"""
+        key = (base_url, settings)
+        with self._lock:
+            clients = self._http_clients.get(key)
+            if clients is None:
+                import httpx
+
+                limits = httpx.Limits(
+                    max_connections=settings.max_connections,
+                    max_keepalive_connections=settings.max_keepalive_connections,
+                    keepalive_expiry=settings.keepalive_expiry
+                )
+                clients = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+                self._http_clients[key] = clients
+            return clients
+
+    def openai_client_kwargs(self, base_url: Optional[str], settings: PoolSettings = PoolSettings()) -> Dict[str, Any]:
+        """ChatOpenAI 使用共享连接池所需的参数"""
+        http_client, http_async_client = self.http_clients(base_url, settings)
+        return {"http_client": http_client, "http_async_client": http_async_client}
+
+    def stats(self) -> Dict[str, int]:
+        """返回当前缓存的实例数量"""
+        with self._lock:
+            return {
+                "chat_models": len(self._chat_models),
+                "http_pools": len(self._http_clients)
+            }
+
+    def clear(self):
+        """关闭所有连接池并清空缓存"""
+        with self._lock:
+            for http_client, _ in self._http_clients.values():
+                http_client.close()
+            # AsyncClient 需要在事件循环中关闭，这里只释放引用
+            self._http_clients.clear()
+            self._chat_models.clear()
+
+
+# 全局客户端注册表
+client_pool = ChatClientPool()
@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from llm_common.client_pool import client_pool, PoolSettings
+from llm_common.rate_limiter import rate_limiters, RateLimitSettings
+from llm_common.vendor_adapters import get_adapter, load_chat_class
+
+logger = logging.getLogger(__name__)
+
+# 健康检查结果的有效期（秒），期间重复探测直接返回上次结果
+PROBE_TTL = 60.0
+
+# 健康检查请求的超时时间（秒）
+PROBE_TIMEOUT = 5.0
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """模型单价（美元 / 百万 token）"""
+    input: float                          # 输入 token 单价
+    output: float                         # 输出 token 单价
+    cached_input: Optional[float] = None  # 命中提示词缓存的输入 token 单价，None 按 input 计算
+
+    def cost(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        """计算一次调用的费用（美元），cached_tokens 包含在 input_tokens 中"""
+        cached_price = self.input if self.cached_input is None else self.cached_input
+        cached_tokens = min(cached_tokens, input_tokens)
+        return ((input_tokens - cached_tokens) * self.input + cached_tokens * cached_price
+                + output_tokens * self.output) / 1_000_000
+
+
+# 各模型的公开标价（美元 / 百万 token，人民币价格按 1 美元 = 7.2 元折算），
+# 代理商或私有部署价格不同时，在 ModelVendorConfig.prices 中使用自己的价格表
+LIST_PRICES: Dict[str, ModelPrice] = {
+    "gpt-4-turbo": ModelPrice(10.0, 30.0),
+    "gpt-3.5-turbo": ModelPrice(0.5, 1.5),
+    "gpt-3.5-turbo-1106": ModelPrice(1.0, 2.0),
+    "deepseek-chat": ModelPrice(0.27, 1.10, cached_input=0.07),
+    "claude-3-5-sonnet-20241022": ModelPrice(3.0, 15.0, cached_input=0.30),
+    "claude-3-5-sonnet-20240620": ModelPrice(3.0, 15.0, cached_input=0.30),
+    "claude-3-sonnet-20240229": ModelPrice(3.0, 15.0),
+    "claude-3-opus": ModelPrice(15.0, 75.0, cached_input=1.50),
+    "claude-3-sonnet": ModelPrice(3.0, 15.0),
+    "claude-2.1": ModelPrice(8.0, 24.0),
+    "claude-2": ModelPrice(8.0, 24.0),
+    "claude-instant": ModelPrice(0.8, 2.4),
+    "gemini-1.5-flash": ModelPrice(0.075, 0.30),
+    "gemini-1.5-pro": ModelPrice(1.25, 5.0),
+    "gemini-2.0-flash-exp": ModelPrice(0.0, 0.0),  # 实验版免费
+    "moonshot-v1-32k": ModelPrice(3.33, 3.33),
+    "Doubao-pro-128k": ModelPrice(0.69, 1.25),
+    "qwen-max": ModelPrice(2.78, 8.33),
+    "glm-4": ModelPrice(13.9, 13.9),
+}
+
+
+@dataclass
+class ModelVendorConfig:
+    name: str                    # 模型商名称
+    models: List[str]           # 该商家提供的模型列表
+    baseline_models: List[str]  # 该商家的基线模型列表
+    api_key_env: Optional[str]  # 环境变量中API KEY的名称，本地模型为 None
+    base_url: Optional[str]     # API基础URL
+    model_class: Optional[str] = None  # 模型基类名称，可选，None 按 ChatOpenAI 处理
+    max_connections: int = 20          # HTTP 连接池最大连接数
+    max_keepalive_connections: int = 10  # HTTP 连接池最大保持连接数
+    keepalive_expiry: float = 30.0     # 空闲连接保持时间（秒）
+    requests_per_minute: Optional[float] = None  # 每分钟请求数限额，None 表示以服务端反馈为准
+    tokens_per_minute: Optional[float] = None    # 每分钟 token 限额
+    max_retries: int = 5               # 429/5xx 最大重试次数
+    prices: Dict[str, ModelPrice] = field(default_factory=dict)  # 模型名称 -> 单价，用于统计费用
+
+    def price_of(self, model_name: str) -> Optional[ModelPrice]:
+        """模型单价，价格表中没有该模型时返回 None（费用未知）"""
+        return self.prices.get(model_name)
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return os.getenv(self.api_key_env) if self.api_key_env else None
+
+    @property
+    def configured(self) -> bool:
+        """不需要API密钥（本地模型）或已配置API密钥"""
+        return self.api_key_env is None or bool(self.api_key)
+
+
+@dataclass
+class ProbeResult:
+    """模型商健康检查结果"""
+    vendor: str
+    ok: bool
+    latency: Optional[float] = None   # 健康检查请求的往返时间（秒）
+    status: Optional[int] = None      # HTTP 状态码
+    error: str = ""
+    checked_at: float = field(default_factory=time.time)
+
+
+def create_chat(config: ModelVendorConfig, model_name: str, temperature: Optional[float] = 0.0,
+                streaming: Optional[bool] = None, rate_limited: bool = False, **overrides) -> Any:
+    """按模型商配置创建聊天模型实例
+
+    相同 (模型商, 模型, base_url, temperature, streaming, overrides) 复用同一实例，OpenAI 兼容接口共用
+    base_url 对应的 HTTP 连接池；rate_limited 为 True 时附加按模型商共享的限流与重试，
+    并关闭客户端自带的重试（max_retries=0），避免重试次数翻倍且绕过限流配额。
+
+    Args:
+        streaming: 是否流式输出，None 使用 model_class 的默认值
+        overrides: 额外的构造参数（例如 verbose），会覆盖适配器生成的参数
+    """
+    adapter = get_adapter(config.model_class)
+    if streaming is None:
+        streaming = adapter.streaming
+    if rate_limited and adapter.client_retries:
+        overrides = {"max_retries": 0, **overrides}
+
+    def factory():
+        kwargs = adapter.chat_kwargs(model_name, config.base_url, config.api_key, temperature, streaming)
+        if adapter.openai_compatible:
+            kwargs.update(client_pool.openai_client_kwargs(config.base_url, PoolSettings.from_vendor(config)))
+        kwargs.update(overrides)
+        return load_chat_class(config.model_class)(**kwargs)
+
+    # 构造参数可能不可哈希（例如回调列表），按 repr 区分
+    options = tuple(sorted((name, repr(value)) for name, value in overrides.items()))
+    chat = client_pool.get_or_create(config.name, model_name, config.base_url, temperature, streaming, factory,
+                                     options)
+    if rate_limited:
+        # 同一模型商的所有模型共用限流配额，429/5xx 自动退避重试
+        return rate_limiters.wrap(chat, config.name, RateLimitSettings.from_vendor(config))
+    return chat
+
+
+class ModelRegistry:
+    """模型商注册表：各工具的模型商配置表共用同一套创建、探测和选择逻辑
+
+    - 按 model_class 由 vendor_adapters 中的适配器创建实例，实例和连接池由 client_pool 缓存
+    - probe 发出不消耗 token 的列模型请求，检查密钥和网络是否可用并记录往返时间
+    - fastest_baseline 并发探测所有已配置的模型商，返回最快可用模型商的基线模型
+    """
+
+    def __init__(self, vendors: Dict[str, ModelVendorConfig]):
+        self.vendors = vendors
+        self._lock = threading.Lock()
+        self._probes: Dict[str, ProbeResult] = {}
+
+    def get(self, vendor_name: str) -> ModelVendorConfig:
+        config = self.vendors.get(vendor_name)
+        if config is None:
+            raise ValueError(f"未知的供应商: {vendor_name}")
+        return config
+
+    def available(self) -> Dict[str, ModelVendorConfig]:
+        """不需要API密钥或已配置API密钥的模型商"""
+        return {name: config for name, config in self.vendors.items() if config.configured}
+
+    def vendor_of(self, model_name: str) -> Optional[str]:
+        """返回第一个提供该模型的模型商名称"""
+        return next((name for name, config in self.vendors.items() if model_name in config.models), None)
+
+    def get_chat(self, vendor_name: str, model_name: str, temperature: Optional[float] = 0.0,
+                 streaming: Optional[bool] = None, rate_limited: bool = False, **overrides) -> Any:
+        """获取模型商的聊天模型实例，需要API密钥但未配置时抛出 ValueError"""
+        config = self.get(vendor_name)
+        if not config.configured:
+            raise ValueError(f"供应商 {vendor_name} 的API密钥未配置")
+        return create_chat(config, model_name, temperature, streaming, rate_limited, **overrides)
+
+    def probe(self, vendor_name: str, timeout: float = PROBE_TIMEOUT, refresh: bool = False) -> ProbeResult:
+        """健康检查：列出模型商的模型，结果在 PROBE_TTL 秒内复用
+
+        探测请求使用与聊天模型相同的共享连接池，探测成功后首次调用可以复用已建立的连接。
+        """
+        with self._lock:
+            cached = self._probes.get(vendor_name)
+        if cached is not None and not refresh and time.time() - cached.checked_at < PROBE_TTL:
+            return cached
+
+        config = self.get(vendor_name)
+        if not config.configured:
+            result = ProbeResult(vendor_name, ok=False, error=f"未配置环境变量 {config.api_key_env}")
+        else:
+            url, headers = get_adapter(config.model_class).probe_request(config.base_url, config.api_key)
+            http_client, _ = client_pool.http_clients(config.base_url, PoolSettings.from_vendor(config))
+            start = time.perf_counter()
+            try:
+                response = http_client.get(url, headers=headers, timeout=timeout)
+                latency = time.perf_counter() - start
+                ok = response.status_code < 400
+                result = ProbeResult(vendor_name, ok=ok, latency=latency, status=response.status_code,
+                                     error="" if ok else f"HTTP {response.status_code}")
+            except Exception as e:
+                result = ProbeResult(vendor_name, ok=False, error=str(e) or type(e).__name__)
+        logger.info(f"探测模型商 {vendor_name}: {'可用' if result.ok else '不可用'}"
+                    + (f"，{result.latency * 1000:.0f}ms" if result.latency is not None else "")
+                    + (f"，{result.error}" if result.error else ""))
+
+        with self._lock:
+            self._probes[vendor_name] = result
+        return result
+
+    def probe_all(self, vendor_names: Optional[Iterable[str]] = None, timeout: float = PROBE_TIMEOUT,
+                  refresh: bool = False) -> List[ProbeResult]:
+        """并发探测多个模型商（默认所有已配置的模型商），按往返时间排序，不可用的排在最后"""
+        names = list(vendor_names) if vendor_names is not None else list(self.available())
+        if not names:
+            return []
+        with ThreadPoolExecutor(max_workers=len(names)) as pool:
+            results = list(pool.map(lambda name: self.probe(name, timeout, refresh), names))
+        return sorted(results, key=lambda r: (not r.ok, r.latency if r.latency is not None else float("inf")))
+
+    def fastest_baseline(self, vendor_names: Optional[Iterable[str]] = None,
+                         timeout: float = PROBE_TIMEOUT) -> Optional[Tuple[str, str]]:
+        """返回最快可用模型商的 (模型商名称, 第一个基线模型)，全部不可用时返回 None"""
+        for result in self.probe_all(vendor_names, timeout):
+            config = self.vendors[result.vendor]
+            if result.ok and config.baseline_models:
+                return result.vendor, config.baseline_models[0]
+        return None
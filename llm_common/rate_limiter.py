@@ -0,0 +1,399 @@
+"""按模型商的令牌桶限流与 429/5xx 退避重试
+
+限流等待（令牌桶和退避）发生在模型调用之前，调用方用 track_wait() 统计当前调用等待的时间，
+从执行时间中扣除，测试结果中的耗时只反映模型本身的响应时间。
+
+没有配置 requests_per_minute 时请求桶不限速；收到 429 后按最近一分钟实际发出的请求数
+下调 20% 作为初始限额，之后再按服务端返回的限额头和后续 429 调整。最近一分钟的请求少于
+MIN_OBSERVED_REQUESTS 个时样本太少（例如第一个请求就被限流），只退避重试，不开始限速。没有配置 tokens_per_minute
+且服务端不返回 token 限额头时，token 桶保持不限速。
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# 需要重试的 HTTP 状态码：429 限流和 5xx 服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+
+# 收到 429 但响应中没有限额信息时，速率下调的比例
+THROTTLE_BACKOFF_FACTOR = 0.8
+
+# 统计实际请求速率的时间窗口（秒）
+OBSERVED_RATE_WINDOW = 60.0
+# 以实际速率作为初始限额所需的最少请求数
+MIN_OBSERVED_REQUESTS = 10
+
+
+class WaitTracker:
+    """track_wait() 返回的计时器，seconds 为限流等待的累计时间"""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+_wait_tracker: contextvars.ContextVar[Optional[WaitTracker]] = contextvars.ContextVar("rate_limit_wait", default=None)
+
+
+@contextlib.contextmanager
+def track_wait() -> Iterator[WaitTracker]:
+    """统计当前线程/协程中的调用在限流器中等待的时间（令牌桶和退避），用于从执行时间中扣除
+
+        with track_wait() as waited:
+            chat.invoke(messages)
+        execution_time = elapsed - waited.seconds
+    """
+    tracker = WaitTracker()
+    token = _wait_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _wait_tracker.reset(token)
+
+
+def _record_wait(seconds: float):
+    tracker = _wait_tracker.get()
+    if tracker is not None:
+        tracker.seconds += seconds
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    """模型商的限流与重试配置"""
+    requests_per_minute: Optional[float] = None  # 每分钟请求数，None 表示不限制（以服务端反馈为准）
+    tokens_per_minute: Optional[float] = None    # 每分钟 token 数，None 表示不限制
+    max_retries: int = 5                         # 429/5xx 最大重试次数
+    base_delay: float = 1.0                      # 指数退避的初始等待时间（秒）
+    max_delay: float = 60.0                      # 单次等待时间上限（秒）
+
+    @classmethod
+    def from_vendor(cls, vendor_config) -> "RateLimitSettings":
+        """从 ModelVendorConfig 读取限流配置"""
+        return cls(
+            requests_per_minute=getattr(vendor_config, "requests_per_minute", None),
+            tokens_per_minute=getattr(vendor_config, "tokens_per_minute", None),
+            max_retries=getattr(vendor_config, "max_retries", cls.max_retries)
+        )
+
+
+class TokenBucket:
+    """令牌桶，容量为每分钟限额，按秒均匀补充；允许预支，返回需要等待的时间"""
+
+    def __init__(self, per_minute: Optional[float]):
+        self._lock = threading.Lock()
+        self.per_minute = per_minute
+        self.tokens = per_minute or 0.0
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.per_minute
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.per_minute, self.tokens + elapsed * self.per_minute / 60.0)
+
+    def reserve(self, amount: float) -> float:
+        """预留 amount 个令牌，返回需要等待的秒数"""
+        if self.unlimited or amount <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens * 60.0 / self.per_minute
+
+    def adjust(self, amount: float):
+        """归还（负数为追加扣除）令牌，用于按实际用量修正预估值"""
+        if self.unlimited:
+            return
+        with self._lock:
+            self.tokens = min(self.per_minute, self.tokens + amount)
+
+    def set_limit(self, per_minute: float, remaining: Optional[float] = None):
+        """根据服务端返回的限额更新令牌桶"""
+        if not per_minute or per_minute <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.unlimited:
+                self.tokens = per_minute
+                self.updated = now
+            else:
+                self._refill(now)
+            self.per_minute = per_minute
+            self.tokens = min(self.tokens, per_minute)
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+
+    def throttle(self, factor: float = THROTTLE_BACKOFF_FACTOR, observed_per_minute: Optional[float] = None):
+        """被限流时按比例降低速率
+
+        Args:
+            observed_per_minute: 最近实际的速率，不限速的桶以它为基准开始限速，为空时保持不限速
+        """
+        if self.unlimited:
+            if observed_per_minute:
+                with self._lock:
+                    self.per_minute = max(1.0, observed_per_minute * factor)
+                    self.tokens = 0.0
+                    self.updated = time.monotonic()
+            return
+        with self._lock:
+            self.per_minute = max(1.0, self.per_minute * factor)
+            self.tokens = min(self.tokens, 0.0)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析限流响应头中的时间，如 "1s"、"6m0s"、"250ms"、"2"（秒）"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for number, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value):
+        matched = True
+        total += float(number) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+def _get_status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _get_error_headers(error: Exception) -> Mapping[str, str]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    return headers or {}
+
+
+def is_retryable(error: Exception) -> bool:
+    """判断异常是否值得重试：429/5xx 或网络连接/超时错误"""
+    status = _get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    """粗略估算消息的 token 数（中文约每字1个token，英文约每4个字符1个token）"""
+    chars = 0
+    for m in messages:
+        content = getattr(m, "content", "") or ""
+        if isinstance(content, list):
+            # 内容块列表（例如带 cache_control 标记的系统提示词）
+            chars += sum(len(block if isinstance(block, str) else block.get("text", "")) for block in content)
+        else:
+            chars += len(content)
+    return max(1, chars // 2)
+
+
+class VendorRateLimiter:
+    """单个模型商的限流与重试调度器"""
+
+    def __init__(self, name: str, settings: RateLimitSettings = RateLimitSettings()):
+        self.name = name
+        self.settings = settings
+        self.requests = TokenBucket(settings.requests_per_minute)
+        self.tokens = TokenBucket(settings.tokens_per_minute)
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+        self._recent_requests: deque = deque()  # 最近一分钟发出请求的时间，用于估算实际速率
+        # 统计信息
+        self.throttled = 0
+        self.retries = 0
+
+    def _acquire_delay(self, estimated_tokens: int) -> float:
+        now = time.monotonic()
+        delay = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        with self._lock:
+            delay = max(0.0, delay, self._pause_until - now)
+            self._recent_requests.append(now + delay)
+            while self._recent_requests and self._recent_requests[0] < now - OBSERVED_RATE_WINDOW:
+                self._recent_requests.popleft()
+        _record_wait(delay)
+        return delay
+
+    def _pause(self, seconds: float):
+        """在 seconds 秒内暂停发出新请求（多个线程同时退避时取最晚的恢复时间）"""
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+    def observed_rpm(self) -> Optional[float]:
+        """最近一分钟实际发出（或已排定）的请求数，少于 MIN_OBSERVED_REQUESTS 时返回 None"""
+        with self._lock:
+            count = len(self._recent_requests)
+        return float(count) if count >= MIN_OBSERVED_REQUESTS else None
+
+    def acquire(self, estimated_tokens: int = 0):
+        """阻塞直到允许发出请求，等待时间计入 track_wait()"""
+        delay = self._acquire_delay(estimated_tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self, estimated_tokens: int = 0):
+        """acquire 的异步版本"""
+        delay = self._acquire_delay(estimated_tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def observe_headers(self, headers: Optional[Mapping[str, str]]):
+        """根据 x-ratelimit-* 响应头更新限额，使调度速率贴近真实配额"""
+        if not headers:
+            return
+        headers = {k.lower(): v for k, v in dict(headers).items()}
+
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                limit = float(limit) if limit is not None else None
+                remaining = float(remaining) if remaining is not None else None
+            except ValueError:
+                continue
+            if limit:
+                bucket.set_limit(limit, remaining)
+            if remaining is not None and remaining <= 0:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self._pause(reset)
+
+    def observe_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """按响应中的实际 token 用量修正预估值"""
+        if actual_tokens:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """计算第 attempt 次重试前的等待时间：优先 Retry-After，否则带抖动的指数退避"""
+        headers = {k.lower(): v for k, v in dict(_get_error_headers(error)).items()}
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after is not None:
+            return min(retry_after, self.settings.max_delay)
+        delay = min(self.settings.max_delay, self.settings.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def _on_error(self, attempt: int, error: Exception) -> Optional[float]:
+        """处理调用失败，返回重试前的等待时间；不应重试时返回 None"""
+        if attempt >= self.settings.max_retries or not is_retryable(error):
+            return None
+
+        if _get_status_code(error) == 429:
+            with self._lock:
+                self.throttled += 1
+            self.observe_headers(_get_error_headers(error))
+            # 没有配置也没有从响应头得到请求限额时，以最近的实际请求速率为基准限速
+            self.requests.throttle(observed_per_minute=self.observed_rpm())
+            self.tokens.throttle()
+
+        delay = self._backoff_delay(attempt, error)
+        self._pause(delay)
+        with self._lock:
+            self.retries += 1
+        logger.warning(f"[{self.name}] 调用失败，{delay:.1f}秒后第{attempt + 1}次重试: {str(error)}")
+        return delay
+
+    def _on_success(self, result: Any, estimated_tokens: int):
+        metadata = getattr(result, "response_metadata", None) or {}
+        self.observe_headers(metadata.get("headers"))
+        usage = getattr(result, "usage_metadata", None) or {}
+        self.observe_usage(estimated_tokens, usage.get("total_tokens"))
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        """在限流配额内调用 fn，遇到 429/5xx 时自动退避重试"""
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if self._on_error(attempt, e) is None:
+                    raise
+                attempt += 1
+                continue
+            self._on_success(result, estimated_tokens)
+            return result
+
+    async def acall(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        """call 的异步版本，fn 返回可等待对象"""
+        attempt = 0
+        while True:
+            await self.aacquire(estimated_tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                if self._on_error(attempt, e) is None:
+                    raise
+                attempt += 1
+                continue
+            self._on_success(result, estimated_tokens)
+            return result
+
+
+class RateLimitedChat:
+    """为聊天模型实例附加限流与重试，其余属性透传给原实例"""
+
+    def __init__(self, chat, limiter: VendorRateLimiter):
+        self._chat = chat
+        self._limiter = limiter
+
+    def invoke(self, messages, *args, **kwargs):
+        return self._limiter.call(
+            lambda: self._chat.invoke(messages, *args, **kwargs), estimate_tokens(messages)
+        )
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        return await self._limiter.acall(
+            lambda: self._chat.ainvoke(messages, *args, **kwargs), estimate_tokens(messages)
+        )
+
+    async def agenerate(self, messages_list, *args, **kwargs):
+        """批量生成（例如通过 n 参数一次取回多个回复）"""
+        estimated = sum(estimate_tokens(messages) for messages in messages_list)
+        return await self._limiter.acall(
+            lambda: self._chat.agenerate(messages_list, *args, **kwargs), estimated
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class RateLimiterRegistry:
+    """按模型商共享限流器，同一模型商的所有模型共用配额"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, VendorRateLimiter] = {}
+
+    def get(self, vendor: str, settings: RateLimitSettings = RateLimitSettings()) -> VendorRateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(vendor)
+            if limiter is None or limiter.settings != settings:
+                limiter = VendorRateLimiter(vendor, settings)
+                self._limiters[vendor] = limiter
+            return limiter
+
+    def wrap(self, chat, vendor: str, settings: RateLimitSettings = RateLimitSettings()) -> RateLimitedChat:
+        """返回附加了模型商限流器的聊天模型"""
+        return RateLimitedChat(chat, self.get(vendor, settings))
+
+
+# 全局限流器注册表
+rate_limiters = RateLimiterRegistry()
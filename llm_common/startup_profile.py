@@ -0,0 +1,159 @@
+"""启动耗时报告：在新的解释器中导入入口模块，按 python -X importtime 的输出统计冷启动导入耗时
+
+用法（在仓库根目录执行）：
+    python -m llm_common.startup_profile
+    python -m llm_common.startup_profile lab_runner/streamlit_prompt_test_runner.py --top 15
+    python -m llm_common.startup_profile --max-ms 1500   # 超过阈值时退出码为 1，可用于发现启动耗时回退
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 默认统计的入口模块（相对仓库根目录）
+DEFAULT_ENTRY_POINTS = [
+    "lab_runner/streamlit_prompt_test_runner.py",
+    "lab_runner/prompt_test_runner.py",
+    "lab_runner/prompt_test_cli.py",
+    "llm_cardstudio/model_config.py",
+    "llm_cardstudio/llm_interaction.py",
+    "llm_cardstudio/pe_commands.py",
+]
+
+# 需要单独列出的重量级依赖，报告中显示它们是否在启动时被导入
+HEAVY_MODULES = [
+    "langchain_openai",
+    "langchain_anthropic",
+    "langchain_ollama",
+    "langchain_google_genai",
+    "google.generativeai",
+    "pandas",
+    "altair",
+]
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class StartupProfile:
+    entry_point: str
+    total_ms: float                 # 入口模块的累计导入耗时
+    records: List[ImportRecord]
+    error: Optional[str] = None
+
+    @property
+    def heavy_imports(self) -> Dict[str, float]:
+        """启动时被导入的重量级依赖 -> 累计耗时（毫秒）"""
+        found = {}
+        for record in self.records:
+            if record.module in HEAVY_MODULES:
+                found[record.module] = record.cumulative_us / 1000
+        return found
+
+    def top(self, count: int) -> List[ImportRecord]:
+        """入口模块直接导入的模块中累计耗时最长的几个
+
+        -X importtime 先输出子模块再输出父模块，入口模块的直接导入是它之前、
+        上一个顶层记录之后的第一级记录。
+        """
+        end = next((i for i in range(len(self.records) - 1, -1, -1)
+                    if self.records[i].module == self.module_name and self.records[i].depth == 0), None)
+        if end is None:
+            return []
+        start = end
+        while start > 0 and self.records[start - 1].depth > 0:
+            start -= 1
+        direct = [record for record in self.records[start:end] if record.depth == 1]
+        return sorted(direct, key=lambda r: -r.cumulative_us)[:count]
+
+    @property
+    def module_name(self) -> str:
+        return Path(self.entry_point).stem
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """解析 -X importtime 输出到标准错误的内容"""
+    records = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            # 每一级嵌套缩进两个空格，顶层导入前有一个空格
+            records.append(ImportRecord(module, int(self_us), int(cumulative_us), max(0, (len(indent) - 1) // 2)))
+    return records
+
+
+def profile_entry_point(entry_point: str) -> StartupProfile:
+    """在新的解释器中导入入口模块（不执行 __main__ 代码），返回导入耗时统计"""
+    path = (REPO_ROOT / entry_point).resolve()
+    env = dict(os.environ)
+    # 避免导入时因为缺少密钥在模块级代码中出错
+    env.setdefault("GOOGLE_API_KEY", "")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {path.stem}"],
+        cwd=str(path.parent), env=env, capture_output=True, text=True
+    )
+    records = parse_importtime(result.stderr)
+    total = next((r.cumulative_us for r in reversed(records) if r.module == path.stem), 0)
+    error = None
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"退出码 {result.returncode}"
+    return StartupProfile(entry_point=entry_point, total_ms=total / 1000, records=records, error=error)
+
+
+def print_report(profiles: List[StartupProfile], top: int = 10):
+    print("\n⏱️ 冷启动导入耗时:")
+    print("=" * 80)
+    print("{:<50} {:>12}  {}".format("入口模块", "导入耗时", "启动时导入的重量级依赖"))
+    print("-" * 80)
+    for profile in profiles:
+        total = f"{profile.total_ms:.0f}ms" if not profile.error else "失败"
+        heavy = ", ".join(profile.heavy_imports) or "-"
+        print("{:<50} {:>12}  {}".format(profile.entry_point, total, heavy))
+    print("=" * 80)
+
+    for profile in profiles:
+        if profile.error:
+            print(f"\n❌ {profile.entry_point}: {profile.error}")
+            continue
+        print(f"\n📋 {profile.entry_point} 耗时最长的导入:")
+        for record in profile.top(top):
+            print(f"  {record.cumulative_us / 1000:>8.1f}ms  {record.module}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="统计入口模块的冷启动导入耗时")
+    parser.add_argument("entry_points", nargs="*", default=DEFAULT_ENTRY_POINTS,
+                        help="入口模块路径（相对仓库根目录）")
+    parser.add_argument("--top", type=int, default=10, help="每个入口列出耗时最长的导入数量")
+    parser.add_argument("--max-ms", type=float, help="任一入口超过该耗时（毫秒）或导入失败时退出码为 1")
+    args = parser.parse_args(argv)
+
+    profiles = [profile_entry_point(entry_point) for entry_point in args.entry_points]
+    print_report(profiles, args.top)
+
+    if args.max_ms is not None:
+        slow = [p for p in profiles if p.error or p.total_ms > args.max_ms]
+        if slow:
+            print(f"\n⚠️ 超过 {args.max_ms:.0f}ms 或导入失败: {', '.join(p.entry_point for p in slow)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
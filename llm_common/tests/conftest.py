@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# llm_common 是仓库根目录下的包
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
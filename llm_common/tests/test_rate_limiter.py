@@ -0,0 +1,212 @@
+from types import SimpleNamespace
+
+import pytest
+
+from llm_common import rate_limiter
+from llm_common.rate_limiter import (RateLimitSettings, TokenBucket, VendorRateLimiter, is_retryable,
+                                     parse_duration, track_wait)
+
+
+class FakeClock:
+    """替换 rate_limiter 中的 time，sleep 只推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    # 抖动取区间上限，退避时间可预测
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    return fake
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_token_bucket_waits_for_refill(clock):
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    clock.now += 2
+    assert bucket.reserve(1) == 0.0
+
+
+def test_token_bucket_adjust_returns_tokens(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    bucket.adjust(30)
+    assert bucket.reserve(30) == 0.0
+
+
+def test_unlimited_bucket(clock):
+    bucket = TokenBucket(None)
+    assert bucket.unlimited
+    assert bucket.reserve(10 ** 6) == 0.0
+    bucket.throttle()
+    assert bucket.unlimited
+
+
+def test_throttle_unlimited_bucket_from_observed_rate(clock):
+    bucket = TokenBucket(None)
+    bucket.throttle(observed_per_minute=50)
+    assert not bucket.unlimited
+    assert bucket.per_minute == pytest.approx(40)
+    assert bucket.reserve(1) == pytest.approx(60 / 40)
+
+
+def test_throttle_limited_bucket(clock):
+    bucket = TokenBucket(100)
+    bucket.throttle(0.5)
+    assert bucket.per_minute == 50
+    assert bucket.tokens == 0.0
+
+
+def test_set_limit_from_headers(clock):
+    bucket = TokenBucket(None)
+    bucket.set_limit(200, remaining=3)
+    assert bucket.per_minute == 200
+    assert bucket.tokens == 3
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("2", 2.0), ("1s", 1.0), ("250ms", 0.25), ("6m0s", 360.0), ("1h", 3600.0), (None, None), ("soon", None)
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_is_retryable():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert is_retryable(type("ReadTimeout", (Exception,), {})())
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_retries_with_exponential_backoff(clock):
+    limiter = VendorRateLimiter("test", RateLimitSettings(base_delay=1.0, max_delay=60.0))
+    errors = [StatusError(503), StatusError(503)]
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert limiter.call(fn) == "ok"
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(2.0)]
+    assert limiter.retries == 2
+
+
+def test_retry_after_header_is_used(clock):
+    limiter = VendorRateLimiter("test")
+    errors = [StatusError(429, {"Retry-After": "7"})]
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    limiter.call(fn)
+    assert clock.sleeps == [pytest.approx(7.0)]
+    assert limiter.throttled == 1
+
+
+def test_gives_up_after_max_retries_and_on_client_errors(clock):
+    limiter = VendorRateLimiter("test", RateLimitSettings(max_retries=2))
+    calls = []
+
+    def always_fails():
+        calls.append(1)
+        raise StatusError(500)
+
+    with pytest.raises(StatusError):
+        limiter.call(always_fails)
+    assert len(calls) == 3
+
+    def bad_request():
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        limiter.call(bad_request)
+    assert limiter.retries == 2
+
+
+def test_429_throttles_unconfigured_vendor_from_observed_rate(clock):
+    limiter = VendorRateLimiter("test")
+    for _ in range(50):
+        limiter.acquire()
+        clock.now += 0.1
+    errors = [StatusError(429)]
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    limiter.call(fn)
+    assert not limiter.requests.unlimited
+    assert limiter.requests.per_minute == pytest.approx(51 * rate_limiter.THROTTLE_BACKOFF_FACTOR)
+
+
+def test_429_on_first_requests_only_backs_off(clock):
+    limiter = VendorRateLimiter("test")
+    errors = [StatusError(429)]
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    limiter.call(fn)
+    assert limiter.requests.unlimited
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_rate_limit_headers_update_buckets(clock):
+    limiter = VendorRateLimiter("test")
+    limiter.observe_headers({"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "0",
+                             "x-ratelimit-reset-requests": "2s"})
+    assert limiter.requests.per_minute == 100
+    assert limiter._acquire_delay(0) == pytest.approx(2.0)
+
+
+def test_track_wait_counts_limiter_waits(clock):
+    limiter = VendorRateLimiter("test", RateLimitSettings(requests_per_minute=60))
+    for _ in range(60):
+        limiter.acquire()
+    with track_wait() as waited:
+        limiter.acquire()
+    assert waited.seconds == pytest.approx(1.0)
+    # track_wait 之外的等待不计入
+    limiter.acquire()
+    assert waited.seconds == pytest.approx(1.0)
+
+
+def test_rate_limited_chat_disables_client_retries():
+    from llm_common.model_registry import ModelVendorConfig, create_chat
+
+    config = ModelVendorConfig(name="LOCAL_TEST", models=["local-model"], baseline_models=[], api_key_env=None,
+                               base_url="http://localhost:1234/v1", model_class="LLMStudio")
+    wrapped = create_chat(config, "local-model", rate_limited=True)
+    plain = create_chat(config, "local-model")
+    # 只由限流器重试，客户端不再自行重试；未附加限流的实例保持客户端默认重试
+    assert wrapped.max_retries == 0
+    assert plain.max_retries != 0 and plain is not wrapped._chat
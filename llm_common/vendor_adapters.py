@@ -0,0 +1,114 @@
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class VendorAdapter:
+    """一种 model_class 对应的 LangChain 集成
+
+    集成包（langchain_openai、langchain_anthropic 等）各自导入需要 0.7~1.5 秒，
+    只在第一次创建该类模型时导入，未使用的模型商不再拖慢启动。
+    各工具创建模型实例的参数和健康检查请求都由适配器决定，不再各自按 model_class 分支。
+    """
+    model_class: str
+    module: str
+    class_name: str
+    streaming: bool = True            # 默认是否流式输出
+    openai_compatible: bool = False   # OpenAI 兼容接口：共享 httpx 连接池、返回用量和限额响应头
+    api_key_param: str = "api_key"    # 构造函数中 API 密钥参数名
+    pass_base_url: bool = True        # 是否把 ModelVendorConfig.base_url 传给构造函数
+    placeholder_api_key: Optional[str] = None  # 不需要密钥的本地服务使用的占位密钥
+    client_retries: bool = False      # 客户端自带重试（max_retries 参数），附加限流重试时需要关闭
+
+    def chat_kwargs(self, model_name: str, base_url: Optional[str], api_key: Optional[str],
+                    temperature: Optional[float], streaming: bool) -> Dict[str, Any]:
+        """创建聊天模型实例的参数（不含连接池参数）"""
+        kwargs: Dict[str, Any] = {"model": model_name, "temperature": temperature}
+        if self.pass_base_url and base_url:
+            kwargs["base_url"] = base_url
+        api_key = api_key or self.placeholder_api_key
+        if api_key:
+            kwargs[self.api_key_param] = api_key
+        # ChatOllama 没有 streaming 参数，流式调用时自动流式返回
+        if self.model_class != "Ollama":
+            kwargs["streaming"] = streaming
+        if self.openai_compatible:
+            kwargs["stream_usage"] = True            # 流式响应末尾返回 token 用量（含命中提示词缓存的 token 数）
+            kwargs["include_response_headers"] = True  # 用于读取 x-ratelimit-* 限额信息
+        return kwargs
+
+    def probe_request(self, base_url: Optional[str], api_key: Optional[str]) -> Tuple[str, Dict[str, str]]:
+        """健康检查请求的 (URL, 请求头)，只列出模型，不消耗 token"""
+        if self.model_class == "Ollama":
+            return f"{(base_url or 'http://localhost:11434').rstrip('/')}/api/tags", {}
+        if self.model_class == "ChatAnthropic":
+            return "https://api.anthropic.com/v1/models", {"x-api-key": api_key or "",
+                                                           "anthropic-version": "2023-06-01"}
+        if self.model_class == "ChatGoogleGenerativeAI":
+            return "https://generativelanguage.googleapis.com/v1beta/models", {"x-goog-api-key": api_key or ""}
+        api_key = api_key or self.placeholder_api_key
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        return f"{(base_url or 'https://api.openai.com/v1').rstrip('/')}/models", headers
+
+
+# model_class -> 适配器，ModelVendorConfig.model_class 为 None 时按 ChatOpenAI 处理
+ADAPTERS: Dict[str, VendorAdapter] = {
+    "ChatOpenAI": VendorAdapter("ChatOpenAI", "langchain_openai", "ChatOpenAI", openai_compatible=True,
+                                client_retries=True),
+    # LLMStudio 兼容 OpenAI 接口，本地服务不需要 API key，但客户端要求提供一个占位符
+    "LLMStudio": VendorAdapter("LLMStudio", "langchain_openai", "ChatOpenAI", streaming=False,
+                               openai_compatible=True, placeholder_api_key="dummy-key", client_retries=True),
+    # ChatAnthropic 使用默认的 API 地址
+    "ChatAnthropic": VendorAdapter("ChatAnthropic", "langchain_anthropic", "ChatAnthropic",
+                                   api_key_param="anthropic_api_key", pass_base_url=False, client_retries=True),
+    "Ollama": VendorAdapter("Ollama", "langchain_ollama", "ChatOllama"),
+    "ChatGoogleGenerativeAI": VendorAdapter("ChatGoogleGenerativeAI", "langchain_google_genai",
+                                            "ChatGoogleGenerativeAI", streaming=False, pass_base_url=False,
+                                            client_retries=True),
+}
+
+DEFAULT_MODEL_CLASS = "ChatOpenAI"
+
+_lock = threading.Lock()
+_loaded: Dict[str, Any] = {}
+_load_times: Dict[str, float] = {}
+
+
+def get_adapter(model_class: Optional[str]) -> VendorAdapter:
+    """根据 model_class 获取适配器，未知的 model_class 抛出 ValueError"""
+    adapter = ADAPTERS.get(model_class or DEFAULT_MODEL_CLASS)
+    if adapter is None:
+        raise ValueError(f"未知的模型类型: {model_class}，可选值: {', '.join(ADAPTERS)}")
+    return adapter
+
+
+def load_chat_class(model_class: Optional[str]) -> type:
+    """按需导入并返回 model_class 对应的聊天模型类，同一模块只导入一次"""
+    adapter = get_adapter(model_class)
+    key = f"{adapter.module}.{adapter.class_name}"
+    with _lock:
+        chat_class = _loaded.get(key)
+        if chat_class is None:
+            start = time.perf_counter()
+            chat_class = getattr(importlib.import_module(adapter.module), adapter.class_name)
+            _load_times[adapter.module] = _load_times.get(adapter.module, time.perf_counter() - start)
+            _loaded[key] = chat_class
+            logger.info(f"已加载模型集成 {key}，导入耗时 {_load_times[adapter.module]:.2f}秒")
+        return chat_class
+
+
+def create_chat_model(model_class: Optional[str], **kwargs) -> Any:
+    """创建 model_class 对应的聊天模型实例"""
+    return load_chat_class(model_class)(**kwargs)
+
+
+def loaded_adapters() -> Dict[str, float]:
+    """本进程已导入的集成模块 -> 导入耗时（秒），用于启动耗时报告"""
+    with _lock:
+        return dict(_load_times)
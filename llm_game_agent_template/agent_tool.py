@@ -2,49 +2,67 @@ import streamlit as st
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
-## 导入模型
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+# 共用的模型调用基础设施位于仓库根目录的 llm_common 包
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+# 模型实例通过各工具共用的模型商注册表创建（按 model_class 延迟导入集成，复用实例和连接池）
+from llm_common.model_registry import ModelRegistry, ModelVendorConfig
+
 load_dotenv()
 
+# 可选的模型：use_model -> 模型商配置（使用其中第一个模型）
+AGENT_MODELS = {
+    "google": ModelVendorConfig(
+        name="Gemini",
+        models=["gemini-pro"],
+        baseline_models=["gemini-pro"],
+        api_key_env="GOOGLE_API_KEY",
+        base_url=None,
+        model_class="ChatGoogleGenerativeAI"
+    ),
+    "deepseek": ModelVendorConfig(
+        name="DeepSeek",
+        models=["deepseek-chat"],
+        baseline_models=["deepseek-chat"],
+        api_key_env="DEEPSEEK_API_KEY",
+        base_url=os.getenv("DEEPSEEK_API_BASE"),
+        model_class="ChatOpenAI"
+    ),
+    "openai": ModelVendorConfig(
+        name="OpenAI",
+        models=["gpt-3.5-turbo"],
+        baseline_models=["gpt-3.5-turbo"],
+        api_key_env="OPENAI_API_KEY",
+        base_url=os.getenv("OPENAI_API_BASE"),
+        model_class="ChatOpenAI"
+    )
+}
+
+agent_registry = ModelRegistry(AGENT_MODELS)
+
 def init_my_model(use_model:str="deepseek"):
-    
-    if use_model == "google":
-        model = "gemini-pro"
-        print(f"使用Gemini模型 {model}")
-        return ChatGoogleGenerativeAI(
-            api_key=os.getenv("GOOGLE_API_KEY"),
-            model=model,
-            temperature=0,
-            streaming=True
-        )
-        
-    elif use_model == "deepseek":
-        model = "deepseek-chat"
-        base_url = os.getenv("DEEPSEEK_API_BASE")
-        print(f"使用DeepSeek模型 {model}")
-        return ChatOpenAI(
-            api_key=os.getenv("DEEPSEEK_API_KEY"),
-            model=model,
-            base_url=base_url,
-            temperature=0,
-            streaming=True
-        )
-      
-    else:  # openai
-        model = "gpt-3.5-turbo"
-        base_url = os.getenv("OPENAI_API_BASE")
-        print(f"使用OpenAI模型 {model}")
-        return ChatOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            model=model,
-            base_url=base_url,
-            temperature=0,
-            streaming=True
-        )
+    """创建模型实例
+
+    Args:
+        use_model: google、deepseek、openai（其他值按 openai 处理），
+            fastest 表示探测已配置密钥的模型商并使用响应最快的一个
+    """
+    if use_model == "fastest":
+        fastest = agent_registry.fastest_baseline()
+        if fastest is None:
+            raise ValueError("没有可用的模型商，请检查API密钥和网络")
+        use_model = fastest[0]
+    elif use_model not in AGENT_MODELS:
+        use_model = "openai"
+
+    config = AGENT_MODELS[use_model]
+    model = config.models[0]
+    print(f"使用{config.name}模型 {model}")
+    return agent_registry.get_chat(use_model, model, temperature=0, streaming=True)
 
 def add_system_message(message: str):
     """添加系统消息到聊天历史